@@ -0,0 +1,118 @@
+"""
+Frame pacing while a macro file loads or saves on a worker thread (FileTask,
+as the GUI's Save and Load do it), for JSON and binary macros.
+
+The main thread stands in for the Tk loop: it ticks every --frame-ms and
+does a little work per frame. Reported per format and operation:
+
+    seconds         how long the background load/save took
+    frame_p99_ms,   gap between consecutive frames; the blocking call that
+    frame_max_ms    used to run on the Tk thread would make this its whole
+                    duration
+    cancel_ms       cancel() at about half way -> the task has stopped
+
+Any Python thread busy beside the main one costs it up to two GIL switch
+intervals (5 ms each) per frame, so gaps of ~25 ms are the floor here.
+The script exits non-zero if any frame gap is above --limit-ms.
+
+    python benchmarks/bench_background_io.py [--steps N] [--frame-ms MS] [--limit-ms MS]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.fileio import FileTask, default_settings, read_macro, write_macro  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz") + ["space", "enter", "shift", "ctrl"]
+
+
+def make_store(n: int) -> EventStore:
+    k = len(KEYS)
+    key_ids = array("H", range(k)) * (n // k + 1)
+    delays = array("d", (0.001 + (i * 7919 % 100) / 1000.0 for i in range(1000))) * (n // 1000 + 1)
+    return EventStore.from_columns(KEYS, delays[:n], key_ids[:n])
+
+
+def run_frames(task: FileTask, frame: float) -> list:
+    """Tick until the task is done; returns the gaps between frames."""
+    gaps = []
+    last = time.perf_counter()
+    while not task.done:
+        time.sleep(max(0.0, last + frame - time.perf_counter()))
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+        _ = task.fraction  # what the progress bar reads each frame
+    return gaps
+
+
+def measure(work, frame: float) -> dict:
+    t0 = time.perf_counter()
+    task = FileTask(work)
+    gaps = run_frames(task, frame)
+    seconds = time.perf_counter() - t0
+    if task.error is not None:
+        raise task.error
+
+    task = FileTask(work)
+    while task.fraction < 0.5 and not task.done:
+        time.sleep(0.001)
+    t0 = time.perf_counter()
+    task.cancel()
+    task.wait()
+    cancel_ms = (time.perf_counter() - t0) * 1000.0
+
+    gaps.sort()
+    return {
+        "seconds": seconds,
+        "frames": len(gaps),
+        "frame_p99_ms": gaps[min(len(gaps) - 1, int(0.99 * len(gaps)))] * 1000.0 if gaps else None,
+        "frame_max_ms": gaps[-1] * 1000.0 if gaps else None,
+        "cancel_ms": cancel_ms,
+        "cancelled": task.cancelled,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Frame pacing during background file I/O.")
+    parser.add_argument("--steps", type=int, default=2000000, help="macro size (2M steps is ~100 MB of JSON)")
+    parser.add_argument("--frame-ms", type=float, default=1000.0 / 60.0)
+    parser.add_argument("--limit-ms", type=float, default=50.0, help="fail above this frame gap")
+    args = parser.parse_args(argv)
+
+    events = make_store(args.steps)
+    settings = default_settings()
+    frame = args.frame_ms / 1000.0
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in (".json", ".mrec"):
+            path = os.path.join(tmp, "macro" + ext)
+            save = measure(lambda progress, cancel: write_macro(path, events, settings, progress, cancel), frame)
+            size = os.path.getsize(path)
+            load = measure(lambda progress, cancel: read_macro(path, progress, cancel), frame)
+            results.append({"format": ext[1:], "bytes": size, "save": save, "load": load})
+
+    out = {
+        "benchmark": "background_io",
+        "steps": args.steps,
+        "frame_ms": args.frame_ms,
+        "results": results,
+        "limit_ms": args.limit_ms,
+        "ok": all(r[op]["frame_max_ms"] is None or r[op]["frame_max_ms"] < args.limit_ms
+                  for r in results for op in ("save", "load")),
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
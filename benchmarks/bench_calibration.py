@@ -0,0 +1,113 @@
+"""
+Injection-latency calibration (macro_recorder.calibration) against the fake
+backend with a simulated per-key injection cost: the backend spends
+--costs ms per key and timestamps each batch when its call returns, the
+way a real injector's keys land.
+
+For each cost the backend is calibrated, then one synthetic macro is
+played without and with the resulting compensation. Reported per run, in
+ms: landing error against the recorded timeline (emission time minus run
+start plus the batch's offset) as mean, p50, p99 and max of |error|, the
+error of the last key, and the share of batches within the profile's
+stated tolerance. Without compensation every key lands about one
+injection late. The script checks that compensation removes that offset:
+the compensated p50 is within tolerance and under half the uncompensated
+one. The tail is reported, not checked; a preempted thread on a busy
+machine or VM can still be late by milliseconds now and then.
+
+    python benchmarks/bench_calibration.py [--costs 0.5,2,5] [--steps N] [--samples N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.calibration import Compensation, calibrate  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.plan import compile_plan  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+from macro_recorder.timing import lateness_stats  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def make_macro(steps: int, cost: float, rng: random.Random) -> EventStore:
+    # A lead-in, then taps and the odd two- or three-key chord (zero delay),
+    # with gaps long enough for the previous batch to be sent
+    events = [(rng.choice(KEYS), 0.1)]
+    while len(events) < steps:
+        events.append((rng.choice(KEYS), rng.uniform(max(0.01, 4 * cost), 0.05)))
+        for _ in range(rng.choice((0, 0, 0, 1, 2))):
+            events.append((rng.choice(KEYS), 0.0))
+    return EventStore(events[:steps])
+
+
+def play(events: EventStore, cost: float, compensation, tolerance: float) -> dict:
+    engine = MacroEngine()
+    engine.events = events
+    engine.backend_name = "fake"
+    engine.backend = RecordingBackend(press_cost=cost)
+    engine.compensate = compensation if compensation is not None else False
+    engine.play()
+    engine.wait()
+
+    plan = compile_plan(events, engine.backend, 1.0, engine.batch_window_ms / 1000.0, 0.0)
+    origin = engine.play_origin
+    errors = [t - (origin + at) for (t, _codes), (at, _batch) in zip(engine.backend.emissions, plan.batches())]
+    stats = lateness_stats([abs(e) for e in errors])
+    within = sum(1 for e in errors if abs(e) <= tolerance)
+    return {
+        "mean_ms": stats["mean"] * 1000.0,
+        "p50_ms": stats["p50"] * 1000.0,
+        "p99_ms": stats["p99"] * 1000.0,
+        "max_ms": stats["max"] * 1000.0,
+        "last_ms": errors[-1] * 1000.0,
+        "within_tolerance": within / len(errors),
+    }
+
+
+def run_cost(cost_ms: float, steps: int, samples: int) -> dict:
+    cost = cost_ms / 1000.0
+    profile = calibrate(RecordingBackend(press_cost=cost), key="a", samples=samples)
+    tolerance = profile["tolerance_ms"] / 1000.0
+    events = make_macro(steps, cost, random.Random(steps))
+    off = play(events, cost, None, tolerance)
+    on = play(events, cost, Compensation.from_profile(profile), tolerance)
+    return {
+        "cost_ms": cost_ms,
+        "measured_fixed_ms": profile["fixed_ms"],
+        "measured_per_key_ms": profile["per_key_ms"],
+        "overshoot_p99_ms": profile["overshoot_ms"]["p99"],
+        "tolerance_ms": profile["tolerance_ms"],
+        "uncompensated": off,
+        "compensated": on,
+        "ok": on["p50_ms"] <= profile["tolerance_ms"] and on["p50_ms"] < off["p50_ms"] / 2,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Landing error with and without calibrated compensation.")
+    parser.add_argument("--costs", default="0.5,2,5", help="comma-separated simulated ms per key")
+    parser.add_argument("--steps", type=int, default=300, help="steps in the played macro")
+    parser.add_argument("--samples", type=int, default=200, help="calibration samples")
+    args = parser.parse_args(argv)
+
+    out = {
+        "benchmark": "calibration",
+        "steps": args.steps,
+        "results": [run_cost(float(c), args.steps, args.samples)
+                    for c in args.costs.split(",") if c.strip()],
+    }
+    out["ok"] = all(r["ok"] for r in out["results"])
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
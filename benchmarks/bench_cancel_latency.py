@@ -0,0 +1,128 @@
+"""
+Cancel and pause latency of playback, driven by a fake clock and the fake
+(recording) backend so no real time passes between steps and nothing is
+typed.
+
+The macro has an hour-long delay between steps; stop()/pause() are issued
+while the worker is blocked in that wait and the real time until the worker
+reacts is recorded. After a pause of 30 fake minutes, the remaining steps must
+still be spaced exactly as recorded (shifted by the pause). The script exits
+non-zero if the p99 latency exceeds --limit-ms (the max is reported, but a
+rare scheduler hiccup is outside playback's control) or the timeline check
+fails.
+
+    python benchmarks/bench_cancel_latency.py [--trials N] [--limit-ms MS]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+from macro_recorder.timing import FakeClock  # noqa: E402
+
+HOUR = 3600.0
+
+
+def make_engine():
+    clock = FakeClock()
+    engine = MacroEngine()
+    engine.statuses = []
+    engine.on_status = engine.statuses.append
+    engine.clock = clock
+    engine.backend_name = "fake"
+    engine.backend = RecordingBackend(clock=clock.now)
+    engine.events = EventStore([("a", 0.0), ("b", HOUR), ("c", HOUR)])
+    return engine, clock
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > end:
+            raise TimeoutError("engine did not reach the expected state")
+        time.sleep(0.0005)
+
+
+def cancel_trial() -> float:
+    engine, _clock = make_engine()
+    engine.play()
+    wait_for(lambda: len(engine.backend.emissions) == 1)
+    time.sleep(0.005)  # let the worker settle into the hour-long wait
+    engine.stop()
+    engine.wait()
+    return engine.last_cancel_latency
+
+
+def pause_trial():
+    engine, clock = make_engine()
+    engine.play()
+    wait_for(lambda: len(engine.backend.emissions) == 1)
+    time.sleep(0.005)
+    engine.pause()
+    wait_for(lambda: engine.last_pause_latency is not None)
+    latency = engine.last_pause_latency
+
+    clock.advance(HOUR / 2)          # paused: nothing may fire
+    time.sleep(0.005)
+    fired_while_paused = len(engine.backend.emissions) > 1
+    engine.resume()
+    # The worker measures the pause when it wakes; don't move time before that
+    wait_for(lambda: "Playing..." in engine.statuses)
+    for n in (2, 3):                 # the remaining timeline, shifted by the pause
+        clock.advance(HOUR)
+        wait_for(lambda: len(engine.backend.emissions) == n)
+    engine.wait()
+
+    times = [t for t, _codes in engine.backend.emissions]
+    expected = [0.0, HOUR / 2 + HOUR, HOUR / 2 + 2 * HOUR]
+    timeline_ok = not fired_while_paused and times == expected
+    return latency, timeline_ok
+
+
+def summarize(samples) -> dict:
+    ms = sorted(x * 1000.0 for x in samples)
+    p99 = ms[min(len(ms) - 1, int(round(0.99 * (len(ms) - 1))))]
+    return {"count": len(ms), "median_ms": statistics.median(ms), "p99_ms": p99, "max_ms": ms[-1]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cancel/pause latency with a fake clock.")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--limit-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    cancels = [cancel_trial() for _ in range(args.trials)]
+    pauses = []
+    timeline_ok = True
+    for _ in range(args.trials):
+        latency, ok = pause_trial()
+        pauses.append(latency)
+        timeline_ok = timeline_ok and ok
+
+    out = {
+        "benchmark": "cancel_latency",
+        "cancel": summarize(cancels),
+        "pause": summarize(pauses),
+        "pause_keeps_timeline": timeline_ok,
+        "limit_ms": args.limit_ms,
+    }
+    out["ok"] = (
+        timeline_ok
+        and out["cancel"]["p99_ms"] < args.limit_ms
+        and out["pause"]["p99_ms"] < args.limit_ms
+    )
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Round-trip latency of the control socket (macro_recorder.control), over a
+Unix socket and over TCP on 127.0.0.1.
+
+A ControlServer drives an engine with the fake (recording) backend, which
+timestamps every key it is sent; the macro is a single step with no delay.
+Measured from a ControlClient in this process:
+
+    ping        request -> reply, one at a time
+    pipelined   per-request cost when --pipeline requests are sent at once
+    trigger     "play" sent -> the first key reaches the backend
+    ack         "play" sent -> its reply
+    done_event  playback's end -> the "done" event reaches the client
+
+The script exits non-zero if the median trigger latency is above --limit-ms.
+
+    python benchmarks/bench_control.py [--trials N] [--pipeline N] [--limit-ms MS]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.control import ControlClient, ControlServer  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+
+def summarize(samples) -> dict:
+    us = sorted(x * 1e6 for x in samples)
+    p99 = us[min(len(us) - 1, int(round(0.99 * (len(us) - 1))))]
+    return {"count": len(us), "median_us": statistics.median(us), "p99_us": p99, "max_us": us[-1]}
+
+
+def run_transport(address: str, trials: int, pipeline: int) -> dict:
+    engine = MacroEngine()
+    engine.backend_name = "fake"
+    engine.backend = RecordingBackend(clock=time.perf_counter)
+    engine.events = EventStore([("a", 0.0)])
+    emissions = engine.backend.emissions
+
+    with ControlServer(engine, address) as server, ControlClient(server.address) as client:
+        pings = []
+        for _ in range(trials):
+            t0 = time.perf_counter()
+            client.ping()
+            pings.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        replies = client.pipeline([("ping", None)] * pipeline)
+        pipelined = (time.perf_counter() - t0) / pipeline
+        assert all(r["ok"] for r in replies)
+
+        client.subscribe("done")
+        triggers, acks, done_events = [], [], []
+        for _ in range(trials):
+            t0 = time.perf_counter()
+            client.play()
+            acks.append(time.perf_counter() - t0)
+            event = client.wait_event("done", timeout=5.0)
+            received = time.perf_counter()
+            if event is None:
+                raise TimeoutError("playback did not finish")
+            sent_at = emissions[-1][0]
+            triggers.append(sent_at - t0)
+            done_events.append(received - sent_at)
+        dropped = server.dropped
+    engine.close()
+
+    return {
+        "address": "tcp" if address.startswith("tcp://") else "unix",
+        "ping": summarize(pings),
+        "pipelined_us_per_request": pipelined * 1e6,
+        "pipelined_requests_per_s": 1.0 / pipelined if pipelined > 0 else None,
+        "trigger": summarize(triggers),
+        "ack": summarize(acks),
+        "done_event": summarize(done_events),
+        "dropped_events": dropped,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Control socket round-trip and trigger latency.")
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--pipeline", type=int, default=10000, help="requests sent in one write")
+    parser.add_argument("--limit-ms", type=float, default=1.0, help="fail above this median trigger latency")
+    args = parser.parse_args(argv)
+
+    addresses = ["tcp://127.0.0.1:0"]
+    tmp = None
+    if hasattr(os, "fork"):  # Unix domain sockets are served on POSIX only
+        tmp = tempfile.TemporaryDirectory()
+        addresses.insert(0, os.path.join(tmp.name, "control.sock"))
+    try:
+        results = [run_transport(a, args.trials, args.pipeline) for a in addresses]
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    out = {
+        "benchmark": "control",
+        "trials": args.trials,
+        "results": results,
+        "limit_ms": args.limit_ms,
+        "ok": all(r["trigger"]["median_us"] < args.limit_ms * 1000.0 for r in results),
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
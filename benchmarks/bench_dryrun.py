@@ -0,0 +1,93 @@
+"""
+Dry runs (MacroEngine.dry_run): the real playback worker on a virtual clock
+with the fake backend, for multi-hour synthetic macros.
+
+For each size the macro's delays are 0.5-20 s, so even 1k steps is hours of
+playback. Reported: simulation time, the simulated duration, whether every
+emit landed exactly on its compiled offset, and a fingerprint (SHA-256) of
+the emitted timeline. The macros are seeded, so the fingerprint only changes
+when scheduling does; compare it across commits to catch that.
+
+    python benchmarks/bench_dryrun.py [--sizes 1000,10000,100000] [--loops N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.plan import compile_plan  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = ["a", "b", "c", "space", "enter", "shift", "1", "2"]
+
+
+def make_store(n: int) -> EventStore:
+    rng = random.Random(n)
+    # Mostly quick taps with the odd burst (zero delay) and long pause
+    return EventStore([
+        (rng.choice(KEYS), 0.0 if rng.random() < 0.1 else rng.uniform(0.5, 20.0))
+        for _ in range(n)
+    ])
+
+
+def fingerprint(timeline) -> str:
+    h = hashlib.sha256()
+    for t, codes in timeline:
+        h.update(f"{t!r} {' '.join(codes)}\n".encode())
+    return h.hexdigest()
+
+
+def run_size(n: int, loops: int, speed: float) -> dict:
+    engine = MacroEngine()
+    engine.events = make_store(n)
+    engine.speed = speed
+    engine.repeat_delay_ms = 1000
+
+    t0 = time.perf_counter()
+    result = engine.dry_run(loops=loops)
+    elapsed = time.perf_counter() - t0
+
+    plan = compile_plan(engine.events, RecordingBackend(), speed, engine.batch_window_ms / 1000.0, 1.0)
+    first_loop = result["timeline"][:len(plan)]
+    exact = all(t == at and codes == want for (t, codes), (at, want) in zip(first_loop, plan.batches()))
+
+    return {
+        "steps": n,
+        "loops": result["loops"],
+        "keys": result["keys"],
+        "simulated_hours": result["duration"] / 3600.0,
+        "ms": elapsed * 1000.0,
+        "steps_per_s": result["keys"] / elapsed if elapsed > 0 else None,
+        "on_plan_offsets": exact,
+        "timeline_sha256": fingerprint(result["timeline"]),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Dry-run speed and timeline fingerprints.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated step counts")
+    parser.add_argument("--loops", type=int, default=2, help="loops per dry run")
+    parser.add_argument("--speed", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    out = {
+        "benchmark": "dryrun",
+        "speed": args.speed,
+        "results": [run_size(n, args.loops, args.speed) for n in sizes],
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if all(r["on_plan_offsets"] for r in out["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
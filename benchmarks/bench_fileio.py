@@ -0,0 +1,110 @@
+"""
+Save/load throughput of macro files, JSON v2 and binary (.mrec), from 1k up
+to 10M steps.
+
+Each size is saved with write_macro and read back with read_macro (the
+functions behind MacroEngine.save/load) in a temporary directory. Binary
+loads map the file instead of parsing it, so "load_scan" also times one
+pass over every delay, which is what playback or the step list would touch.
+JSON holds every step as a dict while saving or loading, so sizes above
+--json-max-steps are skipped to keep memory bounded.
+
+    python benchmarks/bench_fileio.py [--sizes 1000,...,10000000] [--json-max-steps N]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.fileio import default_settings, read_macro, write_macro  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz") + ["space", "enter", "shift", "ctrl"]
+DEFAULT_SIZES = "1000,10000,100000,1000000,10000000"
+
+
+def make_store(n: int) -> EventStore:
+    """n steps cycling through KEYS with delays between 1 and 100 ms."""
+    k = len(KEYS)
+    pattern_ids = array("H", range(k))
+    key_ids = pattern_ids * (n // k) + pattern_ids[:n % k]
+    pattern_delays = array("d", (0.001 + (i * 7919 % 100) / 1000.0 for i in range(1000)))
+    delays = pattern_delays * (n // 1000) + pattern_delays[:n % 1000]
+    return EventStore.from_columns(KEYS, delays, key_ids)
+
+
+def _rate(n: int, seconds: float):
+    return n / seconds if seconds > 0 else None
+
+
+def measure(events: EventStore, path: str) -> dict:
+    n = len(events)
+    settings = default_settings()
+
+    t0 = time.perf_counter()
+    write_macro(path, events, settings)
+    save_s = time.perf_counter() - t0
+    size = os.path.getsize(path)
+
+    gc.collect()
+    t0 = time.perf_counter()
+    loaded, _settings = read_macro(path)
+    load_s = time.perf_counter() - t0
+    total = sum(loaded.delays_view())
+    load_scan_s = time.perf_counter() - t0
+
+    ok = len(loaded) == n and abs(total - sum(events.delays_view())) < 1e-6 * max(1, n)
+    del loaded
+    gc.collect()
+    os.remove(path)
+    return {
+        "bytes": size,
+        "save_s": save_s,
+        "load_s": load_s,
+        "load_scan_s": load_scan_s,
+        "save_steps_per_s": _rate(n, save_s),
+        "load_steps_per_s": _rate(n, load_s),
+        "save_mb_per_s": _rate(size / 1e6, save_s),
+        "load_scan_mb_per_s": _rate(size / 1e6, load_scan_s),
+        "round_trip_ok": ok,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Macro save/load throughput.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated step counts")
+    parser.add_argument("--json-max-steps", type=int, default=1000000,
+                        help="skip JSON above this many steps (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="mrec-bench-") as tmp:
+        for n in sizes:
+            events = make_store(n)
+            row = {"steps": n}
+            if n <= args.json_max_steps:
+                row["json"] = measure(events, os.path.join(tmp, "macro.json"))
+            else:
+                row["json"] = {"skipped": f"above --json-max-steps ({args.json_max_steps})"}
+            row["binary"] = measure(events, os.path.join(tmp, "macro.mrec"))
+            ok = ok and all(r.get("round_trip_ok", True) for r in (row["json"], row["binary"]))
+            results.append(row)
+            del events
+            gc.collect()
+
+    json.dump({"benchmark": "fileio", "ok": ok, "results": results}, sys.stdout, indent=2)
+    print()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Cost of the keyboard hook callback itself (MacroEngine._on_key_event), which
+runs for every key pressed anywhere on the system.
+
+Events are synthetic (see bench_recording) and are fed straight into the
+callback on this thread, in batches small enough that the capture ring
+never fills; the ring is emptied between batches, outside the timing.
+"net" subtracts the cost of calling an empty method with the same event,
+leaving only the engine's own code. Cases:
+
+    idle            not recording, hotkeys off
+    idle_hotkeys    not recording, hotkeys on, a key other than the toggle
+    toggle_key      the play toggle key (forwarded to the capture worker)
+    recording       any key while recording (forwarded)
+
+    python benchmarks/bench_hook.py [--events N] [--repeats R]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_recording import SyntheticKeyEvent  # noqa: E402
+
+from macro_recorder.engine import MacroEngine  # noqa: E402
+
+BATCH = 4096
+
+
+class _Empty:
+    def hook(self, e):
+        pass
+
+
+def time_calls(hook, events: list, drain=None) -> float:
+    """Seconds per call, fastest of the batches."""
+    best = None
+    for start in range(0, len(events), BATCH):
+        batch = events[start:start + BATCH]
+        t0 = time.perf_counter()
+        for e in batch:
+            hook(e)
+        per = (time.perf_counter() - t0) / len(batch)
+        best = per if best is None else min(best, per)
+        if drain is not None:
+            drain()
+    return best
+
+
+def run(events: int, repeats: int) -> dict:
+    other = [SyntheticKeyEvent(time.time(), 30, "a", "down" if i & 1 == 0 else "up") for i in range(events)]
+    toggle = [SyntheticKeyEvent(time.time(), 66, "f8", "down" if i & 1 == 0 else "up") for i in range(events)]
+
+    engine = MacroEngine()
+    engine.set_toggle_key("f8")
+    drain = engine._capture.drain
+    cases = {}
+
+    def measure(name, evs):
+        times = [time_calls(engine._on_key_event, evs, drain) for _ in range(repeats)]
+        cases[name] = min(times)
+
+    engine.use_hotkeys = False
+    measure("idle", other)
+    engine.use_hotkeys = True
+    measure("idle_hotkeys", other)
+    measure("toggle_key", toggle)
+    engine.recording = True
+    measure("recording", other)
+    engine.recording = False
+    engine.close()
+
+    baseline = min(time_calls(_Empty().hook, other) for _ in range(repeats))
+    return {
+        name: {"ns_per_event": t * 1e9, "net_ns_per_event": max(0.0, t - baseline) * 1e9}
+        for name, t in cases.items()
+    } | {"empty_call_ns": baseline * 1e9}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Keyboard hook callback cost per event.")
+    parser.add_argument("--events", type=int, default=200000, help="events per case and repeat")
+    parser.add_argument("--repeats", type=int, default=5, help="repeats per case (fastest counts)")
+    args = parser.parse_args(argv)
+
+    out = {"benchmark": "hook", "events": args.events, "results": run(args.events, args.repeats)}
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Key-injection throughput per backend, in keys per second.
+
+Runs without a display: the uinput backend writes to a stand-in file
+(os.devnull) instead of /dev/uinput, and pyautogui is only measured when it
+imports and can reach a display. Each backend is timed pressing keys one call
+at a time and emitting them in batches, plus one end-to-end engine run of a
+zero-delay macro (which coalesces into batches) on the fake backend.
+
+    python benchmarks/bench_injection.py [--keys N] [--batch N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import PyAutoGuiBackend, RecordingBackend, UinputBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def measure(backend, n: int, batch: int) -> dict:
+    codes = [backend.resolve(k) for k in KEYS]
+    seq = [codes[i % len(codes)] for i in range(n)]
+
+    t0 = time.perf_counter()
+    for code in seq:
+        backend.press(code)
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(0, n, batch):
+        backend.emit(seq[i:i + batch])
+    batched = time.perf_counter() - t0
+
+    return {
+        "keys": n,
+        "single_keys_per_s": n / single if single > 0 else None,
+        "batched_keys_per_s": n / batched if batched > 0 else None,
+        "batch_size": batch,
+    }
+
+
+def engine_run(n: int) -> dict:
+    engine = MacroEngine()
+    engine.events = EventStore((KEYS[i % len(KEYS)], 0.0) for i in range(n))
+    engine.backend_name = "fake"
+    engine.backend = RecordingBackend()
+    engine.play()
+    engine.wait()
+    inj = dict(engine.last_injection)
+    inj["errors"] = len(inj["errors"])
+    return inj
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Injection throughput per backend.")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    results = {}
+    results["fake"] = measure(RecordingBackend(), args.keys, args.batch)
+    with open(os.devnull, "wb", buffering=0) as dev:
+        results["uinput_standin"] = measure(UinputBackend(device=dev), args.keys, args.batch)
+    try:
+        pg = PyAutoGuiBackend()
+        # Real presses: keep the run short
+        results["pyautogui"] = measure(pg, min(args.keys, 500), args.batch)
+    except Exception as ex:
+        results["pyautogui"] = {"skipped": f"{type(ex).__name__}: {ex}"}
+    results["engine_fake_zero_delay"] = engine_run(args.keys)
+
+    json.dump({"benchmark": "injection", "results": results}, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
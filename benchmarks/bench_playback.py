@@ -0,0 +1,88 @@
+"""
+Playback timing accuracy of MacroEngine._play_worker with a stubbed injector.
+
+The fake (recording) backend stands in for pyautogui: it only timestamps each
+emission, so what is measured is the scheduler, not the injection. Batching
+is turned off so every step is its own emission. For each macro shape and
+spin window the script reports:
+
+    lateness   - the engine's own per-step lateness vs. its deadlines
+    interval   - emitted gap minus recorded delay, step to step
+    drift      - (last emission - first) minus the recorded span
+
+    python benchmarks/bench_playback.py [--steps N] [--spin-windows 0,2] [--seed S]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+from macro_recorder.timing import lateness_stats  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def shapes(steps: int, seed: int) -> dict:
+    """Delay sequences (seconds) to replay."""
+    rng = random.Random(seed)
+    return {
+        "steady_10ms": [0.010] * steps,
+        "steady_1ms": [0.001] * steps,
+        "typing_jitter": [rng.uniform(0.030, 0.150) for _ in range(steps)],
+        "mixed_bursts": [rng.choice((0.0002, 0.0005, 0.002, 0.020)) for _ in range(steps)],
+    }
+
+
+def _ms(stats: dict) -> dict:
+    return {k: (v * 1000.0 if k != "count" else v) for k, v in stats.items()}
+
+
+def run_case(delays, spin_window_ms: float) -> dict:
+    engine = MacroEngine()
+    engine.events = EventStore((KEYS[i % len(KEYS)], d) for i, d in enumerate(delays))
+    engine.backend_name = "fake"
+    engine.backend = RecordingBackend()
+    engine.batch_window_ms = 0.0
+    engine.spin_window_ms = spin_window_ms
+    engine.play()
+    engine.wait()
+
+    times = [t for t, _codes in engine.backend.emissions]
+    interval_err = [abs((times[i] - times[i - 1]) - delays[i]) for i in range(1, len(times))]
+    span = sum(delays[1:len(times)])
+    return {
+        "steps": len(delays),
+        "emitted": len(times),
+        "recorded_span_s": span,
+        "lateness_ms": _ms(engine.last_lateness),
+        "interval_error_ms": _ms(lateness_stats(interval_err)),
+        "drift_ms": ((times[-1] - times[0]) - span) * 1000.0 if times else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Playback timing accuracy with a stubbed injector.")
+    parser.add_argument("--steps", type=int, default=200, help="steps per macro shape")
+    parser.add_argument("--spin-windows", default="0,2", help="comma-separated spin windows (ms) to compare")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    spins = [float(s) for s in args.spin_windows.split(",") if s.strip()]
+    results = {}
+    for name, delays in shapes(args.steps, args.seed).items():
+        results[name] = {f"spin_{s:g}ms": run_case(delays, s) for s in spins}
+
+    json.dump({"benchmark": "playback_timing", "steps": args.steps, "results": results}, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Recording throughput: how many key events per second the hook path keeps up
+with, and how many are dropped or handled late.
+
+No keyboard or display is needed. A synthetic generator plays the part of
+the `keyboard` hook thread: it builds event objects with the same fields
+(time, scan_code, name, event_type) and calls MacroEngine._on_key_event at
+a target rate, while the engine's own capture worker drains the ring as it
+would during a real recording. Each key is a down/up pair, so only half of
+the events become steps.
+
+An event is "late" when the capture worker handles it more than --late-ms
+after the hook saw it. Rate 0 means as fast as the generator can go. With
+--journal every run also writes the crash-recovery journal (to a temporary
+directory), and the cost of one JournalWriter.append is reported. The
+cost of the metrics the hook path updates per event (one counter, one
+histogram record) is always reported.
+
+    python benchmarks/bench_recording.py [--rates 1000,10000,100000,0] [--seconds S] [--journal]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.journal import JournalWriter, read_journal  # noqa: E402
+from macro_recorder.metrics import MetricsRegistry  # noqa: E402
+from macro_recorder.timing import lateness_stats  # noqa: E402
+
+KEYS = [(30 + i, k) for i, k in enumerate("asdfghjkl")]
+
+
+class SyntheticKeyEvent:
+    """Stand-in for keyboard.KeyboardEvent with the fields the engine reads."""
+
+    __slots__ = ("time", "scan_code", "name", "event_type")
+
+    def __init__(self, t, scan_code, name, event_type):
+        self.time = t
+        self.scan_code = scan_code
+        self.name = name
+        self.event_type = event_type
+
+
+def generate(hook, rate: float, seconds: float) -> int:
+    """
+    Call hook(event) `rate` times per second for `seconds`, alternating key
+    down/up. Events due since the last check are sent back to back, so the
+    average rate holds even when a single sleep overshoots.
+    """
+    now = time.time
+    sent = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while True:
+        t = time.perf_counter()
+        if t >= end:
+            break
+        due = int((t - start) * rate) + 1 if rate > 0 else sent + 256
+        while sent < due:
+            scan_code, name = KEYS[(sent >> 1) % len(KEYS)]
+            hook(SyntheticKeyEvent(now(), scan_code, name, "down" if sent & 1 == 0 else "up"))
+            sent += 1
+        if rate > 0:
+            time.sleep(min(0.001, max(0.0, start + (sent / rate) - time.perf_counter())))
+    return sent
+
+
+def run_rate(rate: float, seconds: float, late_ms: float, journal_path: str = None) -> dict:
+    engine = MacroEngine()
+    engine.use_hotkeys = False
+    engine.journal_path = journal_path
+    lags = []
+
+    handle = engine._handle_key_event
+
+    def timed_handle(t_event, t_hook, scan_code, name, event_type):
+        lags.append(time.time() - t_hook)
+        handle(t_event, t_hook, scan_code, name, event_type)
+
+    # The capture worker looks the handler up on the instance each time
+    engine._handle_key_event = timed_handle
+    worker = threading.Thread(target=engine._capture_worker, daemon=True)
+    worker.start()
+    engine.start_recording()
+
+    t0 = time.perf_counter()
+    sent = generate(engine._on_key_event, rate, seconds)
+    gen_s = time.perf_counter() - t0
+
+    # Let the worker drain what is still queued, then stop it
+    deadline = time.perf_counter() + 5.0
+    while len(lags) + engine._capture.dropped < sent and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    total_s = time.perf_counter() - t0
+    engine.stop_recording()
+    engine.close()
+    worker.join(1.0)
+
+    late_s = late_ms / 1000.0
+    stats = lateness_stats(lags)
+    journaled = None
+    if journal_path:
+        journaled = len(read_journal(journal_path)[0])
+        engine.discard_journal()
+    return {
+        "target_rate": rate or None,
+        "events_sent": sent,
+        "events_handled": len(lags),
+        "steps_recorded": len(engine.events),
+        "dropped": engine._capture.dropped,
+        "late": sum(1 for x in lags if x > late_s),
+        "achieved_events_per_s": sent / gen_s if gen_s > 0 else None,
+        "handled_events_per_s": len(lags) / total_s if total_s > 0 else None,
+        "handling_lag_ms": {k: (v * 1000.0 if k != "count" else v) for k, v in stats.items()},
+        "hook_stats": engine.capture_stats_text(),
+        "journaled_steps": journaled,
+    }
+
+
+def journal_append_cost(path: str, n: int = 200000) -> dict:
+    """Time spent in JournalWriter.append per step (the recording-path cost)."""
+    writer = JournalWriter(path, {}, flush_interval=0.05)
+    append = writer.append
+    t0 = time.perf_counter()
+    for _ in range(n):
+        append("a", 0.001)
+    elapsed = time.perf_counter() - t0
+    writer.close()
+    os.remove(path)
+    return {"appends": n, "us_per_append": elapsed / n * 1e6}
+
+
+def metrics_cost(n: int = 200000) -> dict:
+    """Per-event cost of the hook instrumentation (counter + histogram)."""
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total")
+    record = registry.histogram("callback_seconds").record
+    t0 = time.perf_counter()
+    for _ in range(n):
+        counter.value += 1
+        record(1.5e-6)
+    elapsed = time.perf_counter() - t0
+    return {"events": n, "us_per_event": elapsed / n * 1e6}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recording throughput with synthetic key events.")
+    parser.add_argument("--rates", default="1000,10000,100000,0",
+                        help="comma-separated events/s to try; 0 = unthrottled")
+    parser.add_argument("--seconds", type=float, default=1.0, help="generation time per rate")
+    parser.add_argument("--late-ms", type=float, default=33.0,
+                        help="handling lag that counts as late (default: one UI frame)")
+    parser.add_argument("--journal", action="store_true", help="also write the recording journal")
+    args = parser.parse_args(argv)
+
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    out = {"benchmark": "recording", "late_ms": args.late_ms, "journal": args.journal}
+    with tempfile.TemporaryDirectory(prefix="mrec-bench-") as tmp:
+        journal_path = os.path.join(tmp, "recording.mrj") if args.journal else None
+        out["results"] = [run_rate(rate, args.seconds, args.late_ms, journal_path) for rate in rates]
+        if args.journal:
+            out["journal_append"] = journal_append_cost(journal_path)
+    out["metrics_update"] = metrics_cost()
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
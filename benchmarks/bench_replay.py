@@ -0,0 +1,133 @@
+"""
+The always-on replay buffer (MacroEngine.enable_replay) under a long stream
+of key presses.
+
+    handle_ns       capture-worker cost per key event (_handle_key_event),
+                    buffer off versus on
+    growth_bytes    traced memory after --presses presses minus after the
+                    first capacity's worth: the ring is preallocated, so this
+                    stays flat however long it runs
+    take_ms         take() of the last --window seconds while a producer
+                    thread keeps appending; producer_max_gap_ms is its longest
+                    stall meanwhile. The ring lock is only held for the copy,
+                    so the stall is the GIL (a few switch intervals), not take
+
+    python benchmarks/bench_replay.py [--presses N] [--capacity N] [--window S]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.replay import ReplayBuffer  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def time_handle(engine: MacroEngine, n: int) -> float:
+    handle = engine._handle_key_event
+    t = time.time()
+    t0 = time.perf_counter()
+    for i in range(n):
+        handle(None, t + i * 0.001, 30 + i % 26, KEYS[i % 26], "down")
+    return (time.perf_counter() - t0) / n
+
+
+def run_growth(presses: int, capacity: int) -> dict:
+    buf = ReplayBuffer(capacity, span=None)
+    tracemalloc.start()
+    for i in range(capacity):
+        buf.append(KEYS[i % 26], i * 0.001)
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(capacity, presses):
+        buf.append(KEYS[i % 26], i * 0.001)
+    grown = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "presses": presses,
+        "held": len(buf),
+        "ring_bytes": buf.stats()["bytes"],
+        "growth_bytes": grown - base,
+    }
+
+
+def run_take(capacity: int, window: float, rounds: int) -> dict:
+    buf = ReplayBuffer(capacity, span=None)
+    now = time.time()
+    for i in range(capacity):
+        buf.append(KEYS[i % 26], now - (capacity - i) * 0.005)
+
+    stop = threading.Event()
+    gaps = []
+
+    def produce():
+        last = time.perf_counter()
+        i = 0
+        while not stop.is_set():
+            buf.append(KEYS[i % 26], time.time())
+            i += 1
+            t = time.perf_counter()
+            gaps.append(t - last)
+            last = t
+            time.sleep(0.0005)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    times = []
+    steps = 0
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        steps = len(buf.take(window))
+        times.append(time.perf_counter() - t0)
+    stop.set()
+    producer.join()
+    times.sort()
+    return {
+        "window_s": window,
+        "steps": steps,
+        "take_ms": times[len(times) // 2] * 1000.0,
+        "take_max_ms": times[-1] * 1000.0,
+        "producer_presses": len(gaps),
+        "producer_max_gap_ms": max(gaps) * 1000.0 if gaps else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay buffer cost, memory and take().")
+    parser.add_argument("--presses", type=int, default=2000000, help="presses streamed through the ring")
+    parser.add_argument("--capacity", type=int, default=100000)
+    parser.add_argument("--window", type=float, default=600.0, help="seconds taken per take()")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    engine = MacroEngine()
+    n = min(args.presses, 200000)
+    off = time_handle(engine, n)
+    engine.enable_replay(args.capacity, span=None)
+    on = time_handle(engine, n)
+
+    growth = run_growth(args.presses, args.capacity)
+    out = {
+        "benchmark": "replay",
+        "capacity": args.capacity,
+        "handle_off_ns": off * 1e9,
+        "handle_on_ns": on * 1e9,
+        "memory": growth,
+        "take": run_take(args.capacity, args.window, args.rounds),
+        # Bounded: no more than a few allocator pages, whatever --presses is
+        "ok": growth["growth_bytes"] < 64 * 1024,
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Bulk delay edits (macro_recorder.retime) over the whole delay column, from
+10k up to 10M steps.
+
+Every operation runs through MacroEngine.retime on a fresh copy of the same
+synthetic macro, once with NumPy (when it is installed) and once with the
+pure-Python fallback, so the two can be compared. With --check the fallback
+results are also compared against the NumPy ones (jitter excepted: the two
+draw from different generators).
+
+    python benchmarks/bench_retime.py [--sizes 10000,...,10000000] [--no-fallback-above N] [--check]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_fileio import make_store  # noqa: E402
+
+from macro_recorder import retime  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+
+DEFAULT_SIZES = "10000,100000,1000000,10000000"
+
+# (operation, seconds arguments)
+CASES = [
+    ("scale", (0.5,)),
+    ("clamp", (0.005, 0.08)),
+    ("quantize", (0.01,)),
+    ("set", (0.033,)),
+    ("jitter", (0.003, 1)),
+    ("cap_gaps", (0.05, 0.02)),
+]
+
+
+def run_case(source, op: str, args: tuple):
+    engine = MacroEngine()
+    engine.set_macro(source.copy(), {})
+    t0 = time.perf_counter()
+    engine.retime(op, *args)
+    elapsed = time.perf_counter() - t0
+    return elapsed, engine.events
+
+
+def run_size(n: int, backends: list, check: bool, fallback_max: int) -> dict:
+    source = make_store(n)
+    source.edit_delays()  # own the columns once, so copies are plain array copies
+    out = {"steps": n}
+    for op, args in CASES:
+        row = {}
+        results = {}
+        for name, module in backends:
+            if name == "python" and n > fallback_max:
+                continue
+            retime._numpy, retime._numpy_loaded = module, True
+            elapsed, events = run_case(source, op, args)
+            row[f"{name}_ms"] = elapsed * 1000.0
+            row[f"{name}_steps_per_s"] = n / elapsed if elapsed > 0 else None
+            results[name] = events
+        if check and op != "jitter" and len(results) == 2:
+            row["same_result"] = results["numpy"].content_hash() == results["python"].content_hash()
+        out[op] = row
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk delay edit speed, NumPy vs pure Python.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated step counts")
+    parser.add_argument("--no-fallback-above", type=int, default=1000000, metavar="N",
+                        help="skip the pure-Python fallback above this many steps")
+    parser.add_argument("--check", action="store_true", help="compare fallback results with NumPy's")
+    args = parser.parse_args(argv)
+
+    retime._numpy_loaded = False
+    numpy = retime.load_numpy()
+    backends = ([("numpy", numpy)] if numpy is not None else []) + [("python", None)]
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    out = {
+        "benchmark": "retime",
+        "numpy": getattr(numpy, "__version__", None),
+        "results": [run_size(n, backends, args.check, args.no_fallback_above) for n in sizes],
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Multi-macro playback (macro_recorder.scheduler) as the number of macros
+playing at once grows.
+
+    dispatch    scheduler cost per batch with 1 to 10k tracks, on a virtual
+                clock that jumps to each deadline (no real waiting), with the
+                total number of batches fixed
+    realtime    lateness with N macros on the real clock: one MacroScheduler
+                thread versus N MacroEngine threads playing at the same time
+
+Both use the fake (recording) backend, so nothing is typed.
+
+    python benchmarks/bench_scheduler.py [--tracks 1,10,...] [--batches N] [--realtime 1,4,16,64]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.scheduler import MacroScheduler  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+from macro_recorder.timing import LatenessStats, VirtualClock  # noqa: E402
+
+KEYS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class GatedClock(VirtualClock):
+    """VirtualClock whose first wait is held until every track is added."""
+
+    def __init__(self):
+        super().__init__()
+        self.go = threading.Event()
+
+    def wait_until(self, deadline, spin_window, interrupt) -> bool:
+        self.go.wait()
+        return super().wait_until(deadline, spin_window, interrupt)
+
+
+def make_macro(steps: int, rng: random.Random, low: float, high: float) -> EventStore:
+    return EventStore([(rng.choice(KEYS), rng.uniform(low, high)) for _ in range(steps)])
+
+
+def run_dispatch(tracks: int, batches: int) -> dict:
+    rng = random.Random(tracks)
+    steps = max(1, batches // tracks)
+    clock = GatedClock()
+    backend = RecordingBackend(clock=clock.now)
+    scheduler = MacroScheduler(backend, clock=clock, spin_window_ms=0, batch_window_ms=0)
+    macros = [make_macro(steps, rng, 0.005, 0.05) for _ in range(tracks)]
+    added = [scheduler.add(events, name=str(i), priority=i % 3) for i, events in enumerate(macros)]
+
+    t0 = time.perf_counter()
+    clock.go.set()
+    scheduler.wait()
+    elapsed = time.perf_counter() - t0
+    sent = sum(t.emits for t in added)
+    in_order = all(a[0] <= b[0] for a, b in zip(backend.emissions, backend.emissions[1:]))
+    return {
+        "tracks": tracks,
+        "batches": sent,
+        "ns_per_batch": elapsed / sent * 1e9 if sent else None,
+        "in_deadline_order": in_order,
+    }
+
+
+def run_realtime(tracks: int, steps: int) -> dict:
+    rng = random.Random(tracks)
+    macros = [make_macro(steps, rng, 0.002, 0.008) for _ in range(tracks)]
+
+    # Started a moment ahead, so adding (compiling) the later macros does not
+    # hold the GIL while the first ones play
+    scheduler = MacroScheduler(RecordingBackend())
+    added = [scheduler.add(events, start_delay=0.05) for events in macros]
+    scheduler.wait()
+    shared = LatenessStats()
+    for track in added:
+        shared.merge(track.lateness)
+
+    engines = []
+    for events in macros:
+        engine = MacroEngine()
+        engine.backend_name = "fake"
+        engine.backend = RecordingBackend()
+        engine.events = events
+        engines.append(engine)
+    for engine in engines:
+        engine.play()
+    for engine in engines:
+        engine.wait()
+    # Engines only keep lateness as stats; report the worst engine's
+    per_thread = [engine.last_lateness for engine in engines]
+
+    shared_stats = shared.stats()
+    out = {"tracks": tracks}
+    for q in ("p50", "p99", "max"):
+        out[f"scheduler_{q}_ms"] = shared_stats[q] * 1000.0
+        out[f"threads_{q}_ms"] = max(s[q] for s in per_thread) * 1000.0
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Multi-macro scheduler cost and lateness.")
+    parser.add_argument("--tracks", default="1,10,100,1000,10000", help="track counts for the dispatch test")
+    parser.add_argument("--batches", type=int, default=200000, help="total batches per dispatch run")
+    parser.add_argument("--realtime", default="1,4,16,64", help="track counts for the real-clock test")
+    parser.add_argument("--steps", type=int, default=50, help="steps per macro in the real-clock test")
+    args = parser.parse_args(argv)
+
+    out = {
+        "benchmark": "scheduler",
+        "dispatch": [run_dispatch(int(n), args.batches) for n in args.tracks.split(",") if n.strip()],
+        "realtime": [run_realtime(int(n), args.steps) for n in args.realtime.split(",") if n.strip()],
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
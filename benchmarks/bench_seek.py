@@ -0,0 +1,132 @@
+"""
+Seeking and progress through the time index (EventStore.time_index), from
+10k to 10M steps.
+
+    build_ms        first time_index() query: one running sum over the delays
+    seek_us         step_at(t) per call (bisection), random t
+    linear_seek_ms  the same answer by summing delays from step 0, for scale
+    progress_us     MacroEngine.progress() per call, as the window reads it
+    append_us       append() plus the next query (the index only extends)
+    edit_tail_ms,   set_delay() near the end / near the start plus the next
+    edit_head_ms    query (the stale tail is summed again)
+    range_plan_ms   compiling a plan for the last 1% of the macro
+
+Each seek is checked against the linear answer.
+
+    python benchmarks/bench_seek.py [--sizes 10000,1000000,10000000] [--seeks N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.backends import RecordingBackend  # noqa: E402
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.plan import compile_plan  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def make_store(n: int) -> EventStore:
+    rng = random.Random(n)
+    delays = array("d", (rng.choice((0.0, 0.001 * rng.randint(1, 500))) for _ in range(min(n, 100000))))
+    delays = (delays * (n // len(delays) + 1))[:n]
+    key_ids = (array("H", range(len(KEYS))) * (n // len(KEYS) + 1))[:n]
+    return EventStore.from_columns(KEYS, delays, key_ids)
+
+
+def linear_step_at(delays, t: float) -> int:
+    total = 0.0
+    for i, d in enumerate(delays):
+        total += d
+        if total >= t - 1e-9:
+            return i
+    return len(delays)
+
+
+def run_size(n: int, seeks: int) -> dict:
+    events = make_store(n)
+    engine = MacroEngine()
+    engine.events = events
+
+    t0 = time.perf_counter()
+    index = events.time_index()
+    total = index.total
+    build = time.perf_counter() - t0
+
+    rng = random.Random(1)
+    targets = [rng.uniform(0.0, total) for _ in range(seeks)]
+    t0 = time.perf_counter()
+    found = [index.step_at(t) for t in targets]
+    seek = (time.perf_counter() - t0) / seeks
+
+    checks = targets[:3]
+    t0 = time.perf_counter()
+    expected = [linear_step_at(events.delays_view(), t) for t in checks]
+    linear = (time.perf_counter() - t0) / len(checks)
+
+    t0 = time.perf_counter()
+    for i in range(seeks):
+        engine.play_position = i % n
+        engine.progress()
+    progress = (time.perf_counter() - t0) / seeks
+
+    rounds = 1000
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        events.append("a", 0.01)
+        index.total
+    append = (time.perf_counter() - t0) / rounds
+
+    def edit_at(i: int) -> float:
+        t0 = time.perf_counter()
+        events.set_delay(i, 0.02)
+        index.total
+        return time.perf_counter() - t0
+
+    edit_tail = edit_at(len(events) - 10)
+    edit_head = edit_at(10)
+
+    t0 = time.perf_counter()
+    compile_plan(events, RecordingBackend(), 1.0, 0.001, 0.0, start=len(events) - len(events) // 100)
+    range_plan = time.perf_counter() - t0
+
+    return {
+        "steps": n,
+        "build_ms": build * 1000.0,
+        "seek_us": seek * 1e6,
+        "linear_seek_ms": linear * 1000.0,
+        "progress_us": progress * 1e6,
+        "append_us": append * 1e6,
+        "edit_tail_ms": edit_tail * 1000.0,
+        "edit_head_ms": edit_head * 1000.0,
+        "range_plan_ms": range_plan * 1000.0,
+        "seeks_match": found[:len(checks)] == expected,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time-index seek and progress cost.")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma-separated step counts")
+    parser.add_argument("--seeks", type=int, default=20000, help="random seeks and progress reads per size")
+    args = parser.parse_args(argv)
+
+    out = {
+        "benchmark": "seek",
+        "results": [run_size(int(n), args.seeks) for n in args.sizes.split(",") if n.strip()],
+    }
+    out["ok"] = all(r["seeks_match"] for r in out["results"])
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Cold-start import cost of the package versus the old single-file module.
+
+Each scenario runs in a fresh interpreter (after one warm-up run so the
+bytecode cache is populated); the time of a bare interpreter start is
+subtracted. "legacy" imports what macro_recorder.py used to load at
+import time (tkinter, ttk, pyautogui, keyboard); modules that are not
+installed here are skipped and listed in the output.
+
+    python benchmarks/bench_startup.py [--runs N]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEGACY_MODULES = ["tkinter", "tkinter.ttk", "pyautogui", "keyboard"]
+
+
+def _available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except Exception:
+        return False
+
+
+def time_import(code: str, runs: int) -> list:
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    cmd = [sys.executable, "-c", code]
+    subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    legacy = [m for m in LEGACY_MODULES if _available(m)]
+    scenarios = {
+        "bare_interpreter": "pass",
+        "package": "import macro_recorder",
+        "cli_info_path": "import macro_recorder.cli, macro_recorder.fileio",
+        "legacy": "import " + ", ".join(legacy) if legacy else "pass",
+    }
+
+    results = {}
+    for name, code in scenarios.items():
+        samples = time_import(code, args.runs)
+        results[name] = {"median_s": statistics.median(samples), "min_s": min(samples)}
+
+    base = results["bare_interpreter"]["median_s"]
+    for r in results.values():
+        r["import_ms"] = max(0.0, (r["median_s"] - base) * 1000.0)
+
+    legacy_ms = results["legacy"]["import_ms"]
+    package_ms = results["package"]["import_ms"]
+    out = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "legacy_modules_measured": legacy,
+        "legacy_modules_missing": [m for m in LEGACY_MODULES if m not in legacy],
+        "results": results,
+        "saved_ms": legacy_ms - package_ms,
+    }
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
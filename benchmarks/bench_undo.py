@@ -0,0 +1,119 @@
+"""
+Undo/redo (macro_recorder.history) on macros from 10k to 10M steps, with a
+long history of single-delay edits.
+
+    edit_us         MacroEngine.set_delay() including taking its undo step
+    undo_us,        per undo / redo, the whole history back and forth
+    redo_us
+    bytes_per_edit  memory held per edit after undo (the touched chunk
+                    before and after), from tracemalloc
+    snapshot_ms     copying the whole macro once, what a naive undo step
+                    would cost per edit
+    retime_undo_ms  undoing a retime of the whole macro (every chunk)
+    clear_undo_us   undoing a clear (the old store is swapped back)
+
+Each size checks the macro is back to its first content hash at the end.
+
+    python benchmarks/bench_undo.py [--sizes 10000,1000000,10000000] [--edits N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macro_recorder.engine import MacroEngine  # noqa: E402
+from macro_recorder.store import EventStore  # noqa: E402
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz")
+
+
+def make_store(n: int) -> EventStore:
+    delays = (array("d", (0.001 * (i % 500) for i in range(1000))) * (n // 1000 + 1))[:n]
+    key_ids = (array("H", range(len(KEYS))) * (n // len(KEYS) + 1))[:n]
+    return EventStore.from_columns(KEYS, delays, key_ids)
+
+
+def run_size(n: int, edits: int) -> dict:
+    engine = MacroEngine()
+    engine.events = make_store(n)
+    engine.history.limit = edits
+    first_hash = engine.events.content_hash()
+    rng = random.Random(n)
+
+    t0 = time.perf_counter()
+    snapshot = engine.events.copy()
+    snapshot_ms = (time.perf_counter() - t0) * 1000.0
+    del snapshot
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    for _ in range(edits):
+        engine.set_delay(rng.randrange(n), rng.random())
+    edit = (time.perf_counter() - t0) / edits
+
+    t0 = time.perf_counter()
+    while engine.undo() is not None:
+        pass
+    undo = (time.perf_counter() - t0) / edits
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    while engine.redo() is not None:
+        pass
+    redo = (time.perf_counter() - t0) / edits
+    while engine.undo() is not None:
+        pass
+    restored = engine.events.content_hash() == first_hash
+
+    engine.retime("scale", 1.5)
+    t0 = time.perf_counter()
+    engine.undo()
+    retime_undo = time.perf_counter() - t0
+
+    engine.clear()
+    t0 = time.perf_counter()
+    engine.undo()
+    clear_undo = time.perf_counter() - t0
+    restored = restored and engine.events.content_hash() == first_hash
+
+    return {
+        "steps": n,
+        "edits": edits,
+        "edit_us": edit * 1e6,
+        "undo_us": undo * 1e6,
+        "redo_us": redo * 1e6,
+        "bytes_per_edit": held / edits,
+        "snapshot_ms": snapshot_ms,
+        "retime_undo_ms": retime_undo * 1000.0,
+        "clear_undo_us": clear_undo * 1e6,
+        "restored": restored,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Undo/redo cost and memory per edit.")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma-separated step counts")
+    parser.add_argument("--edits", type=int, default=1000, help="single-delay edits in the history")
+    args = parser.parse_args(argv)
+
+    out = {
+        "benchmark": "undo",
+        "results": [run_size(int(n), args.edits) for n in args.sizes.split(",") if n.strip()],
+    }
+    out["ok"] = all(r["restored"] for r in out["results"])
+    json.dump(out, sys.stdout, indent=2)
+    print()
+    return 0 if out["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Run every benchmark and collect their JSON into one report.
+
+Each bench_*.py script runs in its own interpreter and prints one JSON
+object; this wraps them with the commit, Python version and platform so
+reports from different commits can be compared side by side. None of the
+benchmarks needs a display or a real keyboard.
+
+    python benchmarks/run_all.py [--quick] [--only recording,fileio] [--out report.json]
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Smaller parameters for a fast smoke run
+QUICK_ARGS = {
+    "cancel_latency": ["--trials", "10"],
+    "hook": ["--events", "50000", "--repeats", "2"],
+    "background_io": ["--steps", "200000"],
+    "control": ["--trials", "200", "--pipeline", "2000"],
+    "dryrun": ["--sizes", "1000,10000"],
+    "fileio": ["--sizes", "1000,100000,1000000", "--json-max-steps", "100000"],
+    "injection": ["--keys", "20000"],
+    "playback": ["--steps", "50"],
+    "recording": ["--rates", "1000,100000,0", "--seconds", "0.5"],
+    "retime": ["--sizes", "10000,1000000", "--check"],
+    "scheduler": ["--tracks", "1,100,1000", "--batches", "50000", "--realtime", "1,16"],
+    "seek": ["--sizes", "10000,1000000", "--seeks", "5000"],
+    "calibration": ["--costs", "2", "--steps", "150", "--samples", "100"],
+    "undo": ["--sizes", "10000,1000000", "--edits", "200"],
+    "replay": ["--presses", "300000", "--rounds", "5"],
+    "startup": ["--runs", "5"],
+}
+
+
+def discover() -> dict:
+    scripts = {}
+    for path in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        name = os.path.basename(path)[len("bench_"):-len(".py")]
+        scripts[name] = path
+    return scripts
+
+
+def git_info() -> dict:
+    def git(*args):
+        try:
+            out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return out.stdout.strip() if out.returncode == 0 else None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(status) if status is not None else None,
+    }
+
+
+def run_one(path: str, extra: list) -> dict:
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, path, *extra], cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    entry = {"args": extra, "exit_code": proc.returncode, "elapsed_s": elapsed}
+    try:
+        entry["result"] = json.loads(proc.stdout)
+    except ValueError:
+        entry["result"] = None
+        entry["stderr"] = proc.stderr[-4000:]
+    return entry
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run all benchmarks and write one JSON report.")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer trials")
+    parser.add_argument("--only", help="comma-separated benchmark names (default: all)")
+    parser.add_argument("--out", help="write the report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    scripts = discover()
+    names = list(scripts)
+    if args.only:
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+        unknown = [n for n in names if n not in scripts]
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(unknown)} (have: {', '.join(scripts)})")
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git": git_info(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    failed = []
+    for name in names:
+        print(f"running {name} ...", file=sys.stderr)
+        entry = run_one(scripts[name], QUICK_ARGS.get(name, []) if args.quick else [])
+        report["benchmarks"][name] = entry
+        if entry["exit_code"] != 0:
+            failed.append(name)
+    report["failed"] = failed
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""
+Simple macro recorder for keystrokes.
+
+Importing the package is cheap: tkinter, pyautogui and keyboard are only
+loaded when the GUI starts, playback begins or the key hook is installed.
+"""
+
+from .engine import MacroEngine
+from .fileio import convert_macro, read_macro, write_macro
+from .store import EventStore
+
+__all__ = ["EventStore", "MacroEngine", "convert_macro", "read_macro", "write_macro"]
@@ -0,0 +1,1528 @@
+"""Tk front end: wraps a MacroEngine with the recorder window."""
+
+import os
+import time
+import tkinter as tk
+from collections import deque
+from concurrent.futures import Future
+from tkinter import ttk, filedialog, messagebox, simpledialog
+
+from .blocks import BlockOutline
+from .engine import MacroEngine, load_keyboard, ms_int_to_sec, sec_to_ms_int
+from .fileio import MACRO_FILETYPES, FileTask, read_macro, write_macro
+from .journal import default_journal_path, read_journal
+from .metrics import METRICS_FILE_ENV, METRICS_PORT_ENV, MetricsFileWriter, MetricsServer
+from .profiler import SamplingProfiler
+from .replay import REPLAY_SPAN_S
+from .store import EventStore
+from .timing import DEFAULT_SPIN_WINDOW_MS, format_duration, format_progress, parse_duration
+
+
+# ---------------- Step list ----------------
+
+# Queued step rows are drained and repainted at this interval (~30 fps).
+UI_FRAME_MS = 33
+
+
+class StepListView:
+    """
+    Virtualized Treeview over an EventStore.
+
+    Only the rows that fit in the widget exist as Treeview items ("slots",
+    iids "0".."n"); scrolling rewrites their values from the store, so the
+    Tk cost stays the same however long the macro is.
+
+    A compressed store is shown as an outline instead: one row per step or
+    repeat block, with a block's body listed under it once it is opened.
+    Rows are then outline rows, and step_at() maps them back to steps.
+
+    Shift+click selects a range of rows from the last clicked one, even
+    across rows that have scrolled out of the widget.
+    """
+
+    COLUMNS = ("step", "key", "delay_ms")
+
+    def __init__(self, parent, store: EventStore):
+        self.store = store
+        self.first = 0           # row shown in slot 0
+        self.rows = 1            # slots that fit in the widget
+        self.selected = None     # selected row (the range anchor)
+        self.select_end = None   # other end of a Shift+click range
+        self.outline = None      # BlockOutline while showing a compressed store
+        self.on_scroll = None    # called before the visible window moves
+        self._height = 0
+        self._shown = []         # values currently shown per slot
+        self._synced = ()        # slots last selected by _sync_selection
+
+        self.tree = ttk.Treeview(parent, columns=self.COLUMNS, show="headings", selectmode="extended")
+        self.tree.heading("step", text="#")
+        self.tree.heading("key", text="Key")
+        self.tree.heading("delay_ms", text="Delay (ms)")
+        self.tree.column("step", width=60, anchor="e", stretch=False)
+        self.tree.column("key", width=180, anchor="w", stretch=True)
+        self.tree.column("delay_ms", width=120, anchor="e", stretch=False)
+        self.tree.grid(row=0, column=0, sticky="nsew", padx=8, pady=8)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns", pady=8)
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda _e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda _e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda _e: self.scroll(-self.rows))
+        self.tree.bind("<Next>", lambda _e: self.scroll(self.rows))
+        self.tree.bind("<Return>", lambda _e: self.toggle_selected())
+        self.tree.bind("<Shift-Button-1>", self._on_shift_click)
+        self.tree.bind("<Control-Button-1>", self._on_shift_click)
+
+    def set_store(self, store: EventStore):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        self.first = 0
+        self.selected = None
+        self.select_end = None
+        self.outline = None
+        self.refresh()
+
+    def slot_index(self, iid: str) -> int:
+        """Row currently shown in the given slot."""
+        return self.first + int(iid)
+
+    def step_at(self, row: int):
+        """Step index shown on a row, or None for a repeat block row."""
+        if self.outline is None:
+            return row
+        return self.outline.step_index(row)
+
+    def _row_count(self) -> int:
+        blocks = self.store.blocks
+        if blocks is None:
+            self.outline = None
+        elif self.outline is None or self.outline.blocks is not blocks:
+            self.outline = BlockOutline(blocks)
+        return len(self.store) if self.outline is None else len(self.outline)
+
+    def toggle_block(self, row: int) -> bool:
+        """Open or close the repeat block on a row; False if it is not one."""
+        if self.outline is None or not 0 <= row < len(self.outline) or not self.outline.is_block(row):
+            return False
+        self.outline.toggle(row)
+        self.refresh()
+        return True
+
+    def selected_rows(self):
+        """(first, last) selected rows, inclusive, or None."""
+        if self.selected is None:
+            return None
+        end = self.selected if self.select_end is None else self.select_end
+        return min(self.selected, end), max(self.selected, end)
+
+    def selected_steps(self):
+        """Steps covered by the selection as a range (start, stop), or None."""
+        rows = self.selected_rows()
+        if rows is None:
+            return None
+        lo, hi = rows
+        if self.outline is None:
+            return lo, hi + 1
+        _d, _item, start, _p = self.outline.rows[lo]
+        _d, item, last, _p = self.outline.rows[hi]
+        return start, last + (1 if type(item) is tuple else item.steps)
+
+    def toggle_selected(self):
+        if self.selected is not None:
+            self.toggle_block(self.selected)
+
+    # -- geometry / scrolling --
+
+    def _on_configure(self, event):
+        self._height = event.height
+        self.refresh()
+
+    def _fit_rows(self) -> int:
+        # Measure a real row once one is on screen; estimate until then.
+        bbox = self.tree.bbox("0") if self._shown else None
+        header, row_h = (bbox[1], bbox[3]) if bbox else (24, 20)
+        return max(1, (self._height - header) // max(1, row_h))
+
+    def yview(self, *args):
+        n = self._row_count()
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._move_to(int(float(args[1]) * n))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self._move_to(self.first + step * (self.rows if args[2] == "pages" else 1))
+
+    def scroll(self, rows: int):
+        self._move_to(self.first + rows)
+        return "break"
+
+    def _on_wheel(self, event):
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-3 * delta)
+
+    def _move_to(self, first: int):
+        if first == self.first:
+            return
+        if self.on_scroll is not None:
+            self.on_scroll()
+        self.first = first
+        self.refresh()
+
+    def see(self, index: int):
+        if index < self.first:
+            self._move_to(index)
+        elif index >= self.first + self.rows:
+            self._move_to(index - self.rows + 1)
+
+    # -- painting --
+
+    def refresh(self, follow: bool = False):
+        """Repaint visible slots; with follow=True keep the last row in view."""
+        n = self._row_count()
+        self.rows = self._fit_rows()
+        if follow:
+            self.first = n - self.rows
+        self.first = max(0, min(self.first, n - self.rows))
+        count = max(0, min(self.rows, n - self.first))
+
+        while len(self._shown) < count:
+            self.tree.insert("", "end", iid=str(len(self._shown)), values=())
+            self._shown.append(None)
+        while len(self._shown) > count:
+            self._shown.pop()
+            self.tree.delete(str(len(self._shown)))
+
+        store = self.store
+        outline = self.outline
+        keys = store.keys if outline is not None else None
+        for slot in range(count):
+            idx = self.first + slot
+            if outline is None:
+                key, delay = store[idx]
+                values = (f"{idx + 1:03d}", key, str(sec_to_ms_int(delay)))
+            else:
+                values = self._outline_values(idx, keys)
+            if self._shown[slot] != values:
+                self._shown[slot] = values
+                self.tree.item(str(slot), values=values)
+
+        if n:
+            self.scrollbar.set(self.first / n, min(1.0, (self.first + self.rows) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._sync_selection(count)
+
+    def _outline_values(self, row: int, keys: tuple) -> tuple:
+        depth, item, start, path = self.outline.rows[row]
+        indent = "    " * depth
+        if type(item) is tuple:
+            kid, delay = item
+            return (f"{start + 1:03d}", indent + keys[kid], str(sec_to_ms_int(delay)))
+        mark = "▾" if path in self.outline.expanded else "▸"
+        return (f"{start + 1:03d}", f"{indent}{mark} repeat ×{item.count} ({item.steps} steps)", "")
+
+    def _sync_selection(self, count: int):
+        rows = self.selected_rows()
+        wanted = ()
+        if rows is not None:
+            lo = max(rows[0] - self.first, 0)
+            hi = min(rows[1] - self.first, count - 1)
+            wanted = tuple(str(slot) for slot in range(lo, hi + 1))
+        if self.tree.selection() != wanted:
+            self.tree.selection_set(wanted)
+        self._synced = wanted
+
+    def _on_select(self, _event):
+        sel = self.tree.selection()
+        # Ignore the echo of our own selection_set(); anything else is the user
+        if not sel or sel == self._synced:
+            return
+        rows = [self.slot_index(iid) for iid in sel]
+        self.selected = min(rows)
+        self.select_end = max(rows) if len(rows) > 1 else None
+        self._synced = sel
+
+    def _on_shift_click(self, event):
+        iid = self.tree.identify_row(event.y)
+        if not iid:
+            return "break"
+        row = self.slot_index(iid)
+        if self.selected is None:
+            self.selected = row
+        self.select_end = row
+        self._sync_selection(len(self._shown))
+        return "break"
+
+
+# ---------------- Library window ----------------
+
+class LibraryWindow:
+    """
+    Search the macro library and switch macros without a file dialog.
+    Results come from the index; loading goes through the library's cache.
+    """
+
+    COLUMNS = ("name", "steps", "duration", "toggle", "path")
+    SEARCH_DELAY_MS = 150
+
+    def __init__(self, app: "MacroApp"):
+        self.app = app
+        self.top = tk.Toplevel(app.root)
+        self.top.title("Macro Library")
+        self.top.geometry("760x440")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self._pending = None
+
+        self.query = tk.StringVar()
+        self.keys_filter = tk.StringVar()
+        self.order = tk.StringVar(value="recent")
+
+        frm = ttk.Frame(self.top, padding=10)
+        frm.grid(row=0, column=0, sticky="nsew")
+        self.top.columnconfigure(0, weight=1)
+        self.top.rowconfigure(0, weight=1)
+        frm.columnconfigure(1, weight=1)
+        frm.rowconfigure(2, weight=1)
+
+        self.folder = ttk.Label(frm, anchor="w")
+        self.folder.grid(row=0, column=0, columnspan=4, sticky="ew")
+        ttk.Button(frm, text="Change folder...", command=self.change_folder).grid(row=0, column=4, padx=(8, 0))
+        ttk.Button(frm, text="Refresh", command=self.refresh).grid(row=0, column=5, padx=(8, 0))
+
+        ttk.Label(frm, text="Search:").grid(row=1, column=0, sticky="w", pady=(8, 0))
+        entry = ttk.Entry(frm, textvariable=self.query)
+        entry.grid(row=1, column=1, sticky="ew", padx=(8, 8), pady=(8, 0))
+        ttk.Label(frm, text="Contains keys:").grid(row=1, column=2, sticky="w", pady=(8, 0))
+        ttk.Entry(frm, textvariable=self.keys_filter, width=14).grid(row=1, column=3, padx=(8, 8), pady=(8, 0))
+        order = ttk.Combobox(frm, textvariable=self.order, values=("recent", "name", "steps", "duration"),
+                             state="readonly", width=9)
+        order.grid(row=1, column=4, columnspan=2, sticky="e", pady=(8, 0))
+
+        for var in (self.query, self.keys_filter, self.order):
+            var.trace_add("write", lambda *_a: self._schedule_search())
+
+        self.tree = ttk.Treeview(frm, columns=self.COLUMNS, show="headings", selectmode="browse")
+        for col, text, width, anchor in (
+            ("name", "Name", 180, "w"), ("steps", "Steps", 80, "e"), ("duration", "Duration (s)", 100, "e"),
+            ("toggle", "Toggle key", 90, "center"), ("path", "File", 240, "w"),
+        ):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, anchor=anchor)
+        self.tree.grid(row=2, column=0, columnspan=6, sticky="nsew", pady=(8, 0))
+        scroll = ttk.Scrollbar(frm, orient="vertical", command=self.tree.yview)
+        scroll.grid(row=2, column=6, sticky="ns", pady=(8, 0))
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.bind("<Double-1>", lambda _e: self.load_selected())
+        self.tree.bind("<Return>", lambda _e: self.load_selected())
+
+        bottom = ttk.Frame(frm)
+        bottom.grid(row=3, column=0, columnspan=6, sticky="ew", pady=(8, 0))
+        bottom.columnconfigure(2, weight=1)
+        ttk.Button(bottom, text="Load", command=self.load_selected).grid(row=0, column=0, padx=(0, 8))
+        ttk.Button(bottom, text="Save current...", command=self.save_current).grid(row=0, column=1, padx=(0, 8))
+        self.status = ttk.Label(bottom, anchor="w")
+        self.status.grid(row=0, column=2, sticky="ew")
+
+        entry.focus_set()
+        self.refresh()
+
+    @property
+    def library(self):
+        return self.app.library
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.app._library_window = None
+        self.top.destroy()
+
+    def _schedule_search(self):
+        if self._pending is not None:
+            self.top.after_cancel(self._pending)
+        self._pending = self.top.after(self.SEARCH_DELAY_MS, self.search)
+
+    def search(self):
+        self._pending = None
+        keys = self.keys_filter.get().lower().split()
+        try:
+            entries = self.library.search(self.query.get().strip(), keys=keys, order=self.order.get(), limit=1000)
+        except Exception as ex:
+            self.status.config(text=f"Search failed: {ex}")
+            return
+        self.tree.delete(*self.tree.get_children())
+        for e in entries:
+            self.tree.insert("", "end", iid=e.path,
+                             values=(e.name, e.steps, f"{e.duration:.2f}", e.toggle_key, e.path))
+        self.status.config(text=f"{len(entries)} shown, {len(self.library)} in library, "
+                                f"{len(self.library.cached())} cached")
+
+    def refresh(self):
+        self.folder.config(text=f"Folder: {self.library.directory}")
+        try:
+            stats = self.library.refresh()
+        except Exception as ex:
+            messagebox.showerror("Library", str(ex), parent=self.top)
+            return
+        self.search()
+        if stats["failed"]:
+            rel, err = stats["failed"][0]
+            self.status.config(text=f"{len(stats['failed'])} file(s) skipped, e.g. {rel}: {err}")
+
+    def change_folder(self):
+        path = filedialog.askdirectory(parent=self.top, title="Macro library folder",
+                                       initialdir=self.library.directory)
+        if path and self.app.open_library(path):
+            self.refresh()
+
+    def load_selected(self):
+        sel = self.tree.selection()
+        if sel:
+            self.app.load_from_library(sel[0])
+            self.search()  # "recent" order and the cache count changed
+
+    def save_current(self):
+        name = simpledialog.askstring("Save to library", "Name (add .mrec for the binary format):",
+                                      parent=self.top)
+        if name and name.strip() and self.app.save_to_library(name.strip()):
+            self.search()
+
+
+# ---------------- Retime window ----------------
+
+# Label -> (retime operation, [(parameter label, kind, default)]). "ms" values
+# are converted to seconds; blank optional values are passed as None.
+RETIME_OPERATIONS = {
+    "Scale": ("scale", [("Factor", "factor", "1.0")]),
+    "Clamp": ("clamp", [("Min (ms)", "ms", ""), ("Max (ms)", "ms", "")]),
+    "Quantize": ("quantize", [("Step (ms)", "ms", "10")]),
+    "Set constant": ("set", [("Delay (ms)", "ms", "50")]),
+    "Add jitter": ("jitter", [("Up to \u00b1 (ms)", "ms", "5"), ("Seed", "seed", "")]),
+    "Cap idle gaps": ("cap_gaps", [("Above (ms)", "ms", "1000"), ("Shorten to (ms)", "ms", "")]),
+}
+
+
+class RetimeWindow:
+    """Bulk delay edits over the selected steps or the whole macro."""
+
+    def __init__(self, app: "MacroApp"):
+        self.app = app
+        self.top = tk.Toplevel(app.root)
+        self.top.title("Retime")
+        self.top.resizable(False, False)
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.operation = tk.StringVar(value="Scale")
+        self.values = [tk.StringVar(), tk.StringVar()]
+        self.scope = tk.StringVar(value="selection")
+
+        frm = ttk.Frame(self.top, padding=10)
+        frm.grid(row=0, column=0, sticky="nsew")
+
+        ttk.Label(frm, text="Operation:").grid(row=0, column=0, sticky="w")
+        ops = ttk.Combobox(frm, textvariable=self.operation, values=tuple(RETIME_OPERATIONS),
+                           state="readonly", width=16)
+        ops.grid(row=0, column=1, sticky="w", padx=(8, 0))
+        self.operation.trace_add("write", lambda *_a: self._show_params())
+
+        self.labels = []
+        self.entries = []
+        for i, var in enumerate(self.values):
+            label = ttk.Label(frm)
+            label.grid(row=1 + i, column=0, sticky="w", pady=(8, 0))
+            entry = ttk.Entry(frm, textvariable=var, width=12)
+            entry.grid(row=1 + i, column=1, sticky="w", padx=(8, 0), pady=(8, 0))
+            self.labels.append(label)
+            self.entries.append(entry)
+
+        ttk.Radiobutton(frm, text="Selected steps", variable=self.scope, value="selection").grid(
+            row=3, column=0, sticky="w", pady=(8, 0))
+        ttk.Radiobutton(frm, text="Whole macro", variable=self.scope, value="all").grid(
+            row=3, column=1, sticky="w", padx=(8, 0), pady=(8, 0))
+
+        ttk.Button(frm, text="Apply", command=self.apply).grid(row=4, column=0, sticky="w", pady=(10, 0))
+        self.status = ttk.Label(frm, anchor="w", width=36)
+        self.status.grid(row=5, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+
+        self.top.bind("<Return>", lambda _e: self.apply())
+        self._show_params()
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+
+    def close(self):
+        self.app._retime_window = None
+        self.top.destroy()
+
+    def _show_params(self):
+        _op, params = RETIME_OPERATIONS[self.operation.get()]
+        for i, (label, entry, var) in enumerate(zip(self.labels, self.entries, self.values)):
+            if i < len(params):
+                text, _kind, default = params[i]
+                label.config(text=text + ":")
+                var.set(default)
+                label.grid()
+                entry.grid()
+            else:
+                label.grid_remove()
+                entry.grid_remove()
+
+    def _parse(self) -> list:
+        _op, params = RETIME_OPERATIONS[self.operation.get()]
+        args = []
+        for (text, kind, default), var in zip(params, self.values):
+            raw = var.get().strip()
+            if not raw:
+                if default:
+                    raise ValueError(f"{text} is required.")
+                args.append(None)
+            elif kind == "seed":
+                args.append(int(raw))
+            elif kind == "ms":
+                args.append(float(raw) / 1000.0)
+            else:
+                args.append(float(raw))
+        return args
+
+    def apply(self):
+        try:
+            args = self._parse()
+        except ValueError as ex:
+            messagebox.showerror("Invalid value", str(ex) if str(ex).endswith(".") else "Enter a number.",
+                                 parent=self.top)
+            return
+        op, _params = RETIME_OPERATIONS[self.operation.get()]
+        result = self.app.retime(op, args, whole=self.scope.get() == "all")
+        if result is not None:
+            count, elapsed = result
+            self.status.config(text=f"{self.operation.get()}: {count} steps in {elapsed * 1000:.1f} ms")
+
+
+class MacroApp:
+    def __init__(self, root: tk.Tk):
+        self.root = root
+        self.root.title("Simple Macro Recorder")
+
+        # Recording, playback and files live in the engine; callbacks arrive
+        # on its worker threads and are marshalled onto the Tk thread here.
+        self.engine = MacroEngine()
+        self.engine.on_status = lambda msg: self.root.after(0, lambda: self._set_status(msg))
+        self.engine.on_step_recorded = self._ui_queue_append
+        self.engine.on_toggle_captured = lambda key_id: self.root.after(0, lambda: self._finish_capture_toggle_key(key_id))
+        self.engine.on_toggle_pressed = lambda: self.root.after(0, self.toggle_playback)
+        # Recordings are journaled so a crash does not lose them
+        self.engine.journal_path = default_journal_path()
+
+        # Inline editor state
+        self._edit_entry = None
+        self._edit_iid = None
+        self._edit_index = None
+
+        # Macro library, opened on first use
+        self.library = None
+        self._library_window = None
+        self._retime_window = None
+
+        # Load or save running on a worker thread (polled per frame)
+        self._file_task = None
+        self._file_task_info = None
+
+        # Recorded step indices waiting for the Tk thread (drained per frame)
+        self._ui_queue = deque()
+
+        # Metrics export (opt-in through the environment) and the profiler toggle
+        self.engine.metrics.gauge("ui_queue_depth", "Recorded steps waiting for the Tk thread",
+                                  fn=lambda: len(self._ui_queue))
+        self._m_ui_drain = self.engine.metrics.histogram(
+            "ui_drain_seconds", "Tk time to drain the step queue and repaint, per frame")
+        self._metrics_writer = None
+        self._metrics_server = None
+        self._control_server = None
+        self.profiler = SamplingProfiler()
+        self.profiling = tk.BooleanVar(value=False)
+
+        # Options (mirrored into the engine before use)
+        self.use_hotkeys = tk.BooleanVar(value=True)
+        self.playback_speed = tk.DoubleVar(value=1.0)
+        self.spin_window_ms = tk.DoubleVar(value=DEFAULT_SPIN_WINDOW_MS)
+
+        # Toggle key: can be "f8" or "scan:<code>"
+        self.play_toggle_key = tk.StringVar(value=self.engine.play_toggle_key)
+
+        # Repeat options
+        self.repeat_enabled = tk.BooleanVar(value=False)
+        self.repeat_delay_ms = tk.IntVar(value=250)
+
+        # Always-on replay buffer
+        self.replay_on = tk.BooleanVar(value=False)
+
+        self.keyboard_available = load_keyboard() is not None
+
+        # UI
+        self._build_ui()
+        self._sync_edit_buttons()
+
+        # Hook keyboard if possible
+        if self.keyboard_available and self.engine.attach_keyboard():
+            self._setup_hotkeys()  # only F9/F10/ESC; toggle handled manually
+        else:
+            self.use_hotkeys.set(False)
+            self.engine.use_hotkeys = False
+            self._set_status("keyboard module not available. Recording hotkeys disabled.")
+
+        self.root.after(UI_FRAME_MS, self._drain_ui_queue)
+        self.root.after(0, self._offer_recovery)
+        self._start_metrics_export()
+        self._start_control_server()
+
+        # Clean shutdown
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    @property
+    def events(self) -> EventStore:
+        return self.engine.events
+
+    @property
+    def recording(self) -> bool:
+        return self.engine.recording
+
+    # ---------------- Helpers: ms formatting ----------------
+
+    sec_to_ms_int = staticmethod(sec_to_ms_int)
+    ms_int_to_sec = staticmethod(ms_int_to_sec)
+
+    def _resolve_toggle_key(self):
+        self.engine.set_toggle_key(self.play_toggle_key.get())
+
+    def _sync_engine(self):
+        """Copy the Tk option variables into the engine's plain fields."""
+        self.engine.use_hotkeys = bool(self.use_hotkeys.get())
+        self.engine.speed = float(self.playback_speed.get())
+        try:
+            self.engine.spin_window_ms = max(0.0, float(self.spin_window_ms.get()))
+        except Exception:
+            self.engine.spin_window_ms = DEFAULT_SPIN_WINDOW_MS
+        self.engine.repeat_enabled = bool(self.repeat_enabled.get())
+        self.engine.repeat_delay_ms = int(self.repeat_delay_ms.get() or 0)
+
+    # ---------------- UI ----------------
+
+    def _build_ui(self):
+        frm = ttk.Frame(self.root, padding=12)
+        frm.grid(row=0, column=0, sticky="nsew")
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+
+        # Buttons row
+        btns = ttk.Frame(frm)
+        btns.grid(row=0, column=0, sticky="ew")
+
+        self.btn_record = ttk.Button(btns, text="Start Recording", command=self.toggle_recording)
+        self.btn_record.grid(row=0, column=0, padx=(0, 8))
+
+        self.btn_play = ttk.Button(btns, text="Play", command=self.play_macro)
+        self.btn_play.grid(row=0, column=1, padx=(0, 8))
+
+        self.btn_play_from = ttk.Button(btns, text="Play from...", command=self.play_from)
+        self.btn_play_from.grid(row=0, column=2, padx=(0, 8))
+
+        self.btn_pause = ttk.Button(btns, text="Pause", command=self.toggle_pause)
+        self.btn_pause.grid(row=0, column=3, padx=(0, 8))
+
+        self.btn_stop = ttk.Button(btns, text="Stop", command=self.stop_playback)
+        self.btn_stop.grid(row=0, column=4, padx=(0, 8))
+
+        self.btn_clear = ttk.Button(btns, text="Clear", command=self.clear_macro)
+        self.btn_clear.grid(row=0, column=5, padx=(0, 8))
+
+        self.btn_save = ttk.Button(btns, text="Save", command=self.save_macro)
+        self.btn_save.grid(row=0, column=6, padx=(0, 8))
+
+        self.btn_load = ttk.Button(btns, text="Load", command=self.load_macro)
+        self.btn_load.grid(row=0, column=7, padx=(0, 8))
+
+        self.btn_library = ttk.Button(btns, text="Library", command=self.open_library_window)
+        self.btn_library.grid(row=0, column=8, padx=(0, 8))
+
+        self.btn_compress = ttk.Button(btns, text="Compress", command=self.toggle_compression)
+        self.btn_compress.grid(row=0, column=9, padx=(0, 8))
+
+        self.btn_retime = ttk.Button(btns, text="Retime...", command=self.open_retime_window)
+        self.btn_retime.grid(row=0, column=10, padx=(0, 8))
+
+        self.btn_dry_run = ttk.Button(btns, text="Dry run", command=self.dry_run)
+        self.btn_dry_run.grid(row=0, column=11, padx=(0, 8))
+
+        self.btn_undo = ttk.Button(btns, text="Undo", command=self.undo)
+        self.btn_undo.grid(row=0, column=12, padx=(0, 8))
+
+        self.btn_redo = ttk.Button(btns, text="Redo", command=self.redo)
+        self.btn_redo.grid(row=0, column=13, padx=(0, 8))
+
+        for seq, fn in (("<Control-z>", self.undo), ("<Control-y>", self.redo), ("<Control-Shift-Z>", self.redo)):
+            self.root.bind(seq, lambda e, fn=fn: None if isinstance(e.widget, (tk.Entry, ttk.Entry)) else fn())
+
+        opts = ttk.Frame(frm)
+        opts.grid(row=1, column=0, sticky="ew", pady=(10, 0))
+        opts.columnconfigure(6, weight=1)
+
+        self.chk_hotkeys = ttk.Checkbutton(
+            opts,
+            text="Enable hotkeys (F9 record, F10 play, ESC stop playback; toggle handled by manual hook)",
+            variable=self.use_hotkeys,
+            command=self._hotkeys_toggled
+        )
+        self.chk_hotkeys.grid(row=0, column=0, sticky="w", columnspan=5)
+
+        self.chk_profiler = ttk.Checkbutton(
+            opts, text="Sampling profiler", variable=self.profiling, command=self.toggle_profiler
+        )
+        self.chk_profiler.grid(row=0, column=5, sticky="w", columnspan=2, padx=(16, 0))
+
+        ttk.Label(opts, text="Playback speed:").grid(row=1, column=0, sticky="w", pady=(8, 0))
+        self.speed = ttk.Scale(opts, from_=0.25, to=3.0, variable=self.playback_speed, orient="horizontal")
+        self.speed.grid(row=1, column=1, sticky="ew", pady=(8, 0), padx=(8, 8), columnspan=2)
+
+        self.speed_val = ttk.Label(opts, text="1.00x")
+        self.speed_val.grid(row=1, column=3, sticky="w", pady=(8, 0))
+        self.speed.bind("<Motion>", lambda _e: self.speed_val.config(text=f"{self.playback_speed.get():.2f}x"))
+        self.speed.bind("<ButtonRelease-1>", lambda _e: self.speed_val.config(text=f"{self.playback_speed.get():.2f}x"))
+
+        ttk.Label(opts, text="Spin window (ms):").grid(row=1, column=5, padx=(16, 0), sticky="w", pady=(8, 0))
+        self.spin_window_entry = ttk.Entry(opts, textvariable=self.spin_window_ms, width=8)
+        self.spin_window_entry.grid(row=1, column=6, padx=(8, 0), sticky="w", pady=(8, 0))
+
+        # Toggle hotkey controls
+        ttk.Label(opts, text="Play toggle hotkey:").grid(row=2, column=0, sticky="w", pady=(8, 0))
+        self.toggle_entry = ttk.Entry(opts, textvariable=self.play_toggle_key, width=14)
+        self.toggle_entry.grid(row=2, column=1, padx=(8, 8), sticky="w", pady=(8, 0))
+
+        self.btn_apply_hotkey = ttk.Button(opts, text="Apply", command=self.apply_toggle_hotkey)
+        self.btn_apply_hotkey.grid(row=2, column=2, padx=(0, 8), sticky="w", pady=(8, 0))
+
+        self.btn_capture_hotkey = ttk.Button(opts, text="Set (press key)", command=self.capture_toggle_hotkey)
+        self.btn_capture_hotkey.grid(row=2, column=3, padx=(0, 8), sticky="w", pady=(8, 0))
+
+        # Repeat controls
+        self.chk_repeat = ttk.Checkbutton(opts, text="Repeat playback", variable=self.repeat_enabled)
+        self.chk_repeat.grid(row=2, column=4, sticky="w", pady=(8, 0))
+
+        ttk.Label(opts, text="Repeat delay (ms):").grid(row=2, column=5, padx=(16, 0), sticky="w", pady=(8, 0))
+        self.repeat_delay_entry = ttk.Entry(opts, textvariable=self.repeat_delay_ms, width=8)
+        self.repeat_delay_entry.grid(row=2, column=6, padx=(8, 0), sticky="w", pady=(8, 0))
+
+        # Replay buffer controls
+        self.chk_replay = ttk.Checkbutton(
+            opts, text=f"Replay buffer (always keeps the last {REPLAY_SPAN_S / 60:g} min of keys)",
+            variable=self.replay_on, command=self._replay_toggled
+        )
+        self.chk_replay.grid(row=3, column=0, sticky="w", columnspan=3, pady=(8, 0))
+
+        self.btn_take_replay = ttk.Button(opts, text="Keep last...", command=self.take_replay)
+        self.btn_take_replay.grid(row=3, column=3, padx=(0, 8), sticky="w", pady=(8, 0))
+
+        # Treeview
+        list_frame = ttk.LabelFrame(frm, text="Recorded steps (Delay is ms; double-click Delay to edit)")
+        list_frame.grid(row=3, column=0, sticky="nsew", pady=(10, 0))
+        frm.rowconfigure(3, weight=1)
+
+        list_frame.rowconfigure(0, weight=1)
+        list_frame.columnconfigure(0, weight=1)
+
+        self.step_view = StepListView(list_frame, self.events)
+        self.step_view.on_scroll = lambda: self._end_inline_edit(commit=True)
+        self.tree = self.step_view.tree
+
+        self.tree.bind("<Double-1>", self._on_tree_double_click)
+        self.tree.bind("<Button-1>", self._on_tree_single_click)
+
+        status_row = ttk.Frame(frm)
+        status_row.grid(row=4, column=0, sticky="ew", pady=(10, 0))
+        status_row.columnconfigure(0, weight=1)
+
+        self.status = ttk.Label(status_row, text="Ready.", anchor="w")
+        self.status.grid(row=0, column=0, sticky="ew")
+
+        # Position and time left while playing, updated every frame
+        self.play_progress = ttk.Label(status_row, text="", anchor="e")
+        self.play_progress.grid(row=0, column=1, padx=(8, 0))
+
+        # Shown only while a file loads or saves
+        self.file_progress = ttk.Progressbar(status_row, length=160, maximum=100.0)
+        self.file_progress.grid(row=0, column=2, padx=(8, 0))
+        self.btn_file_cancel = ttk.Button(status_row, text="Cancel", command=self.cancel_file_task)
+        self.btn_file_cancel.grid(row=0, column=3, padx=(8, 0))
+        self.file_progress.grid_remove()
+        self.btn_file_cancel.grid_remove()
+
+        hint = (
+            "Toggle key works reliably even for dead keys (like ^) because it uses scan codes.\n"
+            "Use 'Set (press key)' to capture the key. Press once to start, again to stop.\n"
+            "Delays are edited in milliseconds."
+        )
+        ttk.Label(frm, text=hint, foreground="#555", anchor="w", justify="left").grid(
+            row=5, column=0, sticky="ew", pady=(8, 0)
+        )
+
+        if not self.keyboard_available:
+            self.chk_hotkeys.state(["disabled"])
+            self.btn_apply_hotkey.state(["disabled"])
+            self.btn_capture_hotkey.state(["disabled"])
+            self.chk_replay.state(["disabled"])
+            self.btn_take_replay.state(["disabled"])
+            self._set_status("keyboard module not installed/usable. Install 'keyboard' to record keystrokes globally.")
+
+    def _set_status(self, msg: str):
+        self.status.config(text=msg)
+
+    # ---------------- Recording ----------------
+
+    def toggle_recording(self):
+        if not self.keyboard_available:
+            messagebox.showerror("Not available", "Global keystroke recording requires the 'keyboard' module.")
+            return
+        if self.recording:
+            self.stop_recording()
+        else:
+            self.start_recording()
+
+    def start_recording(self):
+        if self.engine.is_playing:
+            messagebox.showwarning("Busy", "Stop playback before recording.")
+            return
+        if self._file_busy():
+            return
+
+        self._end_inline_edit(commit=True)
+        self.engine.start_recording()
+        self.step_view.set_store(self.events)
+        self._sync_edit_buttons()
+        self.btn_record.config(text="Stop Recording")
+        self._set_status("Recording ON — press keys now (F9 to stop if hotkeys enabled).")
+
+    def stop_recording(self):
+        count = self.engine.stop_recording()
+        self.btn_record.config(text="Start Recording")
+        self._sync_edit_buttons()
+        self._set_status(f"Recording OFF — captured {count} steps, {self.engine.capture_stats_text()}.")
+
+    # ---------------- Replay buffer ----------------
+
+    def _replay_toggled(self):
+        if self.replay_on.get():
+            self.engine.enable_replay()
+            self._set_status("Replay buffer on: recent keys are kept, use 'Keep last...' to make them the macro.")
+        else:
+            self.engine.disable_replay()
+            self._set_status("Replay buffer off.")
+
+    def take_replay(self):
+        """Make the last N seconds of typing the current macro; the buffer keeps capturing."""
+        if self.engine.replay is None:
+            messagebox.showinfo("Replay buffer", "Turn the replay buffer on first.")
+            return
+        if self.recording:
+            messagebox.showwarning("Recording", "Stop recording first.")
+            return
+        if self.engine.is_playing:
+            messagebox.showwarning("Playing", "Stop playback first.")
+            return
+        if self._file_busy():
+            return
+        seconds = simpledialog.askfloat(
+            "Keep last", "Seconds of typing to keep as the macro:",
+            parent=self.root, minvalue=0.1, initialvalue=60.0,
+        )
+        if not seconds:
+            return
+        events = self.engine.take_replay(seconds)
+        if not events:
+            messagebox.showinfo("Replay buffer", f"No keys were pressed in the last {seconds:g} s.")
+            return
+        if self.events and not messagebox.askyesno(
+            "Keep last", f"Replace the current macro ({len(self.events)} steps) with the "
+                         f"{len(events)} steps from the last {seconds:g} s?"):
+            return
+        self._end_inline_edit(commit=True)
+        try:
+            self._sync_engine()
+            self._resolve_toggle_key()
+            count = self.engine.set_macro(events, self.engine.settings(), "Keep replay")
+        except Exception as ex:
+            messagebox.showerror("Replay buffer", str(ex))
+            return
+        self._macro_switched()
+        self._set_status(f"Kept {count} steps from the last {seconds:g} s. Save them to keep them.")
+
+    def _ui_queue_append(self, index: int):
+        # Called on the capture thread; never touches Tk.
+        self._ui_queue.append(index)
+
+    def _drain_ui_queue(self):
+        # Runs on the Tk thread every frame; one repaint covers the whole batch.
+        if self._ui_queue:
+            t0 = time.perf_counter()
+            try:
+                while True:
+                    self._ui_queue.popleft()
+            except IndexError:
+                pass
+            self.step_view.refresh(follow=True)
+            if self.recording:
+                self._set_status(f"Recording ON — {len(self.events)} steps, {self.engine.capture_stats_text()}.")
+            self._m_ui_drain.record(time.perf_counter() - t0)
+        if self.engine.is_playing:
+            self.play_progress.config(text=format_progress(self.engine.progress()))
+        elif self.play_progress.cget("text"):
+            self.play_progress.config(text="")
+        self.root.after(UI_FRAME_MS, self._drain_ui_queue)
+
+    # ---------------- Inline editing (Delay column, ms) ----------------
+
+    def _on_tree_single_click(self, event):
+        if self._edit_entry is not None:
+            region = self.tree.identify("region", event.x, event.y)
+            if region != "cell":
+                self._end_inline_edit(commit=True)
+            else:
+                col = self.tree.identify_column(event.x)
+                if col != "#3":
+                    self._end_inline_edit(commit=True)
+
+    def _on_tree_double_click(self, event):
+        if self.recording:
+            return
+        row_iid = self.tree.identify_row(event.y)
+        col = self.tree.identify_column(event.x)
+        if not row_iid:
+            return
+        if self.step_view.toggle_block(self.step_view.slot_index(row_iid)):
+            return
+        if col != "#3":
+            return
+        self._begin_edit_delay_cell(row_iid)
+
+    def _begin_edit_delay_cell(self, iid: str):
+        self._end_inline_edit(commit=True)
+        bbox = self.tree.bbox(iid, column="delay_ms")
+        if not bbox:
+            return
+        x, y, w, h = bbox
+        current_ms_text = self.tree.set(iid, "delay_ms")
+
+        self._edit_iid = iid
+        # In a compressed macro this edits the step's first occurrence and
+        # expands the macro (the view then goes back to a flat list)
+        self._edit_index = self.step_view.step_at(self.step_view.slot_index(iid))
+        self._edit_entry = ttk.Entry(self.tree)
+        self._edit_entry.place(x=x, y=y, width=w, height=h)
+        self._edit_entry.insert(0, current_ms_text)
+        self._edit_entry.select_range(0, tk.END)
+        self._edit_entry.focus()
+
+        self._edit_entry.bind("<Return>", lambda _e: self._end_inline_edit(commit=True))
+        self._edit_entry.bind("<Escape>", lambda _e: self._end_inline_edit(commit=False))
+        self._edit_entry.bind("<FocusOut>", lambda _e: self._end_inline_edit(commit=True))
+
+    def _end_inline_edit(self, commit: bool):
+        if self._edit_entry is None or self._edit_iid is None:
+            return
+
+        idx = self._edit_index
+        entry = self._edit_entry
+        new_text = entry.get().strip()
+
+        self._edit_entry = None
+        self._edit_iid = None
+        self._edit_index = None
+        entry.destroy()
+
+        if not commit:
+            return
+
+        try:
+            if new_text == "":
+                raise ValueError
+            new_ms = int(new_text)
+            if new_ms < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Invalid delay", "Enter a non-negative integer (milliseconds), e.g. 55 or 555.")
+            return
+
+        if 0 <= idx < len(self.events):
+            self.engine.set_delay(idx, self.ms_int_to_sec(new_ms))
+            self.step_view.refresh()
+            self._sync_edit_buttons()
+
+    # ---------------- Playback ----------------
+
+    def toggle_playback(self):
+        if self.engine.is_playing:
+            self.stop_playback()
+        else:
+            self.play_macro()
+
+    def play_macro(self, start: int = 0, stop: int = None, from_time: float = None):
+        if self.recording:
+            messagebox.showwarning("Recording", "Stop recording before playback.")
+            return
+        if not self.events:
+            messagebox.showinfo("Empty", "No macro recorded.")
+            return
+        if self.engine.is_playing:
+            return
+
+        self._end_inline_edit(commit=True)
+
+        if self.repeat_enabled.get():
+            try:
+                rd = int(self.repeat_delay_ms.get())
+                if rd < 0:
+                    raise ValueError
+            except Exception:
+                messagebox.showerror("Invalid repeat delay", "Repeat delay must be a non-negative integer (ms).")
+                return
+
+        try:
+            self._sync_engine()
+            self.engine.play(start, stop, from_time)
+        except Exception as ex:
+            messagebox.showerror("Playback failed", str(ex))
+            return
+        self.btn_pause.config(text="Pause")
+        self._set_status("Playing... (toggle key stops)")
+
+    def play_from(self):
+        """Play the selected steps (from the selected step on, for one row), or from a time asked for."""
+        if self.engine.is_playing:
+            return
+        steps = self.step_view.selected_steps()
+        if steps is not None:
+            rows = self.step_view.selected_rows()
+            self.play_macro(steps[0], steps[1] if rows[0] != rows[1] else None)
+            return
+        text = simpledialog.askstring(
+            "Play from", "Start at this time into the macro (seconds or H:MM:SS, at 1x):", parent=self.root)
+        if not text:
+            return
+        try:
+            from_time = parse_duration(text)
+        except ValueError:
+            messagebox.showerror("Invalid time", f"Cannot read {text!r} as a time.")
+            return
+        self.play_macro(from_time=from_time)
+
+    def stop_playback(self):
+        self.engine.stop()
+        self.btn_pause.config(text="Pause")
+
+    def toggle_pause(self):
+        if self.engine.is_paused:
+            self.engine.resume()
+            self.btn_pause.config(text="Pause")
+        elif self.engine.is_playing:
+            self.engine.pause()
+            self.btn_pause.config(text="Resume")
+
+    def dry_run(self):
+        """Simulate one playback (one loop if repeating) and summarize its timeline."""
+        if not self.events:
+            messagebox.showinfo("Empty", "No macro recorded.")
+            return
+        self._end_inline_edit(commit=True)
+        try:
+            self._sync_engine()
+            result = self.engine.dry_run(loops=1 if self.engine.repeat_enabled else None)
+        except Exception as ex:
+            messagebox.showerror("Dry run failed", str(ex))
+            return
+        lines = [
+            f"{result['keys']} keys in {result['emits']} emits over {format_duration(result['duration'])}"
+            f" at {self.engine.speed:.2f}x" + (" (one loop)." if self.engine.repeat_enabled else "."),
+            "",
+        ]
+        lines += [f"{key}: {n}" for key, n in list(result["histogram"].items())[:10]]
+        if result["errors"]:
+            lines += ["", f"{len(result['errors'])} key(s) cannot be sent, first: {result['errors'][0]}"]
+        messagebox.showinfo("Dry run", "\n".join(lines))
+
+    # ---------------- Hotkey capture for dead keys ----------------
+
+    def capture_toggle_hotkey(self):
+        if not self.keyboard_available:
+            messagebox.showerror("Not available", "Hotkeys require the 'keyboard' module.")
+            return
+        self.engine.begin_toggle_capture()
+        self._set_status("Press the key you want to use as Play Toggle hotkey...")
+
+    def _finish_capture_toggle_key(self, key_id: str):
+        self.play_toggle_key.set(str(key_id).strip().lower())
+        self._resolve_toggle_key()
+        self._set_status(f"Play toggle hotkey set to: {self.play_toggle_key.get()}")
+
+    # ---------------- Save/Load/Clear ----------------
+
+    def clear_macro(self):
+        if self.recording:
+            messagebox.showwarning("Recording", "Stop recording first.")
+            return
+        self._end_inline_edit(commit=True)
+        self.engine.clear()
+        self.step_view.set_store(self.events)
+        self._sync_edit_buttons()
+        self._set_status("Cleared.")
+
+    def save_macro(self):
+        if not self.events:
+            messagebox.showinfo("Empty", "Nothing to save.")
+            return
+        if self._file_busy():
+            return
+        self._end_inline_edit(commit=True)
+
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=MACRO_FILETYPES,
+            title="Save macro"
+        )
+        if not path:
+            return
+
+        try:
+            self._sync_engine()
+            self._resolve_toggle_key()
+            # The worker writes a copy (mapped columns and blocks are shared
+            # until written), so editing can go on while it saves
+            events, settings = self.events.copy(), self.engine.settings()
+        except Exception as ex:
+            messagebox.showerror("Save failed", str(ex))
+            return
+
+        def saved(_result, took):
+            if not self.recording:
+                self.engine.discard_journal()
+            self._set_status(f"Saved {len(events)} steps to {path} ({took:.1f} s)")
+
+        self._start_file_task(
+            "Save", path, lambda progress, cancel: write_macro(path, events, settings, progress, cancel), saved)
+
+    def load_macro(self):
+        if self.recording:
+            messagebox.showwarning("Recording", "Stop recording first.")
+            return
+        if self._file_busy():
+            return
+        self._end_inline_edit(commit=True)
+
+        path = filedialog.askopenfilename(
+            filetypes=MACRO_FILETYPES,
+            title="Load macro"
+        )
+        if not path:
+            return
+
+        def loaded(result, took):
+            # Swapped in only now, on the Tk thread, as a whole
+            count = self.engine.set_macro(*result)
+            self._macro_switched()
+            self._set_status(f"Loaded {count} steps from {path} ({took:.1f} s)")
+
+        self._start_file_task("Load", path, lambda progress, cancel: read_macro(path, progress, cancel), loaded)
+
+    # ---------------- Files on a worker thread ----------------
+
+    def _file_busy(self) -> bool:
+        if self._file_task is None:
+            return False
+        messagebox.showwarning("Busy", "Wait for the file to finish loading or saving, or cancel it.")
+        return True
+
+    def _start_file_task(self, verb: str, path: str, work, finish):
+        """Run work(progress, cancel) off the Tk thread; finish(result, seconds) runs on it after."""
+        self._file_task = FileTask(work)
+        self._file_task_info = (verb, path, finish, time.perf_counter())
+        self.file_progress["value"] = 0.0
+        self.file_progress.grid()
+        self.btn_file_cancel.grid()
+        self._set_status(f"{'Loading' if verb == 'Load' else 'Saving'} {path}...")
+        self.root.after(UI_FRAME_MS, self._poll_file_task)
+
+    def _poll_file_task(self):
+        task = self._file_task
+        if task is None:
+            return
+        if not task.done:
+            self.file_progress["value"] = task.fraction * 100.0
+            self.root.after(UI_FRAME_MS, self._poll_file_task)
+            return
+        verb, path, finish, t0 = self._file_task_info
+        self._file_task = self._file_task_info = None
+        self.file_progress.grid_remove()
+        self.btn_file_cancel.grid_remove()
+        if task.cancelled:
+            self._set_status(f"{verb} of {path} cancelled.")
+            return
+        if task.error is not None:
+            messagebox.showerror(f"{verb} failed", str(task.error))
+            self._set_status("Ready.")
+            return
+        try:
+            finish(task.result, time.perf_counter() - t0)
+        except Exception as ex:
+            messagebox.showerror(f"{verb} failed", str(ex))
+
+    def cancel_file_task(self):
+        if self._file_task is not None:
+            self._file_task.cancel()
+
+    def _macro_switched(self):
+        """Show the engine's new macro and its settings."""
+        self.repeat_enabled.set(self.engine.repeat_enabled)
+        self.repeat_delay_ms.set(self.engine.repeat_delay_ms)
+        self.play_toggle_key.set(self.engine.play_toggle_key)
+
+        self.step_view.set_store(self.events)
+        self._sync_edit_buttons()
+
+        if self.keyboard_available:
+            self._setup_hotkeys()
+
+    def _offer_recovery(self):
+        """Ask to restore a recording left unsaved by the last session."""
+        if not self.engine.has_journal():
+            return
+        try:
+            events, _settings, info = read_journal(self.engine.journal_path)
+        except Exception as ex:
+            if messagebox.askyesno("Recover recording",
+                                   f"An unsaved recording was found but cannot be read:\n{ex}\n\nDelete it?"):
+                self.engine.discard_journal()
+            return
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["created"]))
+        how = "stopped without being saved" if info["ended"] else "interrupted"
+        if not messagebox.askyesno(
+            "Recover recording",
+            f"A recording from {when} with {len(events)} steps was {how}.\n\nRecover it?",
+        ):
+            self.engine.discard_journal()
+            return
+        count = self.engine.recover_journal()["steps"]
+        self._macro_switched()
+        self._set_status(f"Recovered {count} unsaved steps. Save them to keep them.")
+
+    # ---------------- Library ----------------
+
+    def open_library(self, directory: str = None) -> bool:
+        from .library import MacroLibrary
+
+        try:
+            library = MacroLibrary(directory)
+        except Exception as ex:
+            messagebox.showerror("Library", f"Cannot open library: {ex}")
+            return False
+        if self.library is not None:
+            self.library.close()
+        self.library = library
+        if self._control_server is not None:
+            self._control_server.library = library
+        return True
+
+    def open_library_window(self):
+        if self._library_window is not None:
+            self._library_window.lift()
+            return
+        if self.library is None and not self.open_library():
+            return
+        self._library_window = LibraryWindow(self)
+
+    def load_from_library(self, name: str):
+        if self.recording:
+            messagebox.showwarning("Recording", "Stop recording first.")
+            return
+        if self._file_busy():
+            return
+        if self.engine.is_playing:
+            messagebox.showwarning("Playing", "Stop playback first.")
+            return
+        self._end_inline_edit(commit=True)
+        try:
+            t0 = time.perf_counter()
+            count = self.engine.set_macro(*self.library.load(name))
+            took = (time.perf_counter() - t0) * 1000.0
+            self._macro_switched()
+        except Exception as ex:
+            messagebox.showerror("Load failed", str(ex))
+            return
+        self._set_status(f"Loaded {count} steps from library: {name} ({took:.1f} ms)")
+
+    def save_to_library(self, name: str) -> bool:
+        if not self.events:
+            messagebox.showinfo("Empty", "Nothing to save.")
+            return False
+        self._end_inline_edit(commit=True)
+        try:
+            self._sync_engine()
+            self._resolve_toggle_key()
+            rel = self.library.save(name, self.events, self.engine.settings())
+            self.engine.discard_journal()
+        except Exception as ex:
+            messagebox.showerror("Save failed", str(ex))
+            return False
+        self._set_status(f"Saved to library: {rel}")
+        return True
+
+    # ---------------- Bulk delay edits ----------------
+
+    def open_retime_window(self):
+        if self._retime_window is not None:
+            self._retime_window.lift()
+            return
+        self._retime_window = RetimeWindow(self)
+
+    def retime(self, op: str, args: list, whole: bool = False):
+        """
+        Apply a retime operation to the selected steps (or all of them).
+        Returns (steps edited, seconds taken), or None if nothing was done.
+        """
+        if self.recording or self.engine.is_playing:
+            messagebox.showwarning("Busy", "Stop recording and playback first.")
+            return None
+        if not self.events:
+            messagebox.showinfo("Empty", "No macro recorded.")
+            return None
+        self._end_inline_edit(commit=True)
+
+        span = None if whole else self.step_view.selected_steps()
+        if not whole and span is None:
+            messagebox.showinfo("No selection", "Select steps first (Shift+click for a range), "
+                                                "or choose Whole macro.")
+            return None
+        start, stop = span if span is not None else (0, len(self.events))
+
+        compressed = self.events.blocks is not None
+        t0 = time.perf_counter()
+        try:
+            count = self.engine.retime(op, *args, start=start, stop=stop)
+        except ValueError as ex:
+            messagebox.showerror("Retime failed", str(ex))
+            return None
+        elapsed = time.perf_counter() - t0
+        if compressed:
+            # Expanded by the edit: outline rows no longer apply
+            self.step_view.reset()
+        else:
+            self.step_view.refresh()
+        self._sync_edit_buttons()
+        self._set_status(f"Retimed steps {start + 1}-{stop} ({op}).")
+        return count, elapsed
+
+    # ---------------- Repeat blocks ----------------
+
+    def toggle_compression(self):
+        """Fold repeated steps into repeat blocks, or expand them again."""
+        if self.recording or self.engine.is_playing:
+            messagebox.showwarning("Busy", "Stop recording and playback first.")
+            return
+        self._end_inline_edit(commit=True)
+        if self.events.blocks is not None:
+            self.engine.expand()
+            self.step_view.refresh()
+            self._sync_edit_buttons()
+            self._set_status(f"Expanded to {len(self.events)} steps.")
+            return
+        if not self.events:
+            messagebox.showinfo("Empty", "No macro recorded.")
+            return
+
+        tolerance = simpledialog.askfloat(
+            "Compress",
+            "Treat delays within this many ms as equal\n(0 keeps playback exactly the same):",
+            parent=self.root, initialvalue=0.0, minvalue=0.0,
+        )
+        if tolerance is None:
+            return
+        try:
+            stats = self.engine.compress(tolerance)
+        except Exception as ex:
+            messagebox.showerror("Compress failed", str(ex))
+            return
+        if not stats["compressed"]:
+            self._set_status("No repeated sequences found; the macro is unchanged.")
+            return
+        self.step_view.set_store(self.events)
+        self._sync_edit_buttons()
+        self._set_status(f"Compressed {stats['steps']} steps into {stats['nodes']} nodes "
+                         f"(nesting depth {stats['depth']}).")
+
+    def _sync_edit_buttons(self):
+        self.btn_compress.config(text="Expand" if self.events.blocks is not None else "Compress")
+        history = self.engine.history
+        self.btn_undo.state(["!disabled" if history.undo_label else "disabled"])
+        self.btn_redo.state(["!disabled" if history.redo_label else "disabled"])
+
+    # ---------------- Undo ----------------
+
+    def undo(self):
+        self._step_history(self.engine.undo, "Undid", "Nothing to undo.")
+
+    def redo(self):
+        self._step_history(self.engine.redo, "Redid", "Nothing to redo.")
+
+    def _step_history(self, step, verb: str, nothing: str):
+        if self.recording or self.engine.is_playing:
+            messagebox.showwarning("Busy", "Stop recording and playback first.")
+            return
+        if self._file_busy():
+            return
+        self._end_inline_edit(commit=True)
+        label = step()
+        if label is None:
+            self._set_status(nothing)
+            return
+        self._macro_switched()
+        self._set_status(f"{verb}: {label}.")
+
+    # ---------------- Hotkeys (F9/F10/ESC only) ----------------
+
+    def apply_toggle_hotkey(self):
+        if not self.keyboard_available:
+            messagebox.showerror("Not available", "Hotkeys require the 'keyboard' module.")
+            return
+        key = str(self.play_toggle_key.get()).strip().lower()
+        if not key:
+            messagebox.showerror("Invalid", "Toggle hotkey cannot be empty.")
+            return
+
+        self.play_toggle_key.set(key)
+        self._resolve_toggle_key()
+        self._set_status(f"Applied play toggle hotkey: {key}")
+
+    def _setup_hotkeys(self):
+        # Only set F9/F10/ESC here. Toggle key is handled by the engine's hook.
+        self.engine.use_hotkeys = bool(self.use_hotkeys.get())
+        self.engine.setup_hotkeys({
+            "f9": lambda: self.root.after(0, self.toggle_recording),
+            "f10": lambda: self.root.after(0, self.play_macro),
+            "esc": lambda: self.root.after(0, self.stop_playback),
+        })
+
+    def _hotkeys_toggled(self):
+        if not self.keyboard_available:
+            return
+        self._setup_hotkeys()
+        self._set_status("Hotkeys enabled." if self.use_hotkeys.get() else "Hotkeys disabled.")
+
+    # ---------------- Metrics / profiling ----------------
+
+    def _start_metrics_export(self):
+        """Start the file writer and/or HTTP endpoint named in the environment."""
+        notes = []
+        path = os.environ.get(METRICS_FILE_ENV)
+        if path:
+            try:
+                self._metrics_writer = MetricsFileWriter(self.engine.metrics, path)
+                notes.append(f"written to {path}")
+            except OSError as ex:
+                notes.append(f"file disabled ({ex})")
+        port = os.environ.get(METRICS_PORT_ENV)
+        if port:
+            try:
+                self._metrics_server = MetricsServer(self.engine.metrics, int(port), profiler=self.profiler)
+                notes.append(f"served at {self._metrics_server.url}")
+            except (OSError, ValueError) as ex:
+                notes.append(f"endpoint disabled ({ex})")
+        if notes:
+            self._set_status("Metrics " + "; ".join(notes) + ".")
+
+    # ---------------- Control socket ----------------
+
+    def _start_control_server(self):
+        """Serve the control socket named in the environment (see control.py)."""
+        from .control import CONTROL_SOCKET_ENV, ControlServer
+
+        address = os.environ.get(CONTROL_SOCKET_ENV)
+        if not address:
+            return
+        try:
+            self._control_server = ControlServer(self.engine, address, self.library, call=self._call_on_tk)
+        except (OSError, ValueError) as ex:
+            self._set_status(f"Control socket disabled ({ex}).")
+            return
+        self._set_status(f"Control socket at {self._control_server.address}.")
+
+    def _call_on_tk(self, fn) -> Future:
+        """Run a control command that changes the macro or recording on the Tk thread."""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            self._end_inline_edit(commit=True)
+            try:
+                future.set_result(fn())
+            except Exception as ex:
+                future.set_exception(ex)
+            self._macro_switched()
+            self.btn_record.config(text="Stop Recording" if self.recording else "Start Recording")
+
+        self.root.after(0, run)
+        return future
+
+    def toggle_profiler(self):
+        """Start sampling, or stop and save the report next to the journal."""
+        if self.profiling.get():
+            self.profiler.reset()
+            self.profiler.start()
+            self._set_status("Sampling profiler ON.")
+            return
+        self.profiler.stop()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(os.path.dirname(default_journal_path()), f"profile-{stamp}")
+        try:
+            self.profiler.save(base + ".txt")
+            self.profiler.save(base + ".folded", folded=True)
+        except OSError as ex:
+            messagebox.showerror("Profiler", f"Could not save the profile:\n{ex}")
+            return
+        self._set_status(f"Profile ({self.profiler.samples} samples) saved to {base}.txt")
+
+    def on_close(self):
+        self.profiler.stop()
+        if self._file_task is not None:
+            # A cancelled save removes its partial file; give it a moment
+            self._file_task.cancel()
+            self._file_task.wait(1.0)
+        if self._control_server is not None:
+            self._control_server.close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+        if self._metrics_writer is not None:
+            self._metrics_writer.close()
+        self.engine.close()
+        if self.library is not None:
+            self.library.close()
+        self.root.destroy()
+
+
+def main():
+    root = tk.Tk()
+    try:
+        style = ttk.Style()
+        if "clam" in style.theme_names():
+            style.theme_use("clam")
+    except Exception:
+        pass
+
+    MacroApp(root)
+    root.geometry("880x540")
+    root.mainloop()
@@ -0,0 +1,240 @@
+"""
+Key-injection backends used by playback.
+
+A backend resolves key names to its own codes once, then emits either a
+single code or a batch of codes in one call:
+
+    pyautogui  - pyautogui.press (cross-platform, needs a display)
+    uinput     - Linux evdev events written to /dev/uinput, or to any
+                 writable binary file object standing in for it
+    fake       - in-memory, timestamps every emission (tests / benchmarks)
+"""
+
+import struct
+import time
+
+from .timing import DEFAULT_SPIN_WINDOW_MS, wait_until
+
+_pyautogui = None
+
+
+def load_pyautogui():
+    """Import pyautogui on first use, with its per-call pauses removed."""
+    global _pyautogui
+    if _pyautogui is None:
+        import pyautogui
+
+        # Make PyAutoGUI as fast as possible (removes built-in per-call pauses)
+        pyautogui.PAUSE = 0
+        pyautogui.MINIMUM_DURATION = 0
+        pyautogui.MINIMUM_SLEEP = 0
+        _pyautogui = pyautogui
+    return _pyautogui
+
+
+class InjectionBackend:
+    """Base class: resolve() key names once, then press()/emit() codes."""
+
+    name = "base"
+
+    def resolve(self, key: str):
+        """Backend code for a key name; raises ValueError if unsupported."""
+        return key
+
+    def press(self, code):
+        raise NotImplementedError
+
+    def emit(self, codes):
+        """Press several keys back to back; backends override to batch."""
+        for code in codes:
+            self.press(code)
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(InjectionBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        self._pg = load_pyautogui()
+        self._press = self._pg.press
+        self._known = set(getattr(self._pg, "KEYBOARD_KEYS", ()))
+
+    def resolve(self, key: str):
+        key = key.lower()
+        if self._known and key not in self._known:
+            alias = key.replace(" ", "")
+            if alias not in self._known:
+                raise ValueError(f"pyautogui cannot press {key!r}")
+            key = alias
+        return key
+
+    def press(self, code):
+        self._press(code)
+
+    def emit(self, codes):
+        # pyautogui.press accepts a list and loops internally: one call per batch
+        self._press(list(codes))
+
+
+# ---------------- uinput ----------------
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+SYN_REPORT = 0
+
+# ioctl numbers from <linux/uinput.h>
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+_INPUT_EVENT = struct.Struct("@llHHi")
+# struct uinput_user_dev (legacy setup): name[80], input_id, ff_effects_max, abs arrays
+_UINPUT_USER_DEV = struct.Struct("80sHHHHI256i")
+
+# keyboard / pyautogui key names -> Linux KEY_* codes
+LINUX_KEYCODES = {
+    "esc": 1, "escape": 1,
+    "1": 2, "2": 3, "3": 4, "4": 5, "5": 6, "6": 7, "7": 8, "8": 9, "9": 10, "0": 11,
+    "-": 12, "minus": 12, "=": 13, "equal": 13, "backspace": 14, "tab": 15,
+    "q": 16, "w": 17, "e": 18, "r": 19, "t": 20, "y": 21, "u": 22, "i": 23, "o": 24, "p": 25,
+    "[": 26, "]": 27, "enter": 28, "return": 28, "ctrl": 29, "left ctrl": 29, "ctrlleft": 29,
+    "a": 30, "s": 31, "d": 32, "f": 33, "g": 34, "h": 35, "j": 36, "k": 37, "l": 38,
+    ";": 39, "'": 40, "`": 41, "shift": 42, "left shift": 42, "shiftleft": 42, "\\": 43,
+    "z": 44, "x": 45, "c": 46, "v": 47, "b": 48, "n": 49, "m": 50,
+    ",": 51, ".": 52, "/": 53, "right shift": 54, "shiftright": 54,
+    "alt": 56, "left alt": 56, "altleft": 56, "space": 57, " ": 57,
+    "caps lock": 58, "capslock": 58,
+    "f1": 59, "f2": 60, "f3": 61, "f4": 62, "f5": 63, "f6": 64, "f7": 65, "f8": 66, "f9": 67, "f10": 68,
+    "num lock": 69, "numlock": 69, "scroll lock": 70, "scrolllock": 70,
+    "f11": 87, "f12": 88,
+    "right ctrl": 97, "ctrlright": 97, "print screen": 99, "printscreen": 99,
+    "right alt": 100, "alt gr": 100, "altright": 100,
+    "home": 102, "up": 103, "page up": 104, "pageup": 104, "left": 105, "right": 106,
+    "end": 107, "down": 108, "page down": 109, "pagedown": 109, "insert": 110, "delete": 111,
+    "pause": 119, "left windows": 125, "win": 125, "winleft": 125, "windows": 125,
+    "right windows": 126, "winright": 126, "menu": 127, "apps": 127,
+}
+
+
+class UinputBackend(InjectionBackend):
+    """
+    Writes evdev key events for a virtual keyboard.
+
+    With no `device`, /dev/uinput is opened and a virtual keyboard created
+    (needs write access to it). Any writable binary file object can be passed
+    instead, e.g. a pipe or file standing in for the device; it then receives
+    exactly the bytes the kernel would.
+    """
+
+    name = "uinput"
+
+    def __init__(self, device=None, path: str = "/dev/uinput"):
+        self._owns_device = device is None
+        if device is None:
+            device = open(path, "wb", buffering=0)
+            try:
+                self._create_device(device)
+            except Exception:
+                device.close()
+                raise
+        self._dev = device
+        self._write = device.write
+
+    @staticmethod
+    def _create_device(dev):
+        import fcntl
+
+        fcntl.ioctl(dev, UI_SET_EVBIT, EV_KEY)
+        for code in sorted(set(LINUX_KEYCODES.values())):
+            fcntl.ioctl(dev, UI_SET_KEYBIT, code)
+        setup = _UINPUT_USER_DEV.pack(b"macro-recorder", 0x06, 0x1, 0x1, 1, 0, *([0] * 256))
+        dev.write(setup)
+        fcntl.ioctl(dev, UI_DEV_CREATE)
+        # udev needs a moment before the new device receives events
+        time.sleep(0.05)
+
+    def resolve(self, key: str):
+        code = LINUX_KEYCODES.get(key.lower())
+        if code is None:
+            raise ValueError(f"No Linux key code for {key!r}")
+        return code
+
+    @staticmethod
+    def _encode(code: int) -> bytes:
+        pack = _INPUT_EVENT.pack
+        return (
+            pack(0, 0, EV_KEY, code, 1) + pack(0, 0, EV_SYN, SYN_REPORT, 0)
+            + pack(0, 0, EV_KEY, code, 0) + pack(0, 0, EV_SYN, SYN_REPORT, 0)
+        )
+
+    def press(self, code):
+        self._write(self._encode(code))
+
+    def emit(self, codes):
+        # One write() for the whole batch
+        self._write(b"".join(map(self._encode, codes)))
+
+    def close(self):
+        if not self._owns_device:
+            return
+        try:
+            import fcntl
+
+            fcntl.ioctl(self._dev, UI_DEV_DESTROY)
+        except Exception:
+            pass
+        self._dev.close()
+
+
+class RecordingBackend(InjectionBackend):
+    """
+    In-memory backend that timestamps every emission: (time, codes).
+
+    With a `press_cost` (seconds per key) each call first takes that long
+    (sleeping, then spinning the last DEFAULT_SPIN_WINDOW_MS), like a real injector
+    whose keys land when its call returns, and the timestamp is taken then.
+    """
+
+    name = "fake"
+
+    def __init__(self, clock=time.perf_counter, press_cost: float = 0.0):
+        self.clock = clock
+        self.press_cost = press_cost
+        self.emissions = []
+
+    def _spend(self, keys: int):
+        wait_until(time.perf_counter() + self.press_cost * keys, DEFAULT_SPIN_WINDOW_MS / 1000.0)
+
+    def press(self, code):
+        if self.press_cost:
+            self._spend(1)
+        self.emissions.append((self.clock(), (code,)))
+
+    def emit(self, codes):
+        codes = tuple(codes)
+        if self.press_cost:
+            self._spend(len(codes))
+        self.emissions.append((self.clock(), codes))
+
+    @property
+    def keys(self) -> list:
+        return [code for _t, codes in self.emissions for code in codes]
+
+
+BACKENDS = {
+    PyAutoGuiBackend.name: PyAutoGuiBackend,
+    UinputBackend.name: UinputBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+
+
+def create_backend(name: str, **kwargs) -> InjectionBackend:
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown injection backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return cls(**kwargs)
@@ -0,0 +1,446 @@
+"""
+Repeat-block compression of macros.
+
+Recorded macros are mostly one key sequence repeated many times. compress()
+finds runs of a repeated subsequence (tandem repeats) and rewrites them as
+nested Repeat blocks; a farming loop of a million steps becomes a handful of
+nodes. Steps are (key id, delay) tuples, so a block tree expands to exactly
+the original steps unless a delay tolerance was asked for, in which case
+delays within the tolerance of each other are first snapped to a common
+value.
+
+Identical blocks are shared, so a tree is small in memory as well as on
+disk. Everything here is immutable.
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+# Longest repeated subsequence looked for, in steps (or nodes, for outer passes)
+DEFAULT_MAX_PERIOD = 256
+# Outer passes fold repeats of already folded sequences
+_MAX_PASSES = 4
+
+
+class Repeat:
+    """`body` (a tuple of steps and Repeats) played `count` times."""
+
+    __slots__ = ("body", "count", "steps", "leaf", "_hash")
+
+    def __init__(self, body: tuple, count: int):
+        self.body = body
+        self.count = count
+        self.leaf = all(type(item) is tuple for item in body)
+        self.steps = count * _seq_steps(body)
+        self._hash = hash((count, body))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Repeat)
+            and self._hash == other._hash
+            and self.count == other.count
+            and self.body == other.body
+        )
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"Repeat({self.count}x{len(self.body)})"
+
+
+def _seq_steps(items) -> int:
+    return sum(1 if type(item) is tuple else item.steps for item in items)
+
+
+def _walk(items):
+    for item in items:
+        if type(item) is tuple:
+            yield item
+        elif item.leaf:
+            body = item.body
+            for _ in range(item.count):
+                yield from body
+        else:
+            body = item.body
+            for _ in range(item.count):
+                yield from _walk(body)
+
+
+def _expand(items, ids: array, delays: array):
+    for item in items:
+        if type(item) is tuple:
+            ids.append(item[0])
+            delays.append(item[1])
+        else:
+            # Expand the body once, then repeat it at C speed
+            body_ids = array("H")
+            body_delays = array("d")
+            _expand(item.body, body_ids, body_delays)
+            ids.extend(body_ids * item.count)
+            delays.extend(body_delays * item.count)
+
+
+class BlockMacro:
+    """
+    A macro as a sequence of steps and Repeat blocks over a key table.
+    len() is the expanded step count.
+    """
+
+    __slots__ = ("keys", "items", "steps", "_starts", "_times")
+
+    def __init__(self, keys, items):
+        self.keys = tuple(keys)
+        self.items = tuple(items)
+        self.steps = _seq_steps(self.items)
+        self._starts = {}  # id(sequence) -> array of cumulative step counts
+        self._times = {}   # id(sequence) -> array of cumulative delays
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def iter_ids(self):
+        """Iterate (key id, delay) over the expanded steps, without expanding."""
+        return _walk(self.items)
+
+    def expand_columns(self):
+        """(key ids array("H"), delays array("d")) of the expanded macro."""
+        ids = array("H")
+        delays = array("d")
+        _expand(self.items, ids, delays)
+        return ids, delays
+
+    def _seq_starts(self, seq) -> array:
+        starts = self._starts.get(id(seq))
+        if starts is None:
+            starts = array("Q", [0])
+            n = 0
+            for item in seq:
+                n += 1 if type(item) is tuple else item.steps
+                starts.append(n)
+            self._starts[id(seq)] = starts
+        return starts
+
+    def _seq_times(self, seq) -> array:
+        times = self._times.get(id(seq))
+        if times is None:
+            times = array("d", [0.0])
+            t = 0.0
+            for item in seq:
+                t += item[1] if type(item) is tuple else self._seq_times(item.body)[-1] * item.count
+                times.append(t)
+            self._times[id(seq)] = times
+        return times
+
+    def elapsed(self, i: int) -> float:
+        """sum(delays[:i]) of the expanded macro, in O(depth * log width)."""
+        i = max(0, min(int(i), self.steps))
+        seq = self.items
+        t = 0.0
+        while True:
+            starts = self._seq_starts(seq)
+            if i >= starts[-1]:
+                return t + self._seq_times(seq)[-1]
+            k = bisect_right(starts, i) - 1
+            t += self._seq_times(seq)[k]
+            i -= starts[k]
+            item = seq[k]
+            if not i:
+                return t
+            # Inside a Repeat: whole passes of its body, then into the body
+            seq = item.body
+            body_steps = self._seq_starts(seq)[-1]
+            t += (i // body_steps) * self._seq_times(seq)[-1]
+            i %= body_steps
+
+    def step_at(self, t: float) -> int:
+        """
+        First expanded step pressed (its delay summed in) at or after `t`
+        seconds; len() past the end. O(depth * log width).
+        """
+        index = 0
+        seq = self.items
+        while True:
+            times = self._seq_times(seq)
+            k = bisect_left(times, t, 1) - 1
+            if k >= len(seq):
+                if seq is self.items:
+                    return self.steps
+                k = len(seq) - 1  # rounding left t a hair past the body's end
+            starts = self._seq_starts(seq)
+            item = seq[k]
+            index += starts[k]
+            if type(item) is tuple:
+                return index
+            t -= times[k]
+            seq = item.body
+            body_t = self._seq_times(seq)[-1]
+            # Skip the passes of the body that end before t
+            passes = 0 if body_t <= 0.0 else min(item.count - 1, max(0, math.ceil(t / body_t) - 1))
+            index += passes * self._seq_starts(seq)[-1]
+            t -= passes * body_t
+
+    def locate(self, i: int) -> tuple:
+        """(key id, delay) of expanded step i, in O(depth * log width)."""
+        if i < 0:
+            i += self.steps
+        if not 0 <= i < self.steps:
+            raise IndexError("step index out of range")
+        seq = self.items
+        while True:
+            starts = self._seq_starts(seq)
+            k = bisect_right(starts, i) - 1
+            item = seq[k]
+            if type(item) is tuple:
+                return item
+            i -= starts[k]
+            seq = item.body
+            i %= self._seq_starts(seq)[-1]
+
+    def node_count(self) -> int:
+        """Steps and blocks stored, counting each shared block once."""
+        seen = set()
+
+        def count(seq):
+            n = len(seq)
+            for item in seq:
+                if type(item) is not tuple and id(item) not in seen:
+                    seen.add(id(item))
+                    n += count(item.body)
+            return n
+
+        return count(self.items)
+
+    def depth(self) -> int:
+        def depth(seq):
+            return max((1 + depth(item.body) for item in seq if type(item) is not tuple), default=0)
+
+        return depth(self.items)
+
+    def key_histogram(self) -> Counter:
+        """Counter of key id -> expanded occurrences."""
+        memo = {}
+
+        def hist(seq):
+            c = memo.get(id(seq))
+            if c is None:
+                c = Counter()
+                for item in seq:
+                    if type(item) is tuple:
+                        c[item[0]] += 1
+                    else:
+                        for kid, n in hist(item.body).items():
+                            c[kid] += n * item.count
+                memo[id(seq)] = c
+            return c
+
+        return hist(self.items)
+
+    def total_delay(self) -> float:
+        """Sum of all expanded delays (per-block products, so not bit-exact)."""
+        return self._seq_times(self.items)[-1]
+
+
+# ---------------- Compression ----------------
+
+def snap_delays(delays, tolerance: float) -> dict:
+    """
+    Map each distinct delay to a representative: sorted delays are grouped
+    while within `tolerance` of the group's first value, and every group
+    maps to its frequency-weighted mean.
+    """
+    counts = Counter(delays)
+    mapping = {}
+    group = []
+    for d in sorted(counts):
+        if group and d - group[0] > tolerance:
+            _close_group(group, counts, mapping)
+            group = []
+        group.append(d)
+    if group:
+        _close_group(group, counts, mapping)
+    return mapping
+
+
+def _close_group(group, counts, mapping):
+    n = sum(counts[d] for d in group)
+    rep = group[0] if len(group) == 1 else sum(d * counts[d] for d in group) / n
+    for d in group:
+        mapping[d] = rep
+
+
+class _Folder:
+    """Tandem-repeat folding over integer symbols; repeats get symbols too."""
+
+    def __init__(self, max_period: int):
+        self.max_period = max_period
+        self.repeats = []        # symbol - base -> (body symbols, count)
+        self._repeat_ids = {}
+        self.base = 0            # first repeat symbol (set by the caller)
+
+    def _symbol(self, body: tuple, count: int) -> int:
+        key = (body, count)
+        sym = self._repeat_ids.get(key)
+        if sym is None:
+            sym = self.base + len(self.repeats)
+            self.repeats.append(key)
+            self._repeat_ids[key] = sym
+        return sym
+
+    def fold(self, seq: list) -> list:
+        n = len(seq)
+        if n < 2:
+            return seq
+        # nxt[i]: next index holding the same symbol (or n)
+        nxt = [n] * n
+        last = {}
+        for i in range(n - 1, -1, -1):
+            nxt[i] = last.get(seq[i], n)
+            last[seq[i]] = i
+
+        out = []
+        i = 0
+        max_p = self.max_period
+        while i < n:
+            best_gain, best_p, best_r = 0, 0, 0
+            j = nxt[i]
+            while j < n and j - i <= max_p:
+                p = j - i
+                if i + 2 * p > n:
+                    break
+                # A multiple of a period whose run already covers 2p cannot do better
+                if best_p and p % best_p == 0 and best_p * best_r >= 2 * p:
+                    j = nxt[j]
+                    continue
+                if seq[i + p - 1] == seq[i + 2 * p - 1] and seq[i:i + p] == seq[j:j + p]:
+                    body = seq[i:i + p]
+                    r = 2
+                    k = i + 2 * p
+                    while k + p <= n and seq[k:k + p] == body:
+                        r += 1
+                        k += p
+                    gain = p * (r - 1) - 1
+                    if gain > best_gain:
+                        best_gain, best_p, best_r = gain, p, r
+                j = nxt[j]
+
+            if best_gain > 0:
+                body = tuple(self.fold(seq[i:i + best_p]))
+                out.append(self._symbol(body, best_r))
+                i += best_p * best_r
+            else:
+                out.append(seq[i])
+                i += 1
+        return out
+
+
+def compress(events, tolerance: float = 0.0, max_period: int = DEFAULT_MAX_PERIOD) -> BlockMacro:
+    """
+    Fold an EventStore (or BlockMacro) into repeat blocks. With tolerance 0
+    the result expands to exactly the same steps; otherwise delays within
+    `tolerance` seconds of each other are snapped first.
+    """
+    blocks = events if isinstance(events, BlockMacro) else events.blocks
+    if blocks is not None:
+        keys = blocks.keys
+        ids, delays = blocks.expand_columns()
+    else:
+        keys = events.keys
+        ids, delays = events.key_ids_view(), events.delays_view()
+
+    snap = snap_delays(delays, tolerance) if tolerance > 0 else None
+
+    # Intern (key id, delay) atoms as small ints so folding compares ints
+    atoms = {}
+    seq = []
+    for kid, delay in zip(ids, delays):
+        if snap is not None:
+            delay = snap[delay]
+        atom = (kid, delay)
+        sym = atoms.get(atom)
+        if sym is None:
+            sym = atoms[atom] = len(atoms)
+        seq.append(sym)
+
+    folder = _Folder(max(1, int(max_period)))
+    folder.base = len(atoms)
+    for _ in range(_MAX_PASSES):
+        folded = folder.fold(seq)
+        if len(folded) == len(seq):
+            break
+        seq = folded
+
+    # Symbols back to shared nodes
+    nodes = list(atoms)
+    for body, count in folder.repeats:
+        nodes.append(Repeat(tuple(nodes[s] for s in body), count))
+    return BlockMacro(keys, (nodes[s] for s in seq))
+
+
+# ---------------- Outline (grouped step list) ----------------
+
+class BlockOutline:
+    """
+    Rows of a BlockMacro for a grouped list view: one row per step or block,
+    with each block's body listed once under it while the block is expanded.
+    Blocks start collapsed. Rows are (depth, item, first step index, path).
+    """
+
+    def __init__(self, blocks: BlockMacro):
+        self.blocks = blocks
+        self.expanded = set()  # paths (tuples of child positions) of open blocks
+        self.rows = []
+        self._build()
+
+    def _build(self):
+        rows = []
+
+        def add(seq, depth, start, prefix):
+            for pos, item in enumerate(seq):
+                path = prefix + (pos,)
+                rows.append((depth, item, start, path))
+                if type(item) is tuple:
+                    start += 1
+                    continue
+                if path in self.expanded:
+                    add(item.body, depth + 1, start, path)
+                start += item.steps
+
+        add(self.blocks.items, 0, 0, ())
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def is_block(self, row: int) -> bool:
+        return type(self.rows[row][1]) is not tuple
+
+    def step_index(self, row: int):
+        """Expanded index of a step row (its first occurrence); None for blocks."""
+        _depth, item, start, _path = self.rows[row]
+        return start if type(item) is tuple else None
+
+    def toggle(self, row: int) -> bool:
+        """Expand or collapse a block row; returns True if it is now expanded."""
+        path = self.rows[row][3]
+        if path in self.expanded:
+            self.expanded = {p for p in self.expanded if p[:len(path)] != path}
+            opened = False
+        else:
+            self.expanded.add(path)
+            opened = True
+        self._build()
+        return opened
+
+    def row_of_step(self, index: int) -> int:
+        """The visible row holding (or enclosing) expanded step `index`."""
+        best = 0
+        for row, (_depth, item, start, _path) in enumerate(self.rows):
+            if start > index:
+                break
+            span = 1 if type(item) is tuple else item.steps
+            if index < start + span:
+                best = row
+        return best
@@ -0,0 +1,215 @@
+"""
+Per-machine calibration of injection cost and wait overshoot.
+
+Playback already sends every batch on an absolute deadline, so costs do not
+add up over a macro. What is left is that a key lands when its injection
+call returns, a machine- and backend-dependent time after the deadline,
+and that a wait can overshoot the spin window on a loaded system.
+calibrate() measures both on the current machine:
+
+    press      time per backend.press() of one key
+    emit       time per backend.emit() of a batch, giving a per-key cost
+    overshoot  how far a timed Event.wait() (the engine's coarse wait)
+               returns past its timeout
+    wait       how late the engine's hybrid wait (timing.wait_until) ends
+               with the spin window derived from that
+
+and derives a profile: each batch is sent `fixed + per_key * keys` early,
+the spin window is widened to cover p99 overshoot, and the stated
+tolerance is what a constant lead cannot remove: the spread (p99 - p50)
+of the press cost plus p99 wait lateness. Profiles are saved per host and backend in
+$MACRO_RECORDER_STATE/calibration.json (or ~/.macro_recorder), and
+MacroEngine applies the one for its backend when playback starts.
+"""
+
+import os
+import threading
+import time
+
+from .journal import STATE_DIR_ENV
+from .timing import DEFAULT_SPIN_WINDOW_MS, lateness_stats, wait_until
+
+CALIBRATION_FILENAME = "calibration.json"
+CALIBRATION_VERSION = 1
+DEFAULT_SAMPLES = 200
+DEFAULT_BATCH = 8
+DEFAULT_KEY = "shift"       # changes no text in whatever has focus
+MIN_TOLERANCE_MS = 0.1      # timer and scheduling granularity
+
+
+def default_calibration_path() -> str:
+    """Profile location: $MACRO_RECORDER_STATE or ~/.macro_recorder."""
+    state = os.environ.get(STATE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".macro_recorder")
+    return os.path.join(state, CALIBRATION_FILENAME)
+
+
+def _stats_ms(samples) -> dict:
+    stats = lateness_stats(samples)
+    return {k: (v if k == "count" else v * 1000.0) for k, v in stats.items()}
+
+
+def _timed(fn, arg, samples: int, gap: float) -> list:
+    out = []
+    for _ in range(samples):
+        t = time.perf_counter()
+        fn(arg)
+        out.append(time.perf_counter() - t)
+        if gap:
+            time.sleep(gap)
+    return out
+
+
+def measure_overshoot(samples: int = DEFAULT_SAMPLES, timeout: float = 0.001) -> list:
+    """Seconds each Event.wait(timeout) returned late."""
+    ev = threading.Event()
+    out = []
+    for _ in range(samples):
+        t = time.perf_counter()
+        ev.wait(timeout)
+        out.append(max(0.0, time.perf_counter() - t - timeout))
+    return out
+
+
+def measure_wait(spin_window: float, samples: int = DEFAULT_SAMPLES, ahead: float = 0.002) -> list:
+    """Seconds each wait_until() with `spin_window` ended past a deadline `ahead` away."""
+    ev = threading.Event()
+    out = []
+    for _ in range(samples):
+        deadline = time.perf_counter() + ahead
+        wait_until(deadline, spin_window, ev)
+        out.append(time.perf_counter() - deadline)
+    return out
+
+
+def calibrate(backend, key: str = DEFAULT_KEY, samples: int = DEFAULT_SAMPLES, batch: int = DEFAULT_BATCH,
+              gap: float = 0.002) -> dict:
+    """
+    Measure `backend` on this machine; returns a profile for save_profile().
+    Real backends really press `key`: samples + samples // 4 * batch times.
+    """
+    import platform
+    import socket
+
+    samples = max(10, int(samples))
+    batch = max(2, int(batch))
+    code = backend.resolve(key)
+    backend.press(code)  # warm up (imports, first-call setup)
+    press = _timed(backend.press, code, samples, gap)
+    emit = _timed(backend.emit, [code] * batch, max(5, samples // 4), gap)
+    overshoot_ms = _stats_ms(measure_overshoot(samples))
+    spin_window_ms = max(DEFAULT_SPIN_WINDOW_MS, overshoot_ms["p99"] * 1.25)
+    wait_ms = _stats_ms(measure_wait(spin_window_ms / 1000.0, samples, spin_window_ms / 1000.0 + 0.001))
+
+    press_ms = _stats_ms(press)
+    emit_ms = _stats_ms(emit)
+    per_key = max(0.0, (emit_ms["p50"] - press_ms["p50"]) / (batch - 1))
+    return {
+        "version": CALIBRATION_VERSION,
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "backend": backend.name,
+        "key": key,
+        "created": time.time(),
+        "press_ms": press_ms,
+        "emit_ms": dict(emit_ms, keys=batch),
+        "overshoot_ms": overshoot_ms,
+        "wait_ms": wait_ms,
+        "per_key_ms": per_key,
+        "fixed_ms": max(0.0, press_ms["p50"] - per_key),
+        "spin_window_ms": spin_window_ms,
+        "tolerance_ms": max(MIN_TOLERANCE_MS, press_ms["p99"] - press_ms["p50"] + wait_ms["p99"]),
+    }
+
+
+def _read(path: str) -> dict:
+    import json  # deferred: see fileio.read_macro_json
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"version": CALIBRATION_VERSION, "hosts": {}}
+    if not isinstance(data, dict) or not isinstance(data.get("hosts"), dict):
+        raise ValueError(f"{path} is not a calibration file")
+    return data
+
+
+def _write(path: str, data: dict):
+    import json
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def save_profile(profile: dict, path: str = None):
+    """Store `profile` under its host and backend, keeping the others."""
+    path = path or default_calibration_path()
+    data = _read(path)
+    data["hosts"].setdefault(profile["host"], {})[profile["backend"]] = profile
+    _write(path, data)
+
+
+def load_profile(backend_name: str, path: str = None, host: str = None):
+    """This host's profile for a backend, or None if it was never calibrated."""
+    import socket
+
+    try:
+        data = _read(path or default_calibration_path())
+    except (OSError, ValueError):
+        return None
+    return data["hosts"].get(host or socket.gethostname(), {}).get(backend_name)
+
+
+def remove_profile(backend_name: str, path: str = None, host: str = None) -> bool:
+    import socket
+
+    path = path or default_calibration_path()
+    data = _read(path)
+    profiles = data["hosts"].get(host or socket.gethostname(), {})
+    if profiles.pop(backend_name, None) is None:
+        return False
+    _write(path, data)
+    return True
+
+
+class Compensation:
+    """What playback applies from a profile (seconds)."""
+
+    __slots__ = ("fixed", "per_key", "spin_window", "tolerance")
+
+    def __init__(self, fixed: float = 0.0, per_key: float = 0.0, spin_window: float = 0.0,
+                 tolerance: float = 0.0):
+        self.fixed = fixed
+        self.per_key = per_key
+        self.spin_window = spin_window
+        self.tolerance = tolerance
+
+    @classmethod
+    def from_profile(cls, profile: dict) -> "Compensation":
+        return cls(profile["fixed_ms"] / 1000.0, profile["per_key_ms"] / 1000.0,
+                   profile["spin_window_ms"] / 1000.0, profile["tolerance_ms"] / 1000.0)
+
+    def lead(self, keys: int) -> float:
+        """How early to send a batch of `keys` so it lands on its deadline."""
+        return self.fixed + self.per_key * keys
+
+    def __repr__(self):
+        return (f"Compensation(lead {self.fixed * 1000.0:.3f} ms + {self.per_key * 1000.0:.3f} ms/key, "
+                f"spin {self.spin_window * 1000.0:.2f} ms, ±{self.tolerance * 1000.0:.3f} ms)")
+
+
+def format_profile(profile: dict) -> str:
+    press, over = profile["press_ms"], profile["overshoot_ms"]
+    return (
+        f"{profile['backend']} on {profile['host']}: press p50 {press['p50']:.3f} ms, "
+        f"p99 {press['p99']:.3f} ms; {profile['per_key_ms']:.3f} ms per extra key in a batch; "
+        f"wait overshoot p50 {over['p50']:.3f} ms, p99 {over['p99']:.3f} ms, "
+        f"{profile['wait_ms']['p99']:.3f} ms with spinning.\n"
+        f"Playback sends each batch {profile['fixed_ms']:.3f} ms + {profile['per_key_ms']:.3f} ms/key early, "
+        f"spins the last {profile['spin_window_ms']:.2f} ms, and lands within "
+        f"±{profile['tolerance_ms']:.3f} ms (p99)."
+    )
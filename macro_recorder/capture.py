@@ -0,0 +1,43 @@
+"""Lock-free hand-off of raw keyboard hook events to a consumer thread."""
+
+CAPTURE_RING_SIZE = 8192
+
+
+class CaptureRing:
+    """
+    Preallocated single-producer / single-consumer ring of raw hook events.
+
+    The producer only stores into a slot and then advances its counter; the
+    consumer only advances its own. Each counter has one writer, so no lock is
+    needed. A full ring drops the new item and counts it.
+    """
+
+    def __init__(self, capacity: int = CAPTURE_RING_SIZE):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.capacity = size
+        self._mask = size - 1
+        self._slots = [None] * size
+        self._write = 0   # items pushed (producer-owned)
+        self._read = 0    # items consumed (consumer-owned)
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._write - self._read
+
+    def push(self, item) -> bool:
+        w = self._write
+        if w - self._read >= self.capacity:
+            self.dropped += 1
+            return False
+        self._slots[w & self._mask] = item
+        self._write = w + 1
+        return True
+
+    def drain(self) -> list:
+        r, w = self._read, self._write
+        slots, mask = self._slots, self._mask
+        out = [slots[i & mask] for i in range(r, w)]
+        self._read = w
+        return out
@@ -0,0 +1,716 @@
+"""
+Command line entry point.
+
+    python -m macro_recorder                    open the recorder window
+    python -m macro_recorder play FILE [...]    replay a macro headlessly
+    python -m macro_recorder dryrun FILE        simulated timeline, nothing typed
+    python -m macro_recorder convert SRC DST    JSON <-> binary (.mrec)
+    python -m macro_recorder compress SRC DST   fold repeated steps into blocks
+    python -m macro_recorder retime SRC DST ... bulk delay edits (scale, clamp, ...)
+    python -m macro_recorder info FILE          print a macro summary
+    python -m macro_recorder library search ... find macros in the library
+    python -m macro_recorder serve [FILE]       headless engine on a control socket
+    python -m macro_recorder ctl play [...]     send one command to that socket
+    python -m macro_recorder calibrate          measure injection cost for playback
+
+`play` also accepts the name of a macro in the library instead of a path,
+and `--overlay` plays more macros alongside it on the same timer.
+`play` and `dryrun` take --from-step/--from-time/--to-step to run part of
+a macro.
+
+Each command imports only what it needs, so play/convert/info never load
+tkinter and convert/info never load pyautogui or keyboard.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from .backends import BACKENDS
+from .timing import DEFAULT_SPIN_WINDOW_MS, format_duration, format_lateness, format_progress, parse_duration
+
+
+def cmd_gui(_args) -> int:
+    from .app import main as gui_main
+
+    gui_main()
+    return 0
+
+
+def _load_into(engine, args) -> bool:
+    """Load args.file, or the library macro of that name; False (reported) if missing."""
+    if os.path.exists(args.file):
+        try:
+            engine.load(args.file)
+        except (KeyError, OSError, ValueError) as ex:
+            print(f"Cannot load {args.file}: {ex.args[0] if isinstance(ex, KeyError) else ex}", file=sys.stderr)
+            return False
+        return True
+    from .library import MacroLibrary
+
+    with MacroLibrary(args.library) as lib:
+        lib.refresh()
+        try:
+            engine.set_macro(*lib.load(args.file))
+        except (KeyError, ValueError) as ex:
+            print(f"Cannot load {args.file}: {ex.args[0]}", file=sys.stderr)
+            return False
+    return True
+
+
+def _add_range_args(p):
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--from-step", type=int, metavar="N", help="start at step N (1-based, as in the step list)")
+    group.add_argument("--from-time", type=parse_duration, metavar="T",
+                       help="start at the first step due T into the macro at 1x (seconds or H:MM:SS)")
+    p.add_argument("--to-step", type=int, metavar="N", help="stop after step N (loops repeat the range)")
+
+
+def _step_range(engine, args) -> tuple:
+    """[start, stop) from --from-step/--from-time/--to-step."""
+    if args.from_time is not None:
+        start = engine.step_at(args.from_time)
+    else:
+        start = max(0, (args.from_step or 1) - 1)
+    return start, args.to_step
+
+
+def cmd_play(args) -> int:
+    from .engine import MacroEngine
+
+    engine = MacroEngine()
+    if not _load_into(engine, args):
+        return 1
+    engine.speed = args.speed
+    engine.spin_window_ms = args.spin_window
+    engine.backend_name = args.backend
+    engine.batch_window_ms = args.batch_window
+    engine.compensate = not args.no_compensation
+    if args.repeat is not None:
+        engine.repeat_enabled = args.repeat
+    if args.repeat_delay is not None:
+        engine.repeat_delay_ms = max(0, args.repeat_delay)
+    if args.loops:
+        engine.repeat_enabled = True
+        engine.max_loops = args.loops
+    engine.on_status = lambda msg: print(msg, file=sys.stderr)
+
+    if args.start_delay > 0:
+        time.sleep(args.start_delay)
+
+    profiler = writer = server = None
+    if args.profile:
+        from .profiler import SamplingProfiler
+
+        profiler = SamplingProfiler()
+    if args.metrics or args.metrics_port is not None:
+        from .metrics import MetricsFileWriter, MetricsServer
+
+        if args.metrics:
+            writer = MetricsFileWriter(engine.metrics, args.metrics, args.metrics_interval)
+        if args.metrics_port is not None:
+            server = MetricsServer(engine.metrics, args.metrics_port, profiler=profiler)
+            print(f"Metrics at {server.url}", file=sys.stderr)
+
+    try:
+        if profiler is not None:
+            profiler.start()
+        if args.overlay:
+            if args.from_step or args.from_time is not None or args.to_step:
+                print("A step range cannot be combined with --overlay", file=sys.stderr)
+                return 2
+            return _play_scheduled(engine, args)
+        try:
+            engine.play(*_step_range(engine, args))
+        except (ImportError, OSError, RuntimeError, ValueError) as ex:
+            print(f"Cannot play {args.file}: {ex}", file=sys.stderr)
+            return 1
+        try:
+            if args.progress:
+                # Status lines overwrite the progress line rather than follow it
+                engine.on_status = lambda msg: print(f"\r\033[K{msg}", file=sys.stderr)
+                while not engine.wait(0.5):
+                    print(f"\r{format_progress(engine.progress())}\033[K", end="", file=sys.stderr, flush=True)
+            engine.wait()
+        except KeyboardInterrupt:
+            engine.stop()
+            engine.wait()
+            return 130
+        return 0
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profiler.save(args.profile)
+        if server is not None:
+            server.close()
+        if writer is not None:
+            writer.close()
+
+
+# Per-overlay options: FILE:speed=2,loops=3,priority=-1,conflict=skip
+_OVERLAY_OPTIONS = {
+    "speed": float,
+    "loops": int,
+    "repeat": lambda v: v.lower() in ("1", "true", "yes", "on"),
+    "repeat_delay": int,
+    "priority": int,
+    "conflict": str,
+    "start_delay": float,
+}
+
+
+def _parse_overlay(spec: str) -> tuple:
+    """("FILE", {option: value}) from FILE[:key=value,...]."""
+    path, sep, text = spec.rpartition(":")
+    if not sep or "=" not in text:
+        return spec, {}
+    options = {}
+    for item in text.split(","):
+        key, _, value = item.partition("=")
+        key = key.strip().replace("-", "_")
+        if key not in _OVERLAY_OPTIONS:
+            raise ValueError(f"Unknown overlay option {key!r} (choose from {', '.join(_OVERLAY_OPTIONS)})")
+        options[key] = _OVERLAY_OPTIONS[key](value.strip())
+    return path, options
+
+
+def _play_scheduled(engine, args) -> int:
+    """Play the main macro and its overlays on one MacroScheduler; ends with the main one."""
+    from .backends import create_backend
+    from .fileio import read_macro
+    from .scheduler import MacroScheduler
+
+    scheduler = None
+    try:
+        overlays = [_parse_overlay(spec) for spec in args.overlay]
+        scheduler = MacroScheduler(
+            create_backend(args.backend), spin_window_ms=args.spin_window, batch_window_ms=args.batch_window,
+            conflict_window_ms=args.conflict_window, metrics=engine.metrics,
+        )
+        main = scheduler.add(
+            engine.events, name=args.file, speed=engine.speed, repeat=engine.repeat_enabled,
+            repeat_delay_ms=engine.repeat_delay_ms, loops=engine.max_loops,
+            priority=args.priority, conflict=args.conflict,
+        )
+        scheduler.on_track_done = lambda track: scheduler.stop() if track is main else None
+        for path, options in overlays:
+            events, settings = read_macro(path)
+            scheduler.add(
+                events, name=path, speed=options.get("speed", 1.0),
+                repeat=options.get("repeat", settings["repeat_enabled"]),
+                repeat_delay_ms=options.get("repeat_delay", settings["repeat_delay_ms"]),
+                loops=options.get("loops"), priority=options.get("priority", 0),
+                conflict=options.get("conflict", "send"), start_delay=options.get("start_delay", 0.0),
+            )
+    except (ImportError, OSError, RuntimeError, ValueError) as ex:
+        if scheduler is not None:
+            scheduler.stop()
+        print(f"Cannot play {args.file}: {ex}", file=sys.stderr)
+        return 1
+
+    code = 0
+    try:
+        scheduler.wait()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        scheduler.wait()
+        code = 130
+    for track in scheduler.tracks:
+        s = track.summary()
+        print(f"{track.name}: {s['keys']} keys in {s['emits']} emits, {s['loops']} loop(s), "
+              f"{s['skipped']} skipped, {s['deferred']} deferred, {format_lateness(s['lateness'])}."
+              + (f" {len(s['errors'])} error(s), first: {s['errors'][0]}" if s["errors"] else ""),
+              file=sys.stderr)
+    return code
+
+
+def cmd_dryrun(args) -> int:
+    import csv
+
+    from .engine import MacroEngine
+
+    engine = MacroEngine()
+    if not _load_into(engine, args):
+        return 1
+    engine.speed = args.speed
+    engine.batch_window_ms = args.batch_window
+    if args.repeat is not None:
+        engine.repeat_enabled = args.repeat
+    if args.repeat_delay is not None:
+        engine.repeat_delay_ms = max(0, args.repeat_delay)
+
+    t0 = time.perf_counter()
+    try:
+        start, stop = _step_range(engine, args)
+        result = engine.dry_run(loops=args.loops or (1 if engine.repeat_enabled else None), start=start, stop=stop)
+    except ValueError as ex:
+        print(f"Cannot simulate {args.file}: {ex}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - t0
+
+    print(f"Steps:           {result['steps']}")
+    print(f"Loops:           {result['loops']}")
+    print(f"Emits:           {result['emits']} ({result['keys']} keys)")
+    print(f"Duration:        {format_duration(result['duration'])} ({result['duration']:.3f} s at {args.speed:g}x)")
+    print(f"Simulated in:    {elapsed * 1000:.1f} ms")
+    for error in result["errors"][:5]:
+        print(f"  skipped: {error}")
+    for key, n in list(result["histogram"].items())[:args.top]:
+        print(f"  {key:<14} {n}")
+
+    if args.timeline:
+        with open(args.timeline, "w", encoding="utf-8", newline="") as f:
+            if args.timeline.lower().endswith(".json"):
+                json.dump([{"t": t, "keys": list(codes)} for t, codes in result["timeline"]], f)
+            else:
+                out = csv.writer(f)
+                out.writerow(["time_s", "keys"])
+                for t, codes in result["timeline"]:
+                    out.writerow([f"{t:.6f}", " ".join(map(str, codes))])
+        print(f"Timeline written to {args.timeline}")
+    return 0
+
+
+def cmd_convert(args) -> int:
+    from .fileio import convert_macro
+
+    count = convert_macro(args.src, args.dst)
+    print(f"Converted {count} steps: {args.src} -> {args.dst}")
+    return 0
+
+
+def cmd_compress(args) -> int:
+    from .blocks import compress
+    from .fileio import read_macro, write_macro
+    from .store import EventStore
+
+    events, settings = read_macro(args.src)
+    if args.expand:
+        events.expand()
+        write_macro(args.dst, events, settings)
+        print(f"Expanded {len(events)} steps: {args.src} -> {args.dst}")
+        return 0
+
+    blocks = compress(events, max(0.0, args.tolerance) / 1000.0, args.max_period)
+    nodes = blocks.node_count()
+    if nodes < len(blocks):
+        events = EventStore.from_blocks(blocks)
+        state = "compressed"
+    else:
+        state = "no repeats found, written as is"
+    write_macro(args.dst, events, settings)
+    print(f"{len(blocks)} steps -> {nodes} nodes, depth {blocks.depth()} ({state}): {args.dst}")
+    return 0
+
+
+def cmd_retime(args) -> int:
+    from .engine import MacroEngine
+    from .fileio import read_macro
+
+    def sec(ms):
+        return None if ms is None else ms / 1000.0
+
+    # Applied in this order, each to the same range of steps
+    ops = []
+    if args.set is not None:
+        ops.append(("set", sec(args.set)))
+    if args.scale is not None:
+        ops.append(("scale", args.scale))
+    if args.cap_gaps is not None:
+        ops.append(("cap_gaps", sec(args.cap_gaps), sec(args.gap_to)))
+    if args.quantize is not None:
+        ops.append(("quantize", sec(args.quantize)))
+    if args.jitter is not None:
+        ops.append(("jitter", sec(args.jitter), args.seed))
+    if args.min is not None or args.max is not None:
+        ops.append(("clamp", sec(args.min), sec(args.max)))
+    if not ops:
+        print("Nothing to do: give at least one of --set/--scale/--cap-gaps/--quantize/--jitter/--min/--max",
+              file=sys.stderr)
+        return 2
+
+    engine = MacroEngine()
+    engine.set_macro(*read_macro(args.src))
+    start = max(0, args.first - 1)
+    stop = args.last
+    t0 = time.perf_counter()
+    count = 0
+    try:
+        for op, *values in ops:
+            count = engine.retime(op, *values, start=start, stop=stop)
+    except ValueError as ex:
+        print(f"Cannot retime {args.src}: {ex}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - t0
+    engine.save(args.dst)
+    print(f"Retimed {count} steps ({', '.join(op for op, *_ in ops)}) in {elapsed * 1000:.1f} ms: {args.dst}")
+    return 0
+
+
+def cmd_info(args) -> int:
+    from .fileio import is_binary_macro, read_macro
+
+    events, settings = read_macro(args.file)
+    total = events.total_delay()
+    keys = events.keys
+    hist = Counter(events.key_counts())
+    blocks = events.blocks
+
+    print(f"File:            {args.file}")
+    print(f"Format:          {'binary' if is_binary_macro(args.file) else 'json'}{' (compressed)' if blocks else ''}")
+    print(f"Steps:           {len(events)}")
+    if blocks is not None:
+        print(f"Stored nodes:    {blocks.node_count()} (nesting depth {blocks.depth()})")
+    print(f"Duration:        {total:.3f} s")
+    print(f"Distinct keys:   {len(keys)}")
+    print(f"Repeat:          {'on' if settings['repeat_enabled'] else 'off'} ({settings['repeat_delay_ms']} ms)")
+    print(f"Toggle key:      {settings['play_toggle_key']}")
+    for key, n in hist.most_common(args.top):
+        print(f"  {key:<14} {n}")
+    return 0
+
+
+def _format_entry(e) -> str:
+    return f"{e.path:<32} {e.steps:>9} {e.duration:>10.2f} s  {e.toggle_key:<8} {e.content_hash[:12]}"
+
+
+def cmd_library(args) -> int:
+    from .library import MacroLibrary
+
+    with MacroLibrary(args.library) as lib:
+        stats = lib.refresh()
+        for rel, err in stats["failed"]:
+            print(f"skipped {rel}: {err}", file=sys.stderr)
+
+        if args.action == "refresh":
+            print(f"{lib.directory}: {len(lib)} macros "
+                  f"({stats['added']} added, {stats['updated']} updated, {stats['removed']} removed)")
+            return 0
+
+        if args.action == "show":
+            try:
+                entry = lib.entry(args.name)
+            except (KeyError, ValueError) as ex:
+                print(ex.args[0], file=sys.stderr)
+                return 1
+            print(_format_entry(entry))
+            for key, n in lib.histogram(entry)[:args.top]:
+                print(f"  {key:<14} {n}")
+            return 0
+
+        entries = lib.search(
+            args.text or "", keys=args.key or (), toggle_key=args.toggle_key,
+            min_steps=args.min_steps, max_steps=args.max_steps,
+            min_duration=args.min_duration, max_duration=args.max_duration,
+            content_hash=args.hash, order=args.order, limit=args.limit,
+        )
+        for entry in entries:
+            print(_format_entry(entry))
+        return 0 if entries else 1
+
+
+def cmd_serve(args) -> int:
+    from .backends import create_backend
+    from .control import ControlServer
+    from .engine import MacroEngine
+
+    engine = MacroEngine()
+    engine.backend_name = args.backend
+    engine.spin_window_ms = args.spin_window
+    engine.batch_window_ms = args.batch_window
+    engine.compensate = not args.no_compensation
+    engine.on_status = lambda msg: print(msg, file=sys.stderr)
+    if args.file:
+        try:
+            engine.load(args.file)
+        except (KeyError, OSError, ValueError) as ex:
+            print(f"Cannot load {args.file}: {ex.args[0] if isinstance(ex, KeyError) else ex}", file=sys.stderr)
+            return 1
+    try:
+        # Created now so the first play does not pay for importing it
+        engine.backend = create_backend(args.backend)
+    except (ImportError, OSError, RuntimeError, ValueError) as ex:
+        print(f"Cannot serve: {ex}", file=sys.stderr)
+        return 1
+    if args.keyboard:
+        engine.use_hotkeys = not args.no_hotkeys
+        if not engine.attach_keyboard():
+            print("keyboard module not available; recording is disabled.", file=sys.stderr)
+        elif args.replay_buffer:
+            engine.enable_replay()
+    elif args.replay_buffer:
+        print("--replay-buffer needs --keyboard.", file=sys.stderr)
+        return 2
+
+    library = None
+    if args.library:
+        from .library import MacroLibrary
+
+        library = MacroLibrary(args.library)
+        library.refresh()
+    try:
+        server = ControlServer(engine, args.socket, library, file_dir=args.files)
+    except (OSError, ValueError) as ex:
+        print(f"Cannot listen on {args.socket or 'the default socket'}: {ex}", file=sys.stderr)
+        return 1
+    print(f"Listening on {server.address}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.close()
+        engine.close()
+        if library is not None:
+            library.close()
+
+
+def cmd_calibrate(args) -> int:
+    from .backends import create_backend
+    from .calibration import calibrate, format_profile, load_profile, remove_profile, save_profile
+
+    if args.show or args.remove:
+        if args.remove:
+            found = remove_profile(args.backend, args.file)
+            print(f"Removed the {args.backend} profile." if found else f"No {args.backend} profile here.")
+            return 0 if found else 1
+        profile = load_profile(args.backend, args.file)
+        if profile is None:
+            print(f"{args.backend} is not calibrated on this machine.", file=sys.stderr)
+            return 1
+        print(format_profile(profile))
+        return 0
+
+    try:
+        backend = create_backend(args.backend)
+    except (ImportError, OSError, ValueError) as ex:
+        print(f"Cannot calibrate {args.backend}: {ex}", file=sys.stderr)
+        return 1
+    if args.backend != "fake":
+        print(f"Pressing {args.key!r} about {args.samples * 3} times in {args.start_delay:g} s...", file=sys.stderr)
+        time.sleep(args.start_delay)
+    try:
+        profile = calibrate(backend, args.key, args.samples, args.batch)
+    except ValueError as ex:
+        print(f"Cannot calibrate {args.backend}: {ex}", file=sys.stderr)
+        return 1
+    finally:
+        backend.close()
+    print(format_profile(profile))
+    if args.dry:
+        return 0
+    save_profile(profile, args.file)
+    print(f"Saved; playback with {args.backend} now compensates for it (play --no-compensation to turn off).")
+    return 0
+
+
+def _ctl_value(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def cmd_ctl(args) -> int:
+    from .control import ControlClient, ControlError
+
+    params = {}
+    for item in args.params:
+        key, sep, value = item.partition("=")
+        if not sep:
+            print(f"Expected KEY=VALUE, got {item!r}", file=sys.stderr)
+            return 2
+        params[key] = _ctl_value(value)
+    try:
+        with ControlClient(args.socket) as client:
+            if args.follow:
+                client.subscribe()
+            reply = client.request(args.cmd, **params)
+            print(json.dumps(reply))
+            if args.follow:
+                while True:
+                    event = client.next_event()
+                    print(json.dumps(event), flush=True)
+                    if event["event"] == "done":
+                        break
+    except ControlError as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    except OSError as ex:
+        print(f"Cannot reach the control socket: {ex}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="macro_recorder", description="Record and replay keystroke macros.")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("gui", help="open the recorder window (default)")
+    p.set_defaults(func=cmd_gui)
+
+    p = sub.add_parser("play", help="replay a macro file without the GUI")
+    p.add_argument("file", help="macro file, or the name of a macro in the library")
+    p.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier (default 1.0)")
+    p.add_argument("--spin-window", type=float, default=DEFAULT_SPIN_WINDOW_MS, metavar="MS",
+                   help="busy-wait this long before each step (default %(default)s ms)")
+    p.add_argument("--backend", choices=sorted(BACKENDS), default="pyautogui", help="key injection backend")
+    p.add_argument("--batch-window", type=float, default=1.0, metavar="MS",
+                   help="send steps due within this window as one batch (default %(default)s ms)")
+    p.add_argument("--repeat", dest="repeat", action="store_true", default=None,
+                   help="repeat until interrupted (overrides the file)")
+    p.add_argument("--no-repeat", dest="repeat", action="store_false", help="play once (overrides the file)")
+    p.add_argument("--repeat-delay", type=int, metavar="MS", help="pause between loops (overrides the file)")
+    p.add_argument("--loops", type=int, default=0, help="play exactly N loops")
+    p.add_argument("--start-delay", type=float, default=0.0, metavar="S",
+                   help="wait before starting, e.g. to focus the target window")
+    _add_range_args(p)
+    p.add_argument("--progress", action="store_true", help="show the position and time left while playing")
+    p.add_argument("--library", metavar="DIR", help="library used to look up FILE by name")
+    p.add_argument("--metrics", metavar="FILE",
+                   help="write runtime metrics here periodically and at the end (.prom/.txt = Prometheus text)")
+    p.add_argument("--metrics-interval", type=float, default=5.0, metavar="S", help="metrics file write interval")
+    p.add_argument("--metrics-port", type=int, metavar="PORT",
+                   help="serve /metrics, /metrics.json and /profile on 127.0.0.1:PORT")
+    p.add_argument("--profile", metavar="FILE",
+                   help="sample stacks during playback and write a report (.folded = flame graph input)")
+    p.add_argument("--overlay", action="append", default=[], metavar="FILE[:OPTIONS]",
+                   help="also play this macro until FILE ends (repeatable); OPTIONS are comma-separated "
+                        "speed=, loops=, repeat=, repeat_delay=MS, priority=, conflict=send|skip|defer, "
+                        "start_delay=S")
+    p.add_argument("--no-compensation", action="store_true",
+                   help="ignore this machine's calibration profile (see calibrate)")
+    p.add_argument("--priority", type=int, default=0, help="FILE's priority against its overlays")
+    p.add_argument("--conflict", choices=["send", "skip", "defer"], default="send",
+                   help="what FILE does with a key a higher-or-equal priority overlay just sent")
+    p.add_argument("--conflict-window", type=float, default=50.0, metavar="MS",
+                   help="how recently a key counts as just sent (default %(default)s ms)")
+    p.set_defaults(func=cmd_play)
+
+    p = sub.add_parser("dryrun", help="simulate playback on a virtual clock: exact timeline, nothing typed")
+    p.add_argument("file", help="macro file, or the name of a macro in the library")
+    p.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier (default 1.0)")
+    p.add_argument("--batch-window", type=float, default=1.0, metavar="MS",
+                   help="send steps due within this window as one batch (default %(default)s ms)")
+    p.add_argument("--repeat", dest="repeat", action="store_true", default=None, help="repeat (overrides the file)")
+    p.add_argument("--no-repeat", dest="repeat", action="store_false", help="play once (overrides the file)")
+    p.add_argument("--repeat-delay", type=int, metavar="MS", help="pause between loops (overrides the file)")
+    p.add_argument("--loops", type=int, default=0, help="simulate N loops (default 1)")
+    _add_range_args(p)
+    p.add_argument("--library", metavar="DIR", help="library used to look up FILE by name")
+    p.add_argument("--top", type=int, default=10, help="number of most pressed keys to list")
+    p.add_argument("--timeline", metavar="FILE", help="write every emit's time and keys (.json, else CSV)")
+    p.set_defaults(func=cmd_dryrun)
+
+    p = sub.add_parser("convert", help="convert between JSON and binary (.mrec) macros")
+    p.add_argument("src")
+    p.add_argument("dst", help="output path; the extension picks the format")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("compress", help="fold repeated step sequences into repeat blocks")
+    p.add_argument("src")
+    p.add_argument("dst", help="output path; the extension picks the format")
+    p.add_argument("--tolerance", type=float, default=0.0, metavar="MS",
+                   help="treat delays this close as equal (default 0: lossless)")
+    p.add_argument("--max-period", type=int, default=256, metavar="N",
+                   help="longest repeated sequence looked for, in steps")
+    p.add_argument("--expand", action="store_true", help="write SRC back out as plain steps instead")
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("retime", help="bulk-edit delays (all in ms; applied in the order listed)")
+    p.add_argument("src")
+    p.add_argument("dst", help="output path; the extension picks the format")
+    p.add_argument("--set", type=float, metavar="MS", help="give every delay this value")
+    p.add_argument("--scale", type=float, metavar="F", help="multiply delays (0.5 = twice as fast)")
+    p.add_argument("--cap-gaps", type=float, metavar="MS", help="shorten delays above this")
+    p.add_argument("--gap-to", type=float, metavar="MS", help="what --cap-gaps shortens to (default: the cap)")
+    p.add_argument("--quantize", type=float, metavar="MS", help="round delays to a multiple of this")
+    p.add_argument("--jitter", type=float, metavar="MS", help="add uniform noise of up to +/- this")
+    p.add_argument("--seed", type=int, help="seed for --jitter")
+    p.add_argument("--min", type=float, metavar="MS", help="raise shorter delays to this")
+    p.add_argument("--max", type=float, metavar="MS", help="lower longer delays to this")
+    p.add_argument("--first", type=int, default=1, metavar="N", help="first step to edit (1-based)")
+    p.add_argument("--last", type=int, metavar="N", help="last step to edit (default: the end)")
+    p.set_defaults(func=cmd_retime)
+
+    p = sub.add_parser("info", help="summarize a macro file")
+    p.add_argument("file")
+    p.add_argument("--top", type=int, default=10, help="number of most frequent keys to list")
+    p.set_defaults(func=cmd_info)
+
+    p = sub.add_parser("library", help="index and search a directory of macros")
+    p.add_argument("--library", metavar="DIR", help="library directory (default $MACRO_RECORDER_LIBRARY "
+                                                     "or ~/macro_library)")
+    lib_sub = p.add_subparsers(dest="action", required=True)
+    lib_sub.add_parser("refresh", help="update the index after files changed")
+    q = lib_sub.add_parser("search", help="list macros matching all filters")
+    q.add_argument("text", nargs="?", help="substring of the name or path")
+    q.add_argument("--key", action="append", help="macro contains this key (repeatable)")
+    q.add_argument("--toggle-key", help="play toggle key, e.g. f8 or scan:41")
+    q.add_argument("--min-steps", type=int)
+    q.add_argument("--max-steps", type=int)
+    q.add_argument("--min-duration", type=float, metavar="S")
+    q.add_argument("--max-duration", type=float, metavar="S")
+    q.add_argument("--hash", help="content hash or a prefix of it")
+    q.add_argument("--order", choices=["name", "recent", "steps", "duration"], default="name")
+    q.add_argument("--limit", type=int, default=200)
+    q = lib_sub.add_parser("show", help="one macro's details and key histogram")
+    q.add_argument("name")
+    q.add_argument("--top", type=int, default=10)
+    p.set_defaults(func=cmd_library)
+
+    p = sub.add_parser("serve", help="run a headless engine driven through a control socket")
+    p.add_argument("file", nargs="?", help="macro to load first")
+    p.add_argument("--socket", metavar="PATH", help="Unix socket path or tcp://HOST:PORT "
+                                                   "(default ~/.macro_recorder/control.sock)")
+    p.add_argument("--backend", choices=sorted(BACKENDS), default="pyautogui", help="key injection backend")
+    p.add_argument("--spin-window", type=float, default=DEFAULT_SPIN_WINDOW_MS, metavar="MS",
+                   help="busy-wait this long before each step (default %(default)s ms)")
+    p.add_argument("--batch-window", type=float, default=1.0, metavar="MS",
+                   help="send steps due within this window as one batch (default %(default)s ms)")
+    p.add_argument("--no-compensation", action="store_true",
+                   help="ignore this machine's calibration profile (see calibrate)")
+    p.add_argument("--library", metavar="DIR", help="library for loading macros by name")
+    p.add_argument("--files", metavar="DIR",
+                   help="directory that load/save paths must be in (default ~/.macro_recorder)")
+    p.add_argument("--keyboard", action="store_true",
+                   help="install the global key hook, so record_start and the toggle key work")
+    p.add_argument("--no-hotkeys", action="store_true", help="with --keyboard: ignore the play toggle key")
+    p.add_argument("--replay-buffer", action="store_true",
+                   help="with --keyboard: keep recent key presses, so replay_keep seconds=N can make them the macro")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("calibrate", help="measure injection cost and wait overshoot; playback then compensates")
+    p.add_argument("--backend", choices=sorted(BACKENDS), default="pyautogui", help="key injection backend")
+    p.add_argument("--key", default="shift", help="key pressed while measuring (default %(default)s)")
+    p.add_argument("--samples", type=int, default=200, help="timed presses (default %(default)s)")
+    p.add_argument("--batch", type=int, default=8, help="keys per timed batch (default %(default)s)")
+    p.add_argument("--start-delay", type=float, default=3.0, metavar="S",
+                   help="wait before pressing keys, e.g. to focus a harmless window")
+    p.add_argument("--file", metavar="PATH", help="profile file (default ~/.macro_recorder/calibration.json)")
+    p.add_argument("--dry", action="store_true", help="measure and print, but do not save")
+    p.add_argument("--show", action="store_true", help="print the saved profile")
+    p.add_argument("--remove", action="store_true", help="delete the saved profile")
+    p.set_defaults(func=cmd_calibrate)
+
+    p = sub.add_parser("ctl", help="send one command to a running control socket")
+    p.add_argument("cmd", help="ping, status, play, stop, pause, resume, load, save, record_start, ...")
+    p.add_argument("params", nargs="*", metavar="KEY=VALUE", help="command arguments, e.g. speed=2 path=m.mrec")
+    p.add_argument("--socket", metavar="PATH", help="socket path or tcp://HOST:PORT")
+    p.add_argument("--follow", action="store_true", help="print events until playback is done")
+    p.set_defaults(func=cmd_ctl)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        return cmd_gui(args)
+    return args.func(args)
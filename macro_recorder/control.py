@@ -0,0 +1,595 @@
+"""
+Local control socket: trigger, stop and watch playback from other programs.
+
+A ControlServer listens on a Unix domain socket (or tcp://HOST:PORT where
+those are unavailable, e.g. on Windows) and runs an asyncio loop on its
+own thread. There is no authentication: the Unix socket is private to the
+user (mode 0600), and a TCP address must be a loopback host. Paths given
+to load and save must be inside the server's file directory (the state
+directory by default). Each direction carries one JSON object per line:
+
+    -> {"id": 1, "cmd": "play", "speed": 2.0}
+    <- {"id": 1, "ok": true, "steps": 120}
+    <- {"id": 2, "ok": false, "error": "No macro recorded."}
+    <- {"event": "step", "index": 17, "count": 1, "loop": 0}
+
+Requests on a connection are answered in order and may be pipelined (sent
+without waiting for the replies); "id" is echoed back. Commands:
+
+    ping, status
+    play [speed, repeat, repeat_delay_ms, loops, start, stop, from_time],
+    stop, pause, resume
+    load (path | name from the library), save path (under the file directory)
+    record_start, record_stop
+    subscribe [events], unsubscribe
+
+play's options apply to that run only, and it is refused while another
+run is playing. play/stop/pause/resume call the engine straight from the socket thread, so
+a trigger costs a line read, a JSON parse and starting the playback thread.
+Events from the engine's threads (see EVENTS) are queued and written by the
+loop in batches; a subscriber that stops reading loses events (counted in
+ControlServer.dropped) instead of slowing playback down.
+
+ControlClient is a small blocking client for scripts.
+"""
+
+import asyncio
+import errno
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from .journal import STATE_DIR_ENV
+
+CONTROL_SOCKET_ENV = "MACRO_RECORDER_CONTROL"
+CONTROL_SOCKET_FILENAME = "control.sock"
+
+# step: every batch sent; progress: the position, at most every
+# PROGRESS_INTERVAL; recorded: every recorded step; status: engine status
+# lines; done: playback ended
+EVENTS = ("step", "progress", "recorded", "status", "done")
+PROGRESS_INTERVAL = 0.1
+
+# Commands that change the macro or recording; a GUI runs these on its own
+# thread through ControlServer(call=...)
+STATE_COMMANDS = frozenset({"load", "save", "record_start", "record_stop", "replay_keep", "undo", "redo"})
+COMMANDS = frozenset({"ping", "status", "play", "stop", "pause", "resume", "subscribe", "unsubscribe"}) | STATE_COMMANDS
+
+# Bytes queued for one connection before its events are dropped
+MAX_BUFFERED = 1 << 20
+
+
+class ControlError(Exception):
+    """A command was refused by the server; the message is the server's."""
+
+
+def default_state_dir() -> str:
+    """$MACRO_RECORDER_STATE or ~/.macro_recorder."""
+    return os.environ.get(STATE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".macro_recorder")
+
+
+def default_socket_path() -> str:
+    """Socket location in the state directory."""
+    return os.path.join(default_state_dir(), CONTROL_SOCKET_FILENAME)
+
+
+def parse_address(address: str) -> tuple:
+    """("tcp", (host, port)) for tcp://HOST:PORT, else ("unix", path)."""
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    return "unix", address
+
+
+def _check_loopback(host: str):
+    """Refuse to serve on a host reachable from other machines."""
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as ex:
+        raise ValueError(f"Cannot resolve control host {host!r}: {ex}") from None
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback:
+            raise ValueError(f"The control socket has no authentication; refusing to serve on {host!r}. "
+                             f"Use a loopback host such as 127.0.0.1.")
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _remove_stale_socket(path: str):
+    """Remove a socket file left by a crashed server; refuse if one is live."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+    else:
+        raise OSError(errno.EADDRINUSE, f"Another process is serving {path}")
+    finally:
+        probe.close()
+
+
+def _chain(first, second):
+    if first is None:
+        return second
+
+    def both(*args):
+        first(*args)
+        second(*args)
+    return both
+
+
+class ControlServer:
+    """
+    Serves `engine` on `address` until close(). `library` (a MacroLibrary)
+    enables "load" by name; `call(fn)` -> concurrent Future, if given, runs
+    the STATE_COMMANDS elsewhere (the GUI passes one that uses the Tk thread).
+    load and save paths are relative to, and must stay inside, `file_dir`
+    (default: the state directory).
+    """
+
+    def __init__(self, engine, address: str = None, library=None, call=None, file_dir: str = None):
+        self.engine = engine
+        self.address = address or default_socket_path()
+        self.library = library
+        self.call = call
+        self.file_dir = os.path.realpath(file_dir or default_state_dir())
+        self.progress_interval = PROGRESS_INTERVAL
+        self.dropped = 0  # events not sent to subscribers that fell behind
+
+        self._subscribers = {}    # StreamWriter -> set of event names
+        self._connections = set()
+        self._pending = deque()   # events from engine threads, for _flush
+        self._flush_scheduled = False
+        self._last_progress = 0.0
+        self._last_step = None
+        self._progress_sent = None
+        self._closed = False
+        self._server = None
+
+        self._loop = asyncio.new_event_loop()
+        started = Future()
+        self._thread = threading.Thread(target=self._run, args=(started,), name="control-server", daemon=True)
+        self._thread.start()
+        started.result()  # re-raises a failure to bind
+
+        self._callbacks = {
+            name: getattr(engine, name)
+            for name in ("on_played", "on_playback_done", "on_step_recorded", "on_status")
+        }
+        engine.on_played = _chain(engine.on_played, self._on_played)
+        engine.on_playback_done = _chain(engine.on_playback_done, self._on_done)
+        engine.on_step_recorded = _chain(engine.on_step_recorded, self._on_recorded)
+        engine.on_status = _chain(engine.on_status, self._on_status)
+
+    # ---------------- Server thread ----------------
+
+    def _run(self, started: Future):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(self._listen())
+        except BaseException as ex:
+            self._loop.close()
+            started.set_exception(ex)
+            return
+        started.set_result(None)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Closing a connection ends its reader, so its task returns; only
+            # one stuck waiting on call() is cancelled
+            for writer in list(self._connections):
+                writer.close()
+            tasks = asyncio.all_tasks(self._loop)
+            if tasks:
+                _done, stuck = self._loop.run_until_complete(asyncio.wait(tasks, timeout=1.0))
+                for task in stuck:
+                    task.cancel()
+                self._loop.run_until_complete(asyncio.gather(*stuck, return_exceptions=True))
+            self._loop.close()
+
+    async def _listen(self):
+        kind, where = parse_address(self.address)
+        if kind == "tcp":
+            _check_loopback(where[0])
+            server = await asyncio.start_server(self._serve, *where)
+            host, port = server.sockets[0].getsockname()[:2]
+            self.address = f"tcp://{host}:{port}"
+            return server
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not available here; use tcp://127.0.0.1:PORT")
+        if os.path.exists(where):
+            _remove_stale_socket(where)
+        os.makedirs(os.path.dirname(os.path.abspath(where)), exist_ok=True)
+        server = await asyncio.start_unix_server(self._serve, where)
+        os.chmod(where, 0o600)
+        return server
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # longer than the stream limit
+                    writer.write(_encode({"id": None, "ok": False, "error": "Request line too long"}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(await self._dispatch(line, writer))
+                    if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                        await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.pop(writer, None)
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, line: bytes, writer) -> bytes:
+        rid = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+            rid = request.pop("id", None)
+            cmd = request.pop("cmd", None)
+            if cmd not in COMMANDS:
+                raise ValueError(f"Unknown command {cmd!r}")
+            handler = getattr(self, f"_cmd_{cmd}")
+            if cmd in STATE_COMMANDS and self.call is not None:
+                result = await asyncio.wrap_future(self.call(lambda: handler(writer, request)))
+            else:
+                result = handler(writer, request)
+        except Exception as ex:
+            message = ex.args[0] if isinstance(ex, KeyError) and ex.args else str(ex)
+            return _encode({"id": rid, "ok": False, "error": message or type(ex).__name__})
+        return _encode({"id": rid, "ok": True, **(result or {})})
+
+    # ---------------- Commands ----------------
+
+    def _file_path(self, path) -> str:
+        """`path` resolved under file_dir; ValueError if it leads outside."""
+        full = os.path.realpath(os.path.join(self.file_dir, os.path.expanduser(str(path))))
+        if os.path.commonpath([full, self.file_dir]) != self.file_dir:
+            raise ValueError(f"Paths must be inside {self.file_dir}")
+        return full
+
+    def _cmd_ping(self, _writer, _args) -> dict:
+        return {}
+
+    def _cmd_status(self, _writer, _args) -> dict:
+        e = self.engine
+        return {
+            "playing": e.is_playing,
+            "paused": e.is_paused,
+            "recording": e.recording,
+            "steps": len(e.events),
+            "speed": e.speed,
+            "repeat": e.repeat_enabled,
+            "last_loops": e.last_loops,
+            "progress": e.progress() if e.is_playing else None,
+            "replay": e.replay.stats() if e.replay is not None else None,
+            "undo": e.history.undo_label,
+            "redo": e.history.redo_label,
+        }
+
+    def _cmd_play(self, _writer, args) -> dict:
+        # speed, repeat, ... apply to this run only; the engine's options stay
+        e = self.engine
+        options = {}
+        if "speed" in args:
+            options["speed"] = float(args["speed"])
+        if "repeat" in args:
+            options["repeat"] = bool(args["repeat"])
+        if "repeat_delay_ms" in args:
+            options["repeat_delay_ms"] = max(0, int(args["repeat_delay_ms"]))
+        if "loops" in args:
+            options["max_loops"] = int(args["loops"] or 0)
+            if options["max_loops"]:
+                options["repeat"] = True
+        from_time = args.get("from_time")
+        started = e.play(int(args.get("start") or 0), None if args.get("stop") is None else int(args["stop"]),
+                         None if from_time is None else float(from_time), **options)
+        if not started:
+            raise RuntimeError("Already playing; stop first.")
+        progress = e.progress()
+        return {"steps": len(e.events), "start": progress["start"], "stop": progress["stop"]}
+
+    def _cmd_stop(self, _writer, _args) -> dict:
+        self.engine.stop()
+        return {}
+
+    def _cmd_pause(self, _writer, _args) -> dict:
+        self.engine.pause()
+        return {"paused": self.engine.is_paused}
+
+    def _cmd_resume(self, _writer, _args) -> dict:
+        self.engine.resume()
+        return {}
+
+    def _cmd_load(self, _writer, args) -> dict:
+        e = self.engine
+        if e.recording:
+            raise RuntimeError("Stop recording first.")
+        if args.get("path"):
+            return {"steps": e.load(self._file_path(args["path"]))}
+        if args.get("name"):
+            if self.library is None:
+                raise RuntimeError("No macro library is open.")
+            return {"steps": e.set_macro(*self.library.load(str(args["name"])))}
+        raise ValueError("load needs a path or a name")
+
+    def _cmd_save(self, _writer, args) -> dict:
+        if not args.get("path"):
+            raise ValueError("save needs a path")
+        path = self._file_path(args["path"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.engine.save(path)
+        return {"steps": len(self.engine.events)}
+
+    def _cmd_record_start(self, _writer, _args) -> dict:
+        if self.engine.keyboard is None:
+            raise RuntimeError("Recording requires the 'keyboard' module and its hook.")
+        self.engine.start_recording()
+        return {}
+
+    def _cmd_record_stop(self, _writer, _args) -> dict:
+        return {"steps": self.engine.stop_recording()}
+
+    def _cmd_replay_keep(self, _writer, args) -> dict:
+        e = self.engine
+        if e.recording:
+            raise RuntimeError("Stop recording first.")
+        seconds = args.get("seconds")
+        events = e.take_replay(None if seconds is None else float(seconds))
+        if not events:
+            raise RuntimeError("The replay buffer holds no keys from that window.")
+        return {"steps": e.set_macro(events, e.settings(), "Keep replay")}
+
+    def _cmd_undo(self, _writer, _args) -> dict:
+        return {"undone": self.engine.undo(), "steps": len(self.engine.events)}
+
+    def _cmd_redo(self, _writer, _args) -> dict:
+        return {"redone": self.engine.redo(), "steps": len(self.engine.events)}
+
+    def _cmd_subscribe(self, writer, args) -> dict:
+        events = args.get("events") or EVENTS
+        unknown = set(events) - set(EVENTS)
+        if unknown:
+            raise ValueError(f"Unknown events {sorted(unknown)} (choose from {', '.join(EVENTS)})")
+        self._subscribers[writer] = set(events)
+        return {"events": sorted(events)}
+
+    def _cmd_unsubscribe(self, writer, _args) -> dict:
+        self._subscribers.pop(writer, None)
+        return {}
+
+    # ---------------- Events ----------------
+
+    def _post(self, item: tuple):
+        # Engine threads: queue the event and wake the loop once per batch
+        if not self._subscribers:
+            return
+        self._pending.append(item)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            try:
+                self._loop.call_soon_threadsafe(self._flush)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def _on_played(self, index, count, loop):
+        self._post(("step", index, count, loop))
+
+    def _on_done(self, loops, steps, stopped):
+        self._post(("done", loops, steps, stopped))
+
+    def _on_recorded(self, index):
+        self._post(("recorded", index, self.engine.events.key(index)))
+
+    def _on_status(self, message):
+        self._post(("status", message))
+
+    def _progress(self, step: tuple) -> tuple:
+        _kind, index, count, loop = step
+        done = index + count
+        at = self.engine.progress(done)
+        self._progress_sent = step
+        return "progress", _encode({
+            "event": "progress", "index": done, "steps": len(self.engine.events), "loop": loop,
+            "start": at["start"], "stop": at["stop"], "fraction": at["fraction"],
+            "elapsed": at["elapsed"], "remaining": at["remaining"], "eta": at["eta"],
+        })
+
+    def _flush(self):
+        # Loop thread. Clear the flag before draining, so an event queued
+        # during the drain schedules another flush.
+        self._flush_scheduled = False
+        pending = self._pending
+        items = []
+        while pending:
+            items.append(pending.popleft())
+        if not self._subscribers or not items:
+            return
+
+        out = []   # (event name, encoded line) in order
+        now = time.monotonic()
+        for item in items:
+            kind = item[0]
+            if kind == "step":
+                _kind, index, count, loop = self._last_step = item
+                out.append(("step", _encode({"event": "step", "index": index, "count": count, "loop": loop})))
+                if now - self._last_progress >= self.progress_interval:
+                    self._last_progress = now
+                    out.append(self._progress(item))
+            elif kind == "done":
+                # The final position, even if the throttle skipped it
+                if self._last_step is not None and self._progress_sent is not self._last_step:
+                    out.append(self._progress(self._last_step))
+                self._last_step = None
+                out.append(("done", _encode({"event": "done", "loops": item[1], "steps": item[2],
+                                             "stopped": item[3]})))
+            elif kind == "recorded":
+                out.append(("recorded", _encode({"event": "recorded", "index": item[1], "key": item[2]})))
+            else:
+                out.append(("status", _encode({"event": "status", "message": item[1]})))
+
+        for writer, wanted in list(self._subscribers.items()):
+            chosen = [line for kind, line in out if kind in wanted]
+            if not chosen:
+                continue
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                self.dropped += len(chosen)
+                continue
+            writer.write(b"".join(chosen))
+
+    # ---------------- Shutdown ----------------
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for name, callback in self._callbacks.items():
+            setattr(self.engine, name, callback)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        kind, where = parse_address(self.address)
+        if kind == "unix":
+            try:
+                os.remove(where)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ControlClient:
+    """
+    Blocking client. request() sends one command and returns its reply;
+    pipeline() sends several at once; next_event() returns subscribed
+    events, which are buffered while waiting for replies.
+    """
+
+    def __init__(self, address: str = None, timeout: float = 5.0):
+        kind, where = parse_address(address or default_socket_path())
+        if kind == "tcp":
+            self._sock = socket.create_connection(where, timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(where)
+        self.timeout = timeout
+        self._sock_timeout = timeout
+        self._buf = bytearray()
+        self._events = deque()
+        self._next_id = 0
+
+    def _read(self, timeout) -> dict:
+        while True:
+            nl = self._buf.find(b"\n")
+            if nl >= 0:
+                line = bytes(self._buf[:nl])
+                del self._buf[:nl + 1]
+                return json.loads(line)
+            if timeout != self._sock_timeout:
+                self._sock.settimeout(timeout)
+                self._sock_timeout = timeout
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("The control server closed the connection")
+            self._buf += chunk
+
+    def _reply(self) -> dict:
+        while True:
+            msg = self._read(self.timeout)
+            if "event" in msg:
+                self._events.append(msg)
+            else:
+                return msg
+
+    def _line(self, cmd: str, args: dict) -> bytes:
+        self._next_id += 1
+        return _encode({"id": self._next_id, "cmd": cmd, **args})
+
+    def request(self, cmd: str, **args) -> dict:
+        """Send one command; returns its reply or raises ControlError."""
+        self._sock.sendall(self._line(cmd, args))
+        reply = self._reply()
+        if not reply.get("ok"):
+            raise ControlError(reply.get("error", "request failed"))
+        return reply
+
+    def pipeline(self, commands) -> list:
+        """Send [(cmd, args), ...] in one write; returns the replies in order (not raised)."""
+        data = b"".join(self._line(cmd, args or {}) for cmd, args in commands)
+        self._sock.sendall(data)
+        return [self._reply() for _ in range(len(commands))]
+
+    def next_event(self, timeout: float = None) -> dict:
+        """The next subscribed event; None if none arrives within `timeout` seconds."""
+        if self._events:
+            return self._events.popleft()
+        while True:
+            try:
+                msg = self._read(timeout)
+            except (TimeoutError, BlockingIOError):  # BlockingIOError: timeout 0
+                return None
+            if "event" in msg:
+                return msg
+
+    def wait_event(self, name: str, timeout: float = None) -> dict:
+        """Skip events until one named `name`; None on timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if end is None else max(0.0, end - time.monotonic())
+            event = self.next_event(left)
+            if event is None or event["event"] == name:
+                return event
+
+    # Shorthands
+    def ping(self):
+        return self.request("ping")
+
+    def status(self) -> dict:
+        return self.request("status")
+
+    def play(self, **options) -> dict:
+        return self.request("play", **options)
+
+    def stop(self):
+        return self.request("stop")
+
+    def pause(self):
+        return self.request("pause")
+
+    def resume(self):
+        return self.request("resume")
+
+    def load(self, path: str = None, name: str = None) -> dict:
+        return self.request("load", **({"path": path} if path else {"name": name}))
+
+    def subscribe(self, *events) -> dict:
+        return self.request("subscribe", **({"events": list(events)} if events else {}))
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
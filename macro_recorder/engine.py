@@ -0,0 +1,928 @@
+"""
+GUI-free macro engine: recording, playback and macro files.
+
+Nothing here imports tkinter, and pyautogui / keyboard are only imported on
+first use, so scripts can replay macros without a window. Callbacks are
+invoked on the engine's worker threads; a GUI must marshal them itself.
+"""
+
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+
+from .backends import RecordingBackend, create_backend
+from .blocks import DEFAULT_MAX_PERIOD, compress
+from .calibration import Compensation, load_profile
+from .capture import CaptureRing
+from .fileio import default_settings, read_macro, write_macro
+from .history import EditHistory
+from .journal import DEFAULT_FLUSH_MS, JournalWriter, read_journal
+from .metrics import MetricsRegistry
+from .plan import PlanCache, step_range
+from .replay import REPLAY_CAPACITY, REPLAY_SPAN_S, ReplayBuffer
+from .retime import OPERATIONS
+from .store import EventStore
+from .timing import DEFAULT_SPIN_WINDOW_MS, Clock, LatenessStats, VirtualClock, format_lateness
+
+_keyboard = None
+_keyboard_loaded = False
+
+# Steps scheduled within this window of a batch's first step share one emit.
+DEFAULT_BATCH_WINDOW_MS = 1.0
+
+
+def load_keyboard():
+    """Import the optional keyboard module on first use; None if unusable."""
+    global _keyboard, _keyboard_loaded
+    if not _keyboard_loaded:
+        _keyboard_loaded = True
+        try:
+            import keyboard
+            _keyboard = keyboard
+        except Exception:
+            _keyboard = None
+    return _keyboard
+
+
+def sec_to_ms_int(seconds: float) -> int:
+    return int(round(max(0.0, float(seconds)) * 1000.0))
+
+
+def ms_int_to_sec(ms: int) -> float:
+    return max(0, int(ms)) / 1000.0
+
+
+class MacroEngine:
+    """
+    Records global keystrokes into an EventStore and plays them back.
+
+    Options are plain attributes; set them before calling play().
+    """
+
+    def __init__(self):
+        self.events = EventStore()  # (key, delay seconds) per step
+        self.history = EditHistory()  # undo/redo of changes to the macro
+
+        # State the hook filter depends on (see _rebuild_hook_table); set
+        # through the use_hotkeys / recording / capturing_toggle_key properties
+        self._use_hotkeys = True
+        self._recording = False
+        self._capturing = False
+        self._replay = None                   # ReplayBuffer while always-on capture is enabled
+        self.keyboard = None
+        self._hook_all = False                # forward every event
+        self._hook_scan_codes = frozenset()   # else only these scan codes...
+        self._hook_names = frozenset()        # ...or key names
+
+        # Options
+        self.ignore_keys = {"f9", "f10", "esc"}
+        self.speed = 1.0
+        self.spin_window_ms = DEFAULT_SPIN_WINDOW_MS
+        self.repeat_enabled = False
+        self.repeat_delay_ms = 250
+        self.max_loops = None  # stop after this many loops even when repeating
+        self.backend_name = "pyautogui"
+        self.backend = None    # InjectionBackend; created from backend_name on first play
+        self.batch_window_ms = DEFAULT_BATCH_WINDOW_MS
+        # Injection-latency compensation (see calibration.py): True applies
+        # this machine's profile for the backend, if it was calibrated; False
+        # none; or a Compensation to apply as is
+        self.compensate = True
+        self.calibration_path = None  # None: default_calibration_path()
+
+        # Toggle key: can be "f8" or "scan:<code>"
+        self.play_toggle_key = "f8"
+        self.toggle_scan_code = None
+        self.toggle_key_name = None
+        self._toggle_pressed_guard = False
+        self.resolve_toggle_key()
+
+        # Callbacks (called from worker threads)
+        self.on_status = None           # (message)
+        self.on_step_recorded = None    # (event index)
+        self.on_toggle_captured = None  # (key id, e.g. "scan:41")
+        self.on_toggle_pressed = None   # ()
+        self.on_played = None           # (first step index of the batch, steps sent, loop); per batch
+        self.on_playback_done = None    # (loops, steps sent, stopped)
+
+        # Recording
+        self._last_time = None
+        self._capture = CaptureRing()
+        self._capture_wakeup = threading.Event()
+        self._capture_thread = None
+        self._closing = False
+        self._hook_latency_count = 0
+        self._hook_latency_sum = 0.0
+        self._hook_latency_max = 0.0
+
+        # Write-ahead journal of the recording (None disables it). It is kept
+        # until the macro is saved or replaced, so it survives a crash.
+        self.journal_path = None
+        self.journal_flush_ms = DEFAULT_FLUSH_MS
+        self.journal_fsync = True
+        self._journal = None
+
+        # Playback
+        self.clock = Clock()
+        self.compensation = None  # Compensation applied by the current or last run
+        self.play_origin = None   # clock time the current or last run started (its offset 0)
+        self._play_thread = None
+        self._play_finishing = False  # the worker is only reporting its results
+        self._stop_playback = threading.Event()
+        self._paused = threading.Event()
+        self._interrupt = threading.Event()  # wakes the worker from any wait
+        self._stop_requested_at = 0.0
+        self._pause_requested_at = 0.0
+        self.last_lateness = None
+        self.last_loops = 0
+        self.last_injection = None
+        self.last_cancel_latency = None  # seconds from stop() to the worker reacting
+        self.last_pause_latency = None   # seconds from pause() to the worker holding
+        self.plan_cache = PlanCache()
+        self._play_start = 0             # steps [start, stop) of the last play()
+        self._run_options = None         # (speed, repeat, ...) of the last play()
+        self._play_stop = None
+        self.play_position = 0           # next step playback sends (absolute index)
+        self.play_loop = 0               # loops playback has completed
+
+        # Runtime metrics; each one is written by a single thread
+        self.metrics = MetricsRegistry()
+        self._init_metrics()
+
+    @staticmethod
+    def _emit(callback, *args):
+        if callback is not None:
+            callback(*args)
+
+    # ---------------- Settings ----------------
+
+    def settings(self) -> dict:
+        return {
+            "repeat_enabled": bool(self.repeat_enabled),
+            "repeat_delay_ms": int(self.repeat_delay_ms),
+            "play_toggle_key": str(self.play_toggle_key).strip().lower() or "f8",
+        }
+
+    def apply_settings(self, settings: dict):
+        merged = default_settings()
+        merged.update(settings)
+        self.repeat_enabled = bool(merged["repeat_enabled"])
+        self.repeat_delay_ms = int(merged["repeat_delay_ms"])
+        self.set_toggle_key(merged["play_toggle_key"])
+
+    def set_toggle_key(self, key_id: str):
+        self.play_toggle_key = str(key_id).strip().lower()
+        self.resolve_toggle_key()
+
+    def resolve_toggle_key(self):
+        """
+        Parse play_toggle_key into either a scan code (best for dead keys) or a name.
+        Examples:
+          "scan:41" -> scan code 41
+          "f8"      -> name "f8"
+        """
+        val = str(self.play_toggle_key).strip().lower()
+        self.toggle_scan_code = None
+        self.toggle_key_name = None
+
+        if val.startswith("scan:"):
+            try:
+                self.toggle_scan_code = int(val.split(":", 1)[1])
+            except Exception:
+                self.toggle_scan_code = None
+        elif val:
+            self.toggle_key_name = val
+        self._rebuild_hook_table()
+
+    # ---------------- Hook filter ----------------
+
+    @property
+    def use_hotkeys(self) -> bool:
+        return self._use_hotkeys
+
+    @use_hotkeys.setter
+    def use_hotkeys(self, value: bool):
+        self._use_hotkeys = bool(value)
+        self._rebuild_hook_table()
+
+    @property
+    def recording(self) -> bool:
+        return self._recording
+
+    @recording.setter
+    def recording(self, value: bool):
+        self._recording = bool(value)
+        self._rebuild_hook_table()
+
+    @property
+    def capturing_toggle_key(self) -> bool:
+        return self._capturing
+
+    @capturing_toggle_key.setter
+    def capturing_toggle_key(self, value: bool):
+        self._capturing = bool(value)
+        self._rebuild_hook_table()
+
+    def _rebuild_hook_table(self):
+        """
+        Precompute which events the hook forwards, so the hook itself is one
+        membership test. Called whenever recording, toggle capture, the toggle
+        key or the hotkey switch changes; everything else is dropped in the
+        hook without being queued.
+        """
+        scan_codes = set()
+        names = set()
+        if self._use_hotkeys:
+            if self.toggle_scan_code is not None:
+                scan_codes.add(self.toggle_scan_code)
+            elif self.toggle_key_name:
+                name = self.toggle_key_name
+                names.update((name, name.upper(), name.capitalize()))
+                if self.keyboard is not None:
+                    try:
+                        scan_codes.update(self.keyboard.key_to_scan_codes(name))
+                    except Exception:
+                        pass
+        # Publish the sets before the flag the hook reads first
+        self._hook_scan_codes = frozenset(scan_codes)
+        self._hook_names = frozenset(names)
+        self._hook_all = self._recording or self._capturing or self._replay is not None
+
+    def _init_metrics(self):
+        m = self.metrics
+        self._m_hook_events = m.counter("hook_events_total", "Key events seen by the keyboard hook")
+        m.gauge("hook_forward_all", "1 while every key event is forwarded (recording, capturing or replay buffer)",
+                fn=lambda: int(self._hook_all))
+        self._m_hook_callback = m.histogram(
+            "hook_callback_seconds", "Time spent inside the keyboard hook callback for forwarded events")
+        self._m_hook_latency = m.histogram(
+            "hook_latency_seconds", "Delay from the OS event timestamp to the hook callback")
+        self._m_steps_recorded = m.counter("steps_recorded_total", "Steps appended while recording")
+        self._m_lateness = m.histogram(
+            "playback_lateness_seconds", "How late each batch was sent versus its deadline")
+        self._m_injection = m.histogram("injection_seconds", "Time spent in one backend press/emit call")
+        self._m_keys_injected = m.counter("keys_injected_total", "Keys sent by playback")
+        self._m_loops = m.counter("playback_loops_total", "Completed playback loops")
+        m.gauge("capture_queue_depth", "Hook events waiting for the capture worker", fn=lambda: len(self._capture))
+        m.gauge("hook_dropped", "Hook events dropped because the capture ring was full",
+                fn=lambda: self._capture.dropped)
+        m.gauge("plan_cache_hits", "Playback plan cache hits", fn=lambda: self.plan_cache.hits)
+        m.gauge("plan_cache_misses", "Playback plan cache misses", fn=lambda: self.plan_cache.misses)
+        m.gauge("playing", "1 while playback runs", fn=lambda: int(self.is_playing))
+        m.gauge("recording", "1 while recording", fn=lambda: int(self.recording))
+        m.gauge("replay_buffer_presses", "Presses held by the replay buffer",
+                fn=lambda: len(self._replay) if self._replay is not None else 0)
+
+    # ---------------- Files ----------------
+
+    def load(self, path: str) -> int:
+        events, settings = read_macro(path)
+        return self.set_macro(events, settings)
+
+    def set_macro(self, events: EventStore, settings: dict, label: str = "Load") -> int:
+        """Switch to an already loaded macro, e.g. one from a MacroLibrary; undoable as `label`."""
+        self.discard_journal()
+        return self._replace_macro(events, settings, label)
+
+    def _replace_macro(self, events: EventStore, settings: dict, label: str) -> int:
+        self._forget_plans()
+        self.history.swap(self.events, events, label, self.settings(), settings)
+        self.events = events
+        self.apply_settings(settings)
+        return len(events)
+
+    def save(self, path: str):
+        write_macro(path, self.events, self.settings())
+        self.discard_journal()
+
+    def clear(self):
+        self.discard_journal()
+        self._forget_plans()
+        if self.events:
+            self._swap_events(EventStore(), "Clear")
+
+    def _swap_events(self, events: EventStore, label: str):
+        # A new store rather than changing this one, so undo can keep it
+        self.history.swap(self.events, events, label)
+        self.events = events
+
+    def set_delay(self, index: int, seconds: float):
+        """Edit one step's delay; plans compiled for the old content are dropped."""
+        self._forget_plans()
+        with self.history.edit(self.events, "Edit delay"):
+            self.events.set_delay(index, seconds)
+
+    def retime(self, op: str, *args, start: int = 0, stop: int = None) -> int:
+        """
+        Apply a bulk delay edit from retime.OPERATIONS (e.g. "scale", 0.5) to
+        steps [start, stop), in seconds. Returns the number of steps edited.
+        """
+        func = OPERATIONS.get(op)
+        if func is None:
+            raise ValueError(f"Unknown retime operation {op!r} (choose from {', '.join(OPERATIONS)})")
+        n = len(self.events)
+        stop = n if stop is None else min(int(stop), n)
+        start = max(0, int(start))
+        if start >= stop:
+            return 0
+        # Arguments are checked on no steps first, so a rejected edit
+        # leaves no undo step and keeps the compiled plans
+        func(array("d"), *args)
+        self._forget_plans()
+        with self.history.edit(self.events, f"Retime ({op})"):
+            view = self.events.edit_delays(start, stop)
+            try:
+                func(view, *args)
+            finally:
+                view.release()
+        return stop - start
+
+    def compress(self, tolerance_ms: float = 0.0, max_period: int = DEFAULT_MAX_PERIOD) -> dict:
+        """
+        Fold repeated step sequences into repeat blocks. With tolerance 0
+        playback is unchanged; otherwise delays within `tolerance_ms` of each
+        other are snapped together first. The macro is only replaced if that
+        stores fewer nodes than it has steps. Returns steps, nodes, depth and
+        "compressed".
+        """
+        blocks = compress(self.events, max(0.0, float(tolerance_ms)) / 1000.0, max_period)
+        nodes = blocks.node_count()
+        stats = {"steps": len(blocks), "nodes": nodes, "depth": blocks.depth(), "compressed": False}
+        if nodes < len(blocks):
+            self._forget_plans()
+            self._swap_events(EventStore.from_blocks(blocks), "Compress")
+            stats["compressed"] = True
+        return stats
+
+    def expand(self):
+        """Turn a compressed macro back into a flat list of steps."""
+        if self.events.blocks is not None:
+            self._forget_plans()
+            self.events.expand()
+
+    def _forget_plans(self):
+        # Only a hash that was already computed can have plans cached under it
+        h = self.events.cached_hash
+        if h is not None:
+            self.plan_cache.invalidate(h)
+
+    # ---------------- Undo ----------------
+
+    def undo(self):
+        """Revert the last change to the macro; returns its label, or None if there is none."""
+        return self._step_history(self.history.undo)
+
+    def redo(self):
+        """Reapply the last undone change; returns its label, or None."""
+        return self._step_history(self.history.redo)
+
+    def _step_history(self, step):
+        if self.recording or self.is_playing:
+            raise RuntimeError("Stop recording and playback first.")
+        # Plans are cached by content hash, so none need dropping here
+        result = step()
+        if result is None:
+            return None
+        label, events, settings = result
+        self.events = events
+        if settings is not None:
+            self.apply_settings(settings)
+        return label
+
+    # ---------------- Journal ----------------
+
+    def has_journal(self) -> bool:
+        """True if an unsaved recording was left behind (e.g. by a crash)."""
+        return self._journal is None and bool(self.journal_path) and os.path.exists(self.journal_path)
+
+    def recover_journal(self) -> dict:
+        """
+        Make the journaled recording the current macro. The journal is kept
+        until that macro is saved. Returns read_journal()'s info plus "steps".
+        """
+        events, settings, info = read_journal(self.journal_path)
+        info["steps"] = self._replace_macro(events, settings, "Recover recording")
+        return info
+
+    def discard_journal(self):
+        if self._journal is not None:
+            self._journal.close(ended=False)
+            self._journal = None
+        if self.journal_path:
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+
+    # ---------------- Keyboard hook ----------------
+
+    def attach_keyboard(self) -> bool:
+        """Install the global key hook. Returns False if keyboard is unusable."""
+        self.keyboard = load_keyboard()
+        if self.keyboard is None:
+            return False
+        self._capture_thread = threading.Thread(target=self._capture_worker, daemon=True)
+        self._capture_thread.start()
+        self._rebuild_hook_table()  # toggle key names can now map to scan codes
+        self.keyboard.hook(self._on_key_event)
+        return True
+
+    def setup_hotkeys(self, bindings: dict):
+        """Register {hotkey: callback} if hotkeys are enabled (toggle key is separate)."""
+        if self.keyboard is None:
+            return
+        try:
+            self.keyboard.clear_all_hotkeys()
+        except Exception:
+            pass
+
+        if not self.use_hotkeys:
+            return
+        for hotkey, callback in bindings.items():
+            self.keyboard.add_hotkey(hotkey, callback)
+
+    def close(self):
+        self._closing = True
+        self._capture_wakeup.set()
+        if self._journal is not None:
+            # Flushed but not ended: offered for recovery on the next start
+            self._journal.close(ended=False)
+            self._journal = None
+        try:
+            self.stop()
+        except Exception:
+            pass
+        try:
+            if self.keyboard is not None:
+                self.keyboard.unhook_all()
+                self.keyboard.clear_all_hotkeys()
+        except Exception:
+            pass
+
+    # ---------------- Recording ----------------
+
+    def start_recording(self):
+        if self.is_playing:
+            raise RuntimeError("Stop playback before recording.")
+
+        self.discard_journal()
+        self._forget_plans()
+        self._swap_events(EventStore(), "Record")
+        self._hook_latency_count = 0
+        self._hook_latency_sum = 0.0
+        self._hook_latency_max = 0.0
+        self._capture.dropped = 0
+
+        if self.journal_path:
+            self._journal = JournalWriter(
+                self.journal_path, self.settings(), self.journal_flush_ms / 1000.0, self.journal_fsync
+            )
+
+        # Same clock as keyboard's event timestamps (time.time())
+        self._last_time = time.time()
+        self.recording = True
+
+    def stop_recording(self) -> int:
+        self.recording = False
+        self._last_time = None
+        if self._journal is not None:
+            self._journal.close(ended=True)
+            self._journal = None
+        return len(self.events)
+
+    # ---------------- Replay buffer ----------------
+
+    @property
+    def replay(self):
+        """The ReplayBuffer, or None while always-on capture is off."""
+        return self._replay
+
+    def enable_replay(self, capacity: int = REPLAY_CAPACITY, span: float = REPLAY_SPAN_S) -> ReplayBuffer:
+        """
+        Keep the last `capacity` presses (none older than `span` seconds when
+        taken) from now on, recording or not. Memory is fixed by `capacity`.
+        """
+        if self._replay is None or self._replay.capacity != capacity or self._replay.span != span:
+            self._replay = ReplayBuffer(capacity, span)
+            self._rebuild_hook_table()
+        return self._replay
+
+    def disable_replay(self):
+        self._replay = None
+        self._rebuild_hook_table()
+
+    def take_replay(self, seconds: float = None) -> EventStore:
+        """The last `seconds` of presses as a new EventStore; capture goes on meanwhile."""
+        if self._replay is None:
+            raise RuntimeError("The replay buffer is off.")
+        return self._replay.take(seconds)
+
+    def capture_stats_text(self) -> str:
+        n = self._hook_latency_count
+        avg = (self._hook_latency_sum / n) if n else 0.0
+        return "{} dropped, hook latency avg {:.2f} ms / max {:.2f} ms".format(
+            self._capture.dropped, avg * 1000.0, self._hook_latency_max * 1000.0
+        )
+
+    def begin_toggle_capture(self):
+        self.capturing_toggle_key = True
+
+    def _on_key_event(self, e):
+        # Runs on the keyboard hook thread for every key on the system. Events
+        # nothing is waiting for return after one table lookup; the rest are
+        # stamped, enqueued and handled on the capture worker.
+        self._m_hook_events.value += 1
+        if not self._hook_all and e.scan_code not in self._hook_scan_codes and e.name not in self._hook_names:
+            return
+        t0 = time.perf_counter()
+        self._capture.push((e.time, time.time(), e.scan_code, e.name, e.event_type))
+        self._capture_wakeup.set()
+        self._m_hook_callback.record(time.perf_counter() - t0)
+
+    def _capture_worker(self):
+        # Clear before draining so a push during the drain re-arms the wait.
+        while not self._closing:
+            self._capture_wakeup.wait(0.1)
+            self._capture_wakeup.clear()
+            for raw in self._capture.drain():
+                self._handle_key_event(*raw)
+
+    def _handle_key_event(self, t_event, t_hook, scan_code, name, event_type):
+        if t_event is None:
+            t_event = t_hook
+        else:
+            lat = max(0.0, t_hook - t_event)
+            self._hook_latency_count += 1
+            self._hook_latency_sum += lat
+            if lat > self._hook_latency_max:
+                self._hook_latency_max = lat
+            self._m_hook_latency.record(lat)
+
+        # 1) Capture toggle hotkey (scan code) when in capture mode
+        if self.capturing_toggle_key and event_type == "down":
+            if scan_code is not None:
+                key_id = f"scan:{scan_code}"
+            else:
+                key_id = (name or "").lower()
+            if key_id:
+                self.capturing_toggle_key = False
+                self.set_toggle_key(key_id)
+                self._emit(self.on_toggle_captured, key_id)
+            return
+
+        # 2) Manual toggle detection (robust; works even after other keys pressed)
+        if self.use_hotkeys:
+            is_toggle = False
+
+            if self.toggle_scan_code is not None and scan_code == self.toggle_scan_code:
+                is_toggle = True
+            elif self.toggle_scan_code is None and self.toggle_key_name and (name or "").lower() == self.toggle_key_name:
+                is_toggle = True
+
+            if is_toggle:
+                # Fire only on key DOWN, with guard to prevent repeats while held
+                if event_type == "down" and not self._toggle_pressed_guard:
+                    self._toggle_pressed_guard = True
+                    self._emit(self.on_toggle_pressed)
+                elif event_type == "up":
+                    self._toggle_pressed_guard = False
+                return
+
+        # 3) Normal macro recording, and the replay buffer
+        replay = self._replay
+        if event_type != "down" or (not self.recording and replay is None):
+            return
+
+        key = (name or "").lower()
+        if not key or key in self.ignore_keys:
+            return
+        if replay is not None:
+            replay.append(key, t_event)
+        if not self.recording:
+            return
+
+        # Delays come from the hook-time stamps, not from when we got here
+        t = t_event
+        delay_sec = max(0.0, t - (self._last_time if self._last_time is not None else t))
+        self._last_time = t
+
+        self.events.append(key, delay_sec)
+        self._m_steps_recorded.value += 1
+        journal = self._journal
+        if journal is not None:
+            journal.append(key, delay_sec)
+        self._emit(self.on_step_recorded, len(self.events) - 1)
+
+    # ---------------- Playback ----------------
+
+    @property
+    def is_playing(self) -> bool:
+        return self._play_thread is not None and self._play_thread.is_alive()
+
+    def play(self, start: int = 0, stop: int = None, from_time: float = None, *, speed: float = None,
+             repeat: bool = None, repeat_delay_ms: int = None, max_loops: int = None) -> bool:
+        """
+        Start playback on a background thread, of steps [start, stop) or
+        from the first step due at or after `from_time` seconds into the
+        macro (at 1x). Repeating loops the same range. speed, repeat,
+        repeat_delay_ms and max_loops (0: no limit) override the engine's
+        options for this run only. Returns False if a run was already playing.
+        """
+        if self.recording:
+            raise RuntimeError("Stop recording before playback.")
+        if not self.events:
+            raise ValueError("No macro recorded.")
+        if from_time is not None:
+            start = self.step_at(from_time)
+        start, stop = step_range(self.events, start, stop)
+        if start >= stop:
+            raise ValueError("Nothing to play in that range.")
+        if self.is_playing:
+            # A run that is only reporting its results is waited for, so a
+            # play() sent from another thread in reply to on_playback_done
+            # is not lost
+            if not self._play_finishing or self._play_thread is threading.current_thread():
+                return False
+            self._play_thread.join()
+        if self.backend is None or self.backend.name != self.backend_name:
+            self.backend = create_backend(self.backend_name)
+        if isinstance(self.compensate, Compensation):
+            self.compensation = self.compensate
+        else:
+            profile = load_profile(self.backend.name, self.calibration_path) if self.compensate else None
+            self.compensation = Compensation.from_profile(profile) if profile else None
+
+        self._stop_playback.clear()
+        self._paused.clear()
+        self._interrupt.clear()
+        self._play_finishing = False
+        self.last_cancel_latency = None
+        self.last_pause_latency = None
+        self._play_start, self._play_stop = start, stop
+        self._run_options = self._options(speed, repeat, repeat_delay_ms, max_loops)
+        self.play_position, self.play_loop = start, 0
+        self._play_thread = threading.Thread(target=self._play_worker, daemon=True)
+        self._play_thread.start()
+        return True
+
+    def _options(self, speed=None, repeat=None, repeat_delay_ms=None, max_loops=None) -> tuple:
+        # (speed, repeat, repeat delay in seconds, max loops) for one run
+        return (
+            max(0.01, float(self.speed if speed is None else speed)),
+            bool(self.repeat_enabled if repeat is None else repeat),
+            ms_int_to_sec(max(0, int((self.repeat_delay_ms if repeat_delay_ms is None else repeat_delay_ms) or 0))),
+            self.max_loops if max_loops is None else (int(max_loops) or None),
+        )
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for playback to end. Returns False on timeout."""
+        end = None if timeout is None else time.perf_counter() + timeout
+        while self.is_playing:
+            if end is not None and time.perf_counter() >= end:
+                return False
+            # Short joins keep Ctrl+C responsive on every platform
+            self._play_thread.join(0.2)
+        return True
+
+    def stop(self):
+        self._stop_requested_at = time.perf_counter()
+        self._stop_playback.set()
+        self._interrupt.set()
+
+    @property
+    def is_paused(self) -> bool:
+        return self._paused.is_set() and self.is_playing
+
+    def pause(self):
+        """Hold playback where it is; resume() continues the remaining timeline."""
+        if not self.is_playing or self._paused.is_set():
+            return
+        self._pause_requested_at = time.perf_counter()
+        self._paused.set()
+        self._interrupt.set()
+
+    def resume(self):
+        if not self._paused.is_set():
+            return
+        self._paused.clear()
+        self._interrupt.set()
+
+    def _hold_paused(self) -> float:
+        # Block while paused; returns how long (on the playback clock) we held.
+        t0 = self.clock.now()
+        self.last_pause_latency = time.perf_counter() - self._pause_requested_at
+        self._emit(self.on_status, "Paused.")
+        while self._paused.is_set() and not self._stop_playback.is_set():
+            self._interrupt.wait()
+            self._interrupt.clear()
+        held = self.clock.now() - t0
+        if not self._stop_playback.is_set():
+            self._emit(self.on_status, "Playing...")
+        return held
+
+    # ---------------- Seeking and progress ----------------
+
+    def step_at(self, seconds: float) -> int:
+        """First step due at or after `seconds` into the macro (at 1x); O(log n)."""
+        return self.events.time_index().step_at(float(seconds))
+
+    def progress(self, step: int = None) -> dict:
+        """
+        Position of the current (or last) playback, or of `step` in its
+        range: step, start, stop, fraction of the range, elapsed and
+        remaining seconds of this loop at the current speed, and eta (to
+        the end of the last loop; None when repeating without a limit).
+        """
+        index = self.events.time_index()
+        start, stop = step_range(self.events, self._play_start, self._play_stop)
+        step = max(start, min(stop, self.play_position if step is None else int(step)))
+        speed, repeat, repeat_delay_s, max_loops = self._run_options or self._options()
+        origin = index.elapsed(start)
+        loop_s = (index.elapsed(stop) - origin) / speed
+        elapsed = (index.elapsed(step) - origin) / speed
+        eta = loop_s - elapsed
+        if repeat:
+            if max_loops:
+                loops_left = max(0, max_loops - self.play_loop - 1)
+                eta += loops_left * (loop_s + repeat_delay_s)
+            else:
+                eta = None
+        return {
+            "step": step,
+            "start": start,
+            "stop": stop,
+            "loop": self.play_loop,
+            "fraction": (step - start) / (stop - start) if stop > start else 1.0,
+            "elapsed": elapsed,
+            "remaining": loop_s - elapsed,
+            "eta": eta,
+        }
+
+    # ---------------- Dry run ----------------
+
+    def dry_run(self, loops: int = None, on_played=None, start: int = 0, stop: int = None) -> dict:
+        """
+        Run the playback worker on this thread with the current options,
+        against a VirtualClock and the fake backend: nothing is typed and no
+        real time passes, so a multi-hour macro is simulated in milliseconds
+        and the timeline is exactly what a real run aims for. `loops` plays
+        that many loops (repeating macros need it unless max_loops is set);
+        start/stop limit it to a range of steps as in play().
+
+        Returns steps, loops, emits, keys, duration (seconds), histogram
+        ({key: presses}), timeline ([(seconds from start, keys)] per emit)
+        and errors.
+        """
+        if not self.events:
+            raise ValueError("No macro recorded.")
+        sim = MacroEngine()
+        sim.events = self.events
+        sim.plan_cache = self.plan_cache
+        sim.speed = self.speed
+        sim.batch_window_ms = self.batch_window_ms
+        sim.repeat_enabled = self.repeat_enabled
+        sim.repeat_delay_ms = self.repeat_delay_ms
+        sim.max_loops = self.max_loops
+        if loops:
+            sim.repeat_enabled = True
+            sim.max_loops = int(loops)
+        if sim.repeat_enabled and not sim.max_loops:
+            raise ValueError("A repeating macro needs a loop count for a dry run.")
+        sim.clock = VirtualClock()
+        sim.backend = RecordingBackend(clock=sim.clock.now)
+        sim.backend_name = sim.backend.name
+        sim.on_played = on_played
+        sim._play_start, sim._play_stop = step_range(self.events, start, stop)
+        if sim._play_start >= sim._play_stop:
+            raise ValueError("Nothing to play in that range.")
+        sim._run_options = sim._options()
+        sim._play_worker()
+
+        timeline = sim.backend.emissions
+        histogram = Counter(code for _t, codes in timeline for code in codes)
+        return {
+            "steps": sim._play_stop - sim._play_start,
+            "loops": sim.last_loops,
+            "emits": len(timeline),
+            "keys": sim.last_injection["keys"],
+            "duration": timeline[-1][0] if timeline else 0.0,
+            "histogram": dict(histogram.most_common()),
+            "timeline": timeline,
+            "errors": sim.last_injection["errors"],
+        }
+
+    def _play_worker(self):
+        speed, repeat, repeat_delay_s, max_loops = self._run_options
+        spin_window = max(0.0, float(self.spin_window_ms)) / 1000.0
+        batch_window = max(0.0, float(self.batch_window_ms)) / 1000.0
+        backend = self.backend
+        clock = self.clock
+        comp = self.compensation
+        lead_fixed, lead_per_key = (comp.fixed, comp.per_key) if comp is not None else (0.0, 0.0)
+        if comp is not None:
+            spin_window = max(spin_window, comp.spin_window)
+        stop = self._stop_playback
+        paused = self._paused
+        interrupt = self._interrupt
+
+        # Compiled once per (macro, speed, backend, ...) and reused across runs
+        first, end = self._play_start, self._play_stop
+        plan = self.plan_cache.get(self.events, backend, speed, batch_window, repeat_delay_s, first, end)
+        press, emit = backend.press, backend.emit
+        on_played = self.on_played
+
+        errors = list(plan.errors)
+        lateness = LatenessStats()  # fixed size, however long a repeat runs
+        emits = 0
+        keys_sent = 0
+        inject_time = 0.0
+        m_lateness, m_injection, m_keys = self._m_lateness, self._m_injection, self._m_keys_injected
+
+        # Every batch has an absolute deadline on the recorded timeline, so the
+        # cost of each press and any oversleep is absorbed instead of summed.
+        # A pause shifts the base by its length, keeping the remaining timeline.
+        # With compensation each batch is sent its injection time early, so
+        # it lands on the deadline.
+        base = self.play_origin = clock.now()
+        loops = 0
+        pos = first  # step index of the next batch
+
+        def wait_for(offset):
+            nonlocal base
+            while not clock.wait_until(base + offset, spin_window, interrupt):
+                interrupt.clear()
+                if not stop.is_set() and paused.is_set():
+                    base += self._hold_paused()
+                if stop.is_set():
+                    self.last_cancel_latency = time.perf_counter() - self._stop_requested_at
+                    return False
+            return True
+
+        while True:
+            # A compressed macro's plan yields its batches lazily from the blocks
+            for at, batch in plan.batches():
+                if comp is not None:
+                    at -= lead_fixed + lead_per_key * len(batch)
+                if not wait_for(at):
+                    break
+                late = clock.now() - (base + at)
+                t = time.perf_counter()
+                try:
+                    if len(batch) == 1:
+                        press(batch[0])
+                    else:
+                        emit(batch)
+                except Exception as ex:
+                    if len(errors) < 100:
+                        errors.append(str(ex))
+                took = time.perf_counter() - t
+                # Bookkeeping after the send, so it never delays it
+                lateness.record(late)
+                inject_time += took
+                emits += 1
+                keys_sent += len(batch)
+                m_lateness.record(late)
+                m_injection.record(took)
+                m_keys.value += len(batch)
+                if on_played is not None:
+                    on_played(pos, len(batch), loops)
+                pos += len(batch)
+                self.play_position = pos
+
+            if stop.is_set():
+                break
+            loops += 1
+            self._m_loops.value += 1
+            if not repeat or (max_loops is not None and loops >= max_loops):
+                break
+            self.play_loop = loops
+            pos = self.play_position = first
+
+            if plan.repeat_delay > 0 and not wait_for(plan.loop_period):
+                break
+            base += plan.loop_period
+
+        self._play_finishing = True
+        stats = lateness.stats()
+        self.last_lateness = stats
+        self.last_loops = loops
+        self.last_injection = {
+            "backend": backend.name,
+            "emits": emits,
+            "keys": keys_sent,
+            "seconds": inject_time,
+            "keys_per_s": (keys_sent / inject_time) if inject_time > 0 else 0.0,
+            "errors": errors,
+        }
+        done = "Playback finished" if not stop.is_set() else "Playback stopped"
+        msg = f"{done} — {keys_sent} keys in {emits} emits, {loops} loop(s), {format_lateness(stats)}."
+        if comp is not None:
+            msg += f" Sent {comp.lead(1) * 1000.0:.3f} ms early per key (calibrated)."
+        if self.last_cancel_latency is not None:
+            msg += f" Cancel latency {self.last_cancel_latency * 1000.0:.3f} ms."
+        if errors:
+            msg += f" {len(errors)} injection error(s), first: {errors[0]}"
+        self._emit(self.on_status, msg)
+        self._emit(self.on_playback_done, loops, keys_sent, stop.is_set())
@@ -0,0 +1,658 @@
+"""
+Macro file formats.
+
+  JSON v2  - {"version": 2, "events": [{"key", "delay"}, ...], settings...}
+  JSON v3  - compressed macros: {"version": 3, "keys": [...], "blocks": [...]}
+             where a block item is a step [key id, delay] or
+             {"repeat": count, "body": [items...]}
+  Binary   - little-endian header, toggle key, key table, then fixed-width
+             float64 delay and uint16 key-id columns (8-byte aligned), which
+             are memory-mapped on load instead of parsed.
+  Binary v2 (blocks flag) - same header and key table, then the repeat
+             blocks as a program: "S" u16 key id, f64 delay; "R" u32 count
+             opens a block body; "E" closes it. The header's step count is
+             the expanded count.
+
+Compressed macros are written in the compressed formats and read back as
+compressed stores. A block used in several places is written each time.
+
+Reads and writes take optional `progress(done, total)` and `cancel` (a
+threading.Event) arguments, so they can run on a worker thread (FileTask)
+behind a progress bar: JSON is streamed a chunk at a time and raises
+Cancelled between chunks; a cancelled or failed save leaves the target file
+as it was.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from .blocks import BlockMacro, Repeat
+from .store import EventStore
+
+BINARY_MAGIC = b"MREC"
+BINARY_VERSION = 1
+BINARY_BLOCKS_VERSION = 2
+BINARY_EXT = ".mrec"
+MACRO_FILETYPES = [
+    ("Macro files", "*.json *" + BINARY_EXT),
+    ("JSON files", "*.json"),
+    ("Binary macro files", "*" + BINARY_EXT),
+]
+
+# magic, version, flags, step count, key count, repeat delay ms, toggle key length, reserved
+_BIN_HEADER = struct.Struct("<4sHHQIIHH")
+_BIN_FLAG_REPEAT = 0x1
+_BIN_FLAG_BLOCKS = 0x2
+_BIN_STEP = struct.Struct("<cHd")
+_BIN_REPEAT = struct.Struct("<cI")
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+IO_CHUNK = 1 << 18          # bytes read or written between progress/cancel checks
+_JSON_WRITE_STEPS = 4096    # steps formatted per JSON write
+
+
+class Cancelled(Exception):
+    """A read or write was cancelled through its `cancel` event."""
+
+
+def _check(cancel):
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Cancelled")
+
+
+class FileTask:
+    """
+    Runs fn(progress, cancel) on a daemon thread. Other threads poll
+    `fraction` and `done`, and read `result` or `error` once done; nothing
+    is shared with the caller until then.
+    """
+
+    def __init__(self, fn, name: str = "macro-file-io"):
+        self.cancel_event = threading.Event()
+        self.done_units = 0
+        self.total_units = 0
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._fn = fn
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _progress(self, done, total):
+        self.done_units, self.total_units = done, total
+
+    def _run(self):
+        try:
+            self.result = self._fn(self._progress, self.cancel_event)
+        except BaseException as ex:
+            self.error = ex
+        finally:
+            self._done.set()
+
+    @property
+    def fraction(self) -> float:
+        total = self.total_units
+        return min(1.0, self.done_units / total) if total else 0.0
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return isinstance(self.error, Cancelled)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+def default_settings() -> dict:
+    return {"repeat_enabled": False, "repeat_delay_ms": 250, "play_toggle_key": "f8"}
+
+
+def _clean_settings(data: dict) -> dict:
+    settings = default_settings()
+    settings["repeat_enabled"] = bool(data.get("repeat_enabled", False))
+    try:
+        settings["repeat_delay_ms"] = max(0, int(data.get("repeat_delay_ms", 250)))
+    except Exception:
+        pass
+    tkey = str(data.get("play_toggle_key", "f8")).strip().lower()
+    if tkey:
+        settings["play_toggle_key"] = tkey
+    return settings
+
+
+def is_binary_macro(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_macro(path: str, progress=None, cancel=None):
+    """Load a macro file in either format. Returns (EventStore, settings)."""
+    if is_binary_macro(path):
+        return read_macro_binary(path, progress, cancel)
+    return read_macro_json(path, progress, cancel)
+
+
+def write_macro(path: str, events: EventStore, settings: dict, progress=None, cancel=None):
+    """Save in the format implied by the file extension (.mrec = binary)."""
+    if path.lower().endswith(BINARY_EXT):
+        write_macro_binary(path, events, settings, progress, cancel)
+    else:
+        write_macro_json(path, events, settings, progress, cancel)
+
+
+def _append_event(store: EventStore, ev):
+    if not isinstance(ev, dict):
+        return
+    k = str(ev.get("key", "")).lower()
+    d = float(ev.get("delay", 0.0))
+    if k:
+        store.append(k, max(0.0, d))
+
+
+def read_macro_json(path: str, progress=None, cancel=None):
+    """
+    Parse a JSON macro a chunk at a time: the "events" array is decoded one
+    step at a time straight into the store, so the whole document is never
+    held as Python objects.
+    """
+    with open(path, "rb") as f:
+        reader = _JsonReader(f, os.fstat(f.fileno()).st_size, progress, cancel)
+        data = {}
+        cleaned = None
+        reader.expect("{")
+        if reader.peek() == "}":
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.value()
+                if not isinstance(key, str):
+                    raise ValueError("Invalid file format")
+                reader.expect(":")
+                if key == "events" and reader.peek() == "[":
+                    cleaned = EventStore()
+                    for ev in reader.array_items():
+                        _append_event(cleaned, ev)
+                    data[key] = []
+                else:
+                    data[key] = reader.value()
+                sep = reader.peek()
+                reader.pos += 1
+                if sep == "}":
+                    break
+                if sep != ",":
+                    raise ValueError("Invalid file format")
+
+    if data.get("blocks") is not None:
+        return _read_blocks_json(data), _clean_settings(data)
+
+    if cleaned is None:
+        events = data.get("events", [])
+        if not isinstance(events, list):
+            raise ValueError("Invalid file format")
+        cleaned = EventStore()
+    return cleaned, _clean_settings(data)
+
+
+class _JsonReader:
+    """Pulls JSON values off a binary file, reading IO_CHUNK bytes at a time."""
+
+    def __init__(self, f, total: int, progress, cancel):
+        import codecs
+        import json  # deferred: json pulls in re, which dominates cold start
+        import re
+
+        self._f = f
+        self._total = total
+        self._progress = progress
+        self._cancel = cancel
+        self._decode = json.JSONDecoder().raw_decode
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._skip = re.compile(r"[ \t\n\r]*").match
+        self._read = 0
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._no_batch_before = 0
+
+    def _fill(self, want: int = IO_CHUNK):
+        _check(self._cancel)
+        data = self._f.read(max(want, IO_CHUNK))
+        self._read += len(data)
+        self.eof = not data
+        text = self._utf8.decode(data, final=self.eof)
+        self._no_batch_before = max(0, self._no_batch_before - self.pos)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        if self._progress is not None:
+            self._progress(self._read, self._total)
+
+    def peek(self) -> str:
+        """Next non-blank character ("" at the end of the file), not consumed."""
+        while True:
+            self.pos = self._skip(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise ValueError("Invalid file format")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decode(self.buf, self.pos)
+                # A number running into the end of the buffer may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except ValueError:
+                if self.eof:
+                    raise ValueError("Invalid file format") from None
+            # Read at least as much again, so a large value is not re-decoded
+            # once per chunk
+            self._fill(len(self.buf) - self.pos)
+
+    def _batch(self):
+        """
+        Every whole item up to the buffer's last "}," decoded in one call, or
+        None. A cut inside a string leaves it unterminated and fails to decode,
+        and then items are taken one at a time up to that point.
+        """
+        buf, pos = self.buf, self.pos
+        cut = buf.rfind("},", max(pos, self._no_batch_before))
+        if cut < 0:
+            return None
+        try:
+            items, end = self._decode("[" + buf[pos:cut + 1] + "]")
+        except ValueError:
+            end = -1
+        if end != cut + 3 - pos:
+            self._no_batch_before = cut + 1
+            return None
+        self.pos = cut + 2
+        return items
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            batch = self._batch()
+            if batch:
+                yield from batch
+                self.peek()
+                continue
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError("Invalid file format")
+
+
+def _read_blocks_json(data: dict) -> EventStore:
+    keys = data.get("keys")
+    if not isinstance(keys, list) or not isinstance(data["blocks"], list):
+        raise ValueError("Invalid file format")
+    keys = [str(k).lower() for k in keys]
+    shared = {}
+
+    def items(seq):
+        out = []
+        for item in seq:
+            if isinstance(item, dict):
+                count = int(item.get("repeat", 0))
+                body = items(item.get("body", []))
+                if count < 1 or not body:
+                    raise ValueError("Invalid repeat block")
+                block = Repeat(body, count)
+                out.append(shared.setdefault(block, block))
+            else:
+                kid, delay = int(item[0]), max(0.0, float(item[1]))
+                if not 0 <= kid < len(keys):
+                    raise ValueError("Block step refers to an unknown key")
+                out.append((kid, delay))
+        return tuple(out)
+
+    return EventStore.from_blocks(BlockMacro(keys, items(data["blocks"])))
+
+
+def _blocks_json(items) -> list:
+    return [
+        [item[0], item[1]] if type(item) is tuple
+        else {"repeat": item.count, "body": _blocks_json(item.body)}
+        for item in items
+    ]
+
+
+def write_macro_json(path: str, events: EventStore, settings: dict, progress=None, cancel=None):
+    """
+    Write a JSON macro beside the target and swap it in. JSON v2 is
+    formatted a chunk of steps at a time (the same text json.dump(indent=2)
+    produces); v3 is small by construction and dumped whole.
+    """
+    import json
+
+    tail = {
+        "repeat_enabled": bool(settings.get("repeat_enabled", False)),
+        "repeat_delay_ms": int(settings.get("repeat_delay_ms", 250)),
+        "play_toggle_key": str(settings.get("play_toggle_key", "")).strip().lower() or "f8",
+    }
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            if events.blocks is not None:
+                json.dump({"version": 3, "keys": list(events.keys),
+                           "blocks": _blocks_json(events.blocks.items), **tail}, f, indent=2)
+            else:
+                _write_events_json(f, events, tail, progress, cancel)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+    if progress is not None:
+        progress(len(events), len(events))
+
+
+def _write_events_json(f, events: EventStore, tail: dict, progress, cancel):
+    import json
+
+    n = len(events)
+    keys = [json.dumps(k) for k in events.keys]
+    delays = events.delays_view()
+    key_ids = events.key_ids_view()
+    f.write('{\n  "version": 2,\n  "events": [' if n else '{\n  "version": 2,\n  "events": [],\n')
+    for start in range(0, n, _JSON_WRITE_STEPS):
+        _check(cancel)
+        stop = min(n, start + _JSON_WRITE_STEPS)
+        f.write(",\n" if start else "\n")
+        # float repr is what json writes; inf/nan need its spelling
+        f.write(",\n".join([
+            f'    {{\n      "key": {keys[kid]},\n      "delay": {repr(d) if d - d == 0.0 else json.dumps(d)}\n    }}'
+            for kid, d in zip(key_ids[start:stop], delays[start:stop])
+        ]))
+        if progress is not None:
+            progress(stop, n)
+    if n:
+        f.write("\n  ],\n")
+    f.write(json.dumps(tail, indent=2)[2:])
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+
+def _write_chunked(f, data, progress, cancel, done: int, total: int) -> int:
+    """Write a buffer IO_CHUNK bytes at a time; returns the new byte count."""
+    view = memoryview(data).cast("B")
+    for start in range(0, len(view), IO_CHUNK):
+        _check(cancel)
+        chunk = view[start:start + IO_CHUNK]
+        f.write(chunk)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    return done
+
+
+def write_macro_binary(path: str, events: EventStore, settings: dict, progress=None, cancel=None):
+    settings = _clean_settings(settings)
+    toggle = settings["play_toggle_key"].encode("utf-8")
+    keys = [k.encode("utf-8") for k in events.keys]
+    flags = _BIN_FLAG_REPEAT if settings["repeat_enabled"] else 0
+    blocks = events.blocks
+    if blocks is not None:
+        flags |= _BIN_FLAG_BLOCKS
+
+    header = _BIN_HEADER.pack(
+        BINARY_MAGIC, BINARY_VERSION if blocks is None else BINARY_BLOCKS_VERSION, flags,
+        len(events), len(keys), settings["repeat_delay_ms"], len(toggle), 0,
+    )
+    meta = bytearray(header)
+    meta += toggle
+    for k in keys:
+        meta += struct.pack("<H", len(k)) + k
+    meta += b"\0" * _pad8(len(meta))
+
+    if blocks is not None:
+        program = bytearray()
+        _encode_blocks(blocks.items, program)
+        _check(cancel)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(meta)
+                f.write(program)
+            os.replace(tmp, path)
+        except BaseException:
+            _remove_quietly(tmp)
+            raise
+        if progress is not None:
+            progress(len(program), len(program))
+        return
+
+    delays = events.delays_view()
+    key_ids = events.key_ids_view()
+    if not _LITTLE_ENDIAN:
+        delays = array("d", delays)
+        delays.byteswap()
+        key_ids = array("H", key_ids)
+        key_ids.byteswap()
+
+    # Write beside the target and swap in, so a mapped source stays valid
+    # until the new file is complete.
+    tmp = path + ".tmp"
+    total = len(events) * 10
+    try:
+        with open(tmp, "wb") as f:
+            f.write(meta)
+            done = _write_chunked(f, delays, progress, cancel, 0, total)
+            f.write(b"\0" * _pad8(len(events) * 8))
+            _write_chunked(f, key_ids, progress, cancel, done, total)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+    finally:
+        del delays, key_ids
+    try:
+        os.replace(tmp, path)
+    except PermissionError:
+        # Windows refuses to replace a file that is still mapped.
+        events.release()
+        os.replace(tmp, path)
+
+
+def _encode_blocks(items, out: bytearray):
+    for item in items:
+        if type(item) is tuple:
+            out += _BIN_STEP.pack(b"S", item[0], item[1])
+        else:
+            out += _BIN_REPEAT.pack(b"R", item.count)
+            _encode_blocks(item.body, out)
+            out += b"E"
+
+
+def _decode_blocks(data, off: int, nkeys: int) -> tuple:
+    shared = {}
+    stack = [(None, [])]  # (repeat count, items so far) per open block
+    end = len(data)
+    while off < end:
+        tag = data[off:off + 1]
+        if tag == b"S":
+            _t, kid, delay = _BIN_STEP.unpack_from(data, off)
+            if kid >= nkeys:
+                raise ValueError("Block step refers to an unknown key")
+            stack[-1][1].append((kid, max(0.0, delay)))  # as in JSON; NaN becomes 0
+            off += _BIN_STEP.size
+        elif tag == b"R":
+            _t, count = _BIN_REPEAT.unpack_from(data, off)
+            stack.append((count, []))
+            off += _BIN_REPEAT.size
+        elif tag == b"E":
+            count, body = stack.pop()
+            if count is None or count < 1 or not body:
+                raise ValueError("Corrupt macro file: bad repeat block")
+            block = Repeat(tuple(body), count)
+            stack[-1][1].append(shared.setdefault(block, block))
+            off += 1
+        else:
+            raise ValueError(f"Corrupt macro file: unknown block record {tag!r}")
+    if len(stack) != 1:
+        raise ValueError("Truncated macro file")
+    return tuple(stack[0][1])
+
+
+def _max_key_id(key_ids) -> int:
+    from .retime import load_numpy
+
+    np = load_numpy()
+    if np is None:
+        return max(key_ids)
+    return int(np.frombuffer(key_ids, dtype=np.uint16).max())
+
+
+def _clean_delays(delays):
+    """`delays`, or a copy with negative and NaN delays set to 0 as the JSON reader does."""
+    from .retime import load_numpy
+
+    np = load_numpy()
+    if np is not None:
+        a = np.frombuffer(delays, dtype=np.float64)
+        if a.min() >= 0.0:  # False for NaN too
+            return delays
+        out = array("d", bytes(8 * len(a)))
+        np.fmax(a, 0.0, out=np.frombuffer(out, dtype=np.float64))
+        return out
+    if all(d >= 0.0 for d in delays):
+        return delays
+    return array("d", (d if d >= 0.0 else 0.0 for d in delays))
+
+
+def _release(*views):
+    for v in views:
+        if isinstance(v, memoryview):
+            v.release()
+
+
+def read_macro_binary(path: str, progress=None, cancel=None):
+    """
+    Map a binary macro; the returned store reads its columns from the file.
+    Only the key table (or the block program) is parsed, but loading is
+    still O(steps): the key ids and delays are scanned once (by NumPy when
+    it is installed) for keys out of range and for negative or NaN delays,
+    which are set to 0 as in JSON (in a copy of the delay column). Progress
+    is only reported once it is done.
+    """
+    _check(cancel)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _BIN_HEADER.size:
+            raise ValueError("Truncated macro file")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read_mapped(mm, size, progress)
+    except BaseException:
+        mm.close()
+        raise
+
+
+def _read_mapped(mm, size: int, progress):
+    # Errors close `mm` in the caller, so views of it are released before raising
+    magic, version, flags, count, nkeys, repeat_ms, toggle_len, _ = _BIN_HEADER.unpack_from(mm, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary macro file")
+    if version not in (BINARY_VERSION, BINARY_BLOCKS_VERSION):
+        raise ValueError(f"Unsupported binary macro version {version}")
+
+    off = _BIN_HEADER.size
+    toggle = bytes(mm[off:off + toggle_len]).decode("utf-8")
+    off += toggle_len
+    keys = []
+    for _ in range(nkeys):
+        if off + 2 > size:
+            raise ValueError("Truncated macro file")
+        (klen,) = struct.unpack_from("<H", mm, off)
+        off += 2
+        keys.append(bytes(mm[off:off + klen]).decode("utf-8"))
+        off += klen
+    if off > size:
+        raise ValueError("Truncated macro file")
+    off += _pad8(off)
+
+    settings = _clean_settings({
+        "repeat_enabled": bool(flags & _BIN_FLAG_REPEAT),
+        "repeat_delay_ms": repeat_ms,
+        "play_toggle_key": toggle,
+    })
+
+    if flags & _BIN_FLAG_BLOCKS:
+        # Small by construction: parse it and let the mapping go
+        try:
+            blocks = BlockMacro(keys, _decode_blocks(mm, off, nkeys))
+        finally:
+            mm.close()
+        if len(blocks) != count:
+            raise ValueError("Corrupt macro file: step count mismatch")
+        if progress is not None:
+            progress(size, size)
+        return EventStore.from_blocks(blocks), settings
+
+    delays_end = off + count * 8
+    ids_off = delays_end + _pad8(delays_end)
+    if ids_off + count * 2 > size:
+        raise ValueError("Truncated macro file")
+
+    view = memoryview(mm)
+    delays = view[off:delays_end].cast("d")
+    key_ids = view[ids_off:ids_off + count * 2].cast("H")
+    try:
+        if not _LITTLE_ENDIAN:
+            delays, key_ids = array("d", delays), array("H", key_ids)
+            delays.byteswap()
+            key_ids.byteswap()
+        if count:
+            if _max_key_id(key_ids) >= nkeys:
+                raise ValueError("Corrupt macro file: step refers to an unknown key")
+            delays = _clean_delays(delays)
+    except BaseException:
+        _release(delays, key_ids, view)
+        raise
+    if not _LITTLE_ENDIAN:
+        _release(view)
+        mm.close()
+        mm = None
+
+    if progress is not None:
+        progress(size, size)
+    return EventStore.from_columns(keys, delays, key_ids, mm), settings
+
+
+def convert_macro(src: str, dst: str):
+    """Convert between JSON and binary macros; the target format follows dst's extension."""
+    events, settings = read_macro(src)
+    write_macro(dst, events, settings)
+    return len(events)
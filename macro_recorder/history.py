@@ -0,0 +1,178 @@
+"""
+Undo and redo for macro edits.
+
+Changes that replace the whole macro (load, clear, record, compress) swap
+one EventStore for another, so their undo step just keeps the old store.
+Edits in place (delay edits, retime) are tracked in chunks of CHUNK_STEPS
+steps: just before a chunk is first written, the store hands its contents
+to the open step, and undo writes them back. A step holds, and undo/redo
+copy, only the chunks its edit touched, however long the macro or the
+history is. The chunks as they were after an edit are only taken when it
+is undone.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+
+CHUNK_STEPS = 4096       # steps per chunk (40 KB)
+UNDO_LIMIT = 100         # undo steps kept
+UNDO_BYTES = 256 << 20   # and no more memory than this held by them
+
+
+def _chunks_nbytes(chunks: dict) -> int:
+    return sum(len(ids) * 2 + len(delays) * 8 for ids, delays in chunks.values())
+
+
+class _ChunkEdit:
+    """In-place edits of one store: the chunks they touched, before and after."""
+
+    __slots__ = ("label", "store", "before", "before_state", "after", "after_state")
+
+    def __init__(self, label: str, store):
+        self.label = label
+        self.store = store
+        self.before = {}   # chunk -> (key ids, delays) before the edit
+        self.before_state = (len(store), store.keys, store.cached_hash)
+        self.after = None  # the same chunks after it, once undone
+        self.after_state = None
+
+    @property
+    def nbytes(self) -> int:
+        return _chunks_nbytes(self.before) + (_chunks_nbytes(self.after) if self.after else 0)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.before) or len(self.store) != self.before_state[0]
+
+    def touch(self, start: int, stop: int):
+        before = self.before
+        for c in range(start // CHUNK_STEPS, (stop - 1) // CHUNK_STEPS + 1):
+            if c not in before:
+                before[c] = self.store.read_columns(c * CHUNK_STEPS, (c + 1) * CHUNK_STEPS)
+
+    def undo(self) -> tuple:
+        store = self.store
+        if self.after is None:
+            self.after = {c: store.read_columns(c * CHUNK_STEPS, (c + 1) * CHUNK_STEPS) for c in self.before}
+            self.after_state = (len(store), store.keys, store.cached_hash)
+        store.write_chunks(self.before, CHUNK_STEPS, *self.before_state)
+        return store, None
+
+    def redo(self) -> tuple:
+        self.store.write_chunks(self.after, CHUNK_STEPS, *self.after_state)
+        return self.store, None
+
+
+class _Swap:
+    """One store replaced by another, with the settings that came with each."""
+
+    __slots__ = ("label", "old", "new", "old_settings", "new_settings")
+
+    def __init__(self, label: str, old, new, old_settings=None, new_settings=None):
+        self.label = label
+        self.old = old
+        self.new = new
+        self.old_settings = old_settings
+        self.new_settings = new_settings
+
+    @property
+    def nbytes(self) -> int:
+        return self.old.nbytes
+
+    def undo(self) -> tuple:
+        return self.old, self.old_settings
+
+    def redo(self) -> tuple:
+        return self.new, self.new_settings
+
+
+class EditHistory:
+    """
+    Undo and redo stacks for a MacroEngine's macro. undo() and redo()
+    return (label, store, settings or None); the caller makes that store
+    current. A new step clears the redo stack.
+    """
+
+    def __init__(self, limit: int = UNDO_LIMIT, max_bytes: int = UNDO_BYTES):
+        self.limit = max(1, int(limit))
+        self.max_bytes = max_bytes
+        self._undo = deque()
+        self._redo = []
+        self._bytes = 0  # held by the undo stack
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    @property
+    def undo_label(self):
+        """Label of the step undo() would revert, or None."""
+        return self._undo[-1].label if self._undo else None
+
+    @property
+    def redo_label(self):
+        return self._redo[-1].label if self._redo else None
+
+    @contextmanager
+    def edit(self, store, label: str):
+        """
+        Record the in-place edits made to `store` inside the block as one
+        step. If the block raises, its edits are reverted and no step is kept.
+        """
+        step = _ChunkEdit(label, store)
+        store.track_edits(step)
+        try:
+            yield step
+        except BaseException:
+            store.track_edits(None)
+            if step.changed:
+                step.undo()
+            raise
+        store.track_edits(None)
+        if step.changed:
+            self._push(step)
+
+    def swap(self, old, new, label: str, old_settings=None, new_settings=None):
+        """Record that store `new` replaced `old`."""
+        if old is new:
+            return
+        self._push(_Swap(label, old, new, old_settings, new_settings))
+
+    def _push(self, step):
+        self._redo.clear()
+        self._undo.append(step)
+        self._bytes += step.nbytes
+        # Always keep the newest step, however large
+        while len(self._undo) > self.limit or (self._bytes > self.max_bytes and len(self._undo) > 1):
+            self._bytes -= self._undo.popleft().nbytes
+
+    def undo(self):
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        self._bytes -= step.nbytes
+        store, settings = step.undo()
+        self._redo.append(step)
+        return step.label, store, settings
+
+    def redo(self):
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        store, settings = step.redo()
+        self._undo.append(step)
+        self._bytes += step.nbytes
+        return step.label, store, settings
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "undo": len(self._undo),
+            "redo": len(self._redo),
+            "undo_label": self.undo_label,
+            "redo_label": self.redo_label,
+            "bytes": self._bytes + sum(step.nbytes for step in self._redo),
+        }
@@ -0,0 +1,208 @@
+"""
+Write-ahead journal of a recording in progress.
+
+While recording, every step is handed to a JournalWriter, which only queues
+it; a background thread encodes queued steps into one checksummed frame per
+flush interval, writes it and fsyncs. A crash loses at most the last
+interval, and a torn final frame is detected and ignored on recovery.
+
+The journal stays on disk until its macro is saved or replaced, so a
+leftover journal at startup means unsaved work that read_journal() can
+bring back.
+
+File layout (little-endian):
+
+    header  "MRJL", u16 version, u16 reserved, f64 created (unix time)
+    frame   u32 payload length, u32 crc32(payload), payload
+    payload records, each one tag byte:
+      M  u32 length, settings as JSON
+      K  u16 key id, u16 length, key name (ids count up from 0)
+      S  u16 key id, f64 delay seconds
+      E  recording ended normally
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+
+from .fileio import _clean_settings
+from .store import EventStore
+
+JOURNAL_MAGIC = b"MRJL"
+JOURNAL_VERSION = 1
+JOURNAL_FILENAME = "recording.mrj"
+STATE_DIR_ENV = "MACRO_RECORDER_STATE"
+DEFAULT_FLUSH_MS = 250
+
+_HEADER = struct.Struct("<4sHHd")
+_FRAME = struct.Struct("<II")
+_META = struct.Struct("<cI")
+_KEY = struct.Struct("<cHH")
+_STEP = struct.Struct("<cHd")
+_END = b"E"
+
+
+def default_journal_path() -> str:
+    """Journal location: $MACRO_RECORDER_STATE or ~/.macro_recorder."""
+    state = os.environ.get(STATE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".macro_recorder")
+    return os.path.join(state, JOURNAL_FILENAME)
+
+
+class JournalWriter:
+    """
+    Appends recorded steps to a journal file from a background thread.
+
+    append() is the only call on the recording path; it queues the step and
+    returns. Steps are written and fsynced every `flush_interval` seconds.
+    """
+
+    def __init__(self, path: str, settings: dict, flush_interval: float = DEFAULT_FLUSH_MS / 1000.0,
+                 fsync: bool = True):
+        self.path = path
+        self.flush_interval = max(0.001, float(flush_interval))
+        self.fsync = fsync
+        self.frames = 0
+        self.steps = 0
+        self.error = None  # first write error; recording itself carries on
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "wb")
+        self._f.write(_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, 0, time.time()))
+        self._key_ids = {}
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._ended = False
+
+        import json  # deferred: see fileio.read_macro_json
+
+        meta = json.dumps(settings).encode("utf-8")
+        self._write_frame(_META.pack(b"M", len(meta)) + meta)
+
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, key: str, delay: float):
+        self._pending.append((key, delay))
+
+    def _encode(self, n: int) -> bytes:
+        key_ids = self._key_ids
+        pop = self._pending.popleft
+        out = []
+        for _ in range(n):
+            key, delay = pop()
+            kid = key_ids.get(key)
+            if kid is None:
+                kid = key_ids[key] = len(key_ids)
+                name = key.encode("utf-8")
+                out.append(_KEY.pack(b"K", kid, len(name)) + name)
+            out.append(_STEP.pack(b"S", kid, delay))
+        self.steps += n
+        return b"".join(out)
+
+    def _write_frame(self, payload: bytes):
+        self._f.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        self.frames += 1
+
+    def _flush(self, final: bool):
+        n = len(self._pending)
+        payload = self._encode(n) if n else b""
+        if final and self._ended:
+            payload += _END
+        if payload:
+            self._write_frame(payload)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            closing = self._closing
+            try:
+                self._flush(closing)
+            except Exception as ex:
+                if self.error is None:
+                    self.error = ex
+            if closing:
+                break
+
+    def close(self, ended: bool = True):
+        """Write what is queued (and an end marker if `ended`), then close."""
+        if self._f.closed:
+            return
+        self._ended = ended
+        self._closing = True
+        self._wakeup.set()
+        self._thread.join()
+        self._f.close()
+
+
+def read_journal(path: str):
+    """
+    Recover the steps from a journal. Returns (EventStore, settings, info);
+    info has "ended" (stopped normally), "created", "frames" and
+    "truncated_bytes" (a torn or corrupt tail that was skipped).
+    """
+    import json
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated journal")
+    magic, version, _reserved, created = _HEADER.unpack_from(data, 0)
+    if magic != JOURNAL_MAGIC:
+        raise ValueError("Not a macro journal")
+    if version != JOURNAL_VERSION:
+        raise ValueError(f"Unsupported journal version {version}")
+
+    settings = _clean_settings({})
+    keys = []
+    delays = array("d")
+    key_ids = array("H")
+    ended = False
+    frames = 0
+    off = _HEADER.size
+    while off + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, off)
+        start = off + _FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        off = start + length
+        frames += 1
+
+        p = 0
+        while p < length:
+            tag = payload[p:p + 1]
+            if tag == b"S":
+                _t, kid, delay = _STEP.unpack_from(payload, p)
+                key_ids.append(kid)
+                delays.append(delay)
+                p += _STEP.size
+            elif tag == b"K":
+                _t, kid, n = _KEY.unpack_from(payload, p)
+                p += _KEY.size
+                if kid != len(keys):
+                    raise ValueError("Corrupt journal: key ids out of order")
+                keys.append(payload[p:p + n].decode("utf-8"))
+                p += n
+            elif tag == b"M":
+                _t, n = _META.unpack_from(payload, p)
+                p += _META.size
+                settings = _clean_settings(json.loads(payload[p:p + n].decode("utf-8")))
+                p += n
+            elif tag == _END:
+                ended = True
+                p += 1
+            else:
+                raise ValueError(f"Corrupt journal: unknown record {tag!r}")
+
+    if key_ids and max(key_ids) >= len(keys):
+        raise ValueError("Corrupt journal: step refers to an unknown key")
+    info = {"ended": ended, "created": created, "frames": frames, "truncated_bytes": len(data) - off}
+    return EventStore.from_columns(keys, delays, key_ids), settings, info
@@ -0,0 +1,371 @@
+"""
+Macro library: a directory of macro files with an SQLite index.
+
+The index (INDEX_FILENAME inside the directory) keeps per-file metadata -
+name, step count, duration, toggle key, key histogram and content hash - so
+macros can be found without opening them. refresh() only re-reads files
+whose size or mtime changed. Recently loaded macros stay parsed in a bounded
+LRU, so switching back to one costs a stat() and a column copy.
+"""
+
+import os
+import posixpath
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from .fileio import BINARY_EXT, is_binary_macro, read_macro, write_macro
+
+INDEX_FILENAME = ".macro-index.sqlite3"
+MACRO_EXTENSIONS = (".json", BINARY_EXT)
+LIBRARY_ENV = "MACRO_RECORDER_LIBRARY"
+
+# Parsed macros kept in memory: at most this many, and about this many steps
+LIBRARY_CACHE_SIZE = 16
+LIBRARY_CACHE_STEPS = 5_000_000
+
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE macros (
+    path           TEXT PRIMARY KEY,  -- relative to the library, "/"-separated
+    name           TEXT NOT NULL,
+    mtime_ns       INTEGER NOT NULL,
+    size           INTEGER NOT NULL,
+    steps          INTEGER NOT NULL,
+    duration       REAL NOT NULL,
+    toggle_key     TEXT NOT NULL,
+    repeat_enabled INTEGER NOT NULL,
+    content_hash   TEXT NOT NULL,
+    format         TEXT NOT NULL,
+    last_used      REAL
+);
+CREATE INDEX macros_name ON macros(name COLLATE NOCASE);
+CREATE INDEX macros_toggle ON macros(toggle_key);
+CREATE INDEX macros_hash ON macros(content_hash);
+CREATE TABLE key_counts (
+    path  TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, key)
+) WITHOUT ROWID;
+CREATE INDEX key_counts_key ON key_counts(key);
+"""
+
+_COLUMNS = "name, path, steps, duration, toggle_key, repeat_enabled, content_hash, format, mtime_ns, last_used"
+LibraryEntry = namedtuple("LibraryEntry", _COLUMNS.replace(",", ""))
+
+_ORDER = {
+    "name": "name COLLATE NOCASE, path",
+    "recent": "last_used IS NULL, last_used DESC, name COLLATE NOCASE",
+    "steps": "steps DESC, name COLLATE NOCASE",
+    "duration": "duration DESC, name COLLATE NOCASE",
+}
+
+
+def default_library_dir() -> str:
+    """$MACRO_RECORDER_LIBRARY, else ~/macro_library."""
+    return os.environ.get(LIBRARY_ENV) or os.path.join(os.path.expanduser("~"), "macro_library")
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class MacroLibrary:
+    """
+    Index and cache over one library directory (created if missing).
+    Safe to share between threads; every method takes the library lock.
+    """
+
+    def __init__(self, directory: str = None, cache_size: int = LIBRARY_CACHE_SIZE,
+                 cache_steps: int = LIBRARY_CACHE_STEPS):
+        self.directory = os.path.abspath(directory or default_library_dir())
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, INDEX_FILENAME)
+        self.cache_size = cache_size
+        self.cache_steps = cache_steps
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()  # rel path -> (stamp, EventStore, settings)
+        self._cached_steps = 0
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._open_schema()
+
+    def _open_schema(self):
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version == _SCHEMA_VERSION:
+            return
+        # Unknown or old layout: the index is only a cache, rebuild it
+        with self._db:
+            self._db.execute("DROP TABLE IF EXISTS macros")
+            self._db.execute("DROP TABLE IF EXISTS key_counts")
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._cached_steps = 0
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- Paths ----------------
+
+    def _rel(self, path: str) -> str:
+        rel = os.path.relpath(os.path.abspath(path), self.directory)
+        return rel.replace(os.sep, "/")
+
+    def abspath(self, rel: str) -> str:
+        return os.path.join(self.directory, *rel.split("/"))
+
+    def _scan(self) -> dict:
+        """rel path -> (mtime_ns, size) for every macro file in the library."""
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for fn in filenames:
+                if fn.startswith(".") or not fn.lower().endswith(MACRO_EXTENSIONS):
+                    continue
+                full = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                found[self._rel(full)] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    # ---------------- Index ----------------
+
+    def refresh(self) -> dict:
+        """
+        Bring the index up to date with the directory. Only new or changed
+        files are read. Returns counts plus [(path, error)] for unreadable files.
+        """
+        with self._lock:
+            on_disk = self._scan()
+            indexed = {rel: (m, s) for rel, m, s in self._db.execute("SELECT path, mtime_ns, size FROM macros")}
+            stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": []}
+            with self._db:
+                for rel in indexed.keys() - on_disk.keys():
+                    self._drop(rel)
+                    stats["removed"] += 1
+                for rel, stamp in on_disk.items():
+                    old = indexed.get(rel)
+                    if old == stamp:
+                        stats["unchanged"] += 1
+                        continue
+                    try:
+                        self._index_file(rel, stamp)
+                    except Exception as ex:
+                        if old is not None:
+                            self._drop(rel)
+                        stats["failed"].append((rel, str(ex)))
+                        continue
+                    stats["added" if old is None else "updated"] += 1
+            return stats
+
+    def _drop(self, rel: str):
+        self._db.execute("DELETE FROM macros WHERE path = ?", (rel,))
+        self._db.execute("DELETE FROM key_counts WHERE path = ?", (rel,))
+        self._uncache(rel)
+
+    def _index_file(self, rel: str, stamp, events=None, settings=None):
+        # Caller holds the lock and an open transaction
+        path = self.abspath(rel)
+        if events is None:
+            events, settings = read_macro(path)
+        hist = events.key_counts()
+        name = os.path.splitext(os.path.basename(rel))[0]
+        last_used = self._db.execute("SELECT last_used FROM macros WHERE path = ?", (rel,)).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO macros VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                rel, name, stamp[0], stamp[1], len(events), events.total_delay(),
+                settings["play_toggle_key"], int(settings["repeat_enabled"]), events.content_hash(),
+                "binary" if is_binary_macro(path) else "json", last_used[0] if last_used else None,
+            ),
+        )
+        self._db.execute("DELETE FROM key_counts WHERE path = ?", (rel,))
+        self._db.executemany(
+            "INSERT INTO key_counts VALUES (?, ?, ?)",
+            [(rel, key, n) for key, n in hist.items()],
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM macros").fetchone()[0]
+
+    # ---------------- Search ----------------
+
+    def search(self, text: str = "", keys=(), toggle_key: str = None, min_steps: int = None,
+               max_steps: int = None, min_duration: float = None, max_duration: float = None,
+               content_hash: str = None, order: str = "name", limit: int = 200) -> list:
+        """
+        Entries matching every given filter. `text` is a case-insensitive
+        substring of the name or path; `keys` must all occur in the macro;
+        `content_hash` may be a prefix. `order` is name, recent, steps or duration.
+        """
+        where, params = [], []
+        if text:
+            where.append("(name LIKE ? ESCAPE '\\' OR path LIKE ? ESCAPE '\\')")
+            params += [_like_pattern(text)] * 2
+        for key in keys:
+            where.append("path IN (SELECT path FROM key_counts WHERE key = ?)")
+            params.append(str(key).lower())
+        if toggle_key:
+            where.append("toggle_key = ?")
+            params.append(str(toggle_key).strip().lower())
+        for column, op, value in (("steps", ">=", min_steps), ("steps", "<=", max_steps),
+                                  ("duration", ">=", min_duration), ("duration", "<=", max_duration)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                params.append(value)
+        if content_hash:
+            where.append("content_hash LIKE ?")
+            params.append(content_hash.lower() + "%")
+        try:
+            order_by = _ORDER[order]
+        except KeyError:
+            raise ValueError(f"Unknown order {order!r} (choose from {', '.join(_ORDER)})")
+
+        sql = f"SELECT {_COLUMNS} FROM macros"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            return [LibraryEntry(*row) for row in self._db.execute(sql, params)]
+
+    def recent(self, limit: int = 10) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM macros WHERE last_used IS NOT NULL ORDER BY last_used DESC LIMIT ?",
+                (int(limit),),
+            ).fetchall()
+        return [LibraryEntry(*row) for row in rows]
+
+    def histogram(self, name: str) -> list:
+        """[(key, count)] for one macro, most frequent first."""
+        rel = self.resolve(name)
+        with self._lock:
+            return self._db.execute(
+                "SELECT key, count FROM key_counts WHERE path = ? ORDER BY count DESC, key", (rel,)
+            ).fetchall()
+
+    def entry(self, name: str) -> LibraryEntry:
+        rel = self.resolve(name)
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM macros WHERE path = ?", (rel,)).fetchone()
+        return LibraryEntry(*row)
+
+    def resolve(self, name: str) -> str:
+        """
+        Relative path of a macro given its path (relative or absolute) or its
+        name. Raises KeyError if nothing matches and ValueError if a name is
+        ambiguous.
+        """
+        if isinstance(name, LibraryEntry):
+            return name.path
+        rel = self._rel(name) if os.path.isabs(name) else str(name).replace(os.sep, "/")
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM macros WHERE path = ?", (rel,)).fetchone():
+                return rel
+            rows = self._db.execute(
+                "SELECT path FROM macros WHERE name = ? COLLATE NOCASE ORDER BY path", (name,)
+            ).fetchall()
+        if not rows:
+            raise KeyError(f"No macro named {name!r} in {self.directory}")
+        if len(rows) > 1:
+            raise ValueError(f"{name!r} is ambiguous: " + ", ".join(r[0] for r in rows))
+        return rows[0][0]
+
+    # ---------------- Load / save ----------------
+
+    def load(self, name):
+        """
+        (EventStore, settings) for a library macro. The store is the caller's
+        to edit; the parsed original stays cached until the file changes.
+        """
+        rel = self.resolve(name)
+        path = self.abspath(rel)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock, self._db:
+                self._drop(rel)
+            raise
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._cache.get(rel)
+            if cached is not None and cached[0] == stamp:
+                self._cache.move_to_end(rel)
+                self.hits += 1
+                events, settings = cached[1], cached[2]
+            else:
+                self.misses += 1
+                events, settings = read_macro(path)
+                events.content_hash()  # copies carry it, so plan lookups are immediate
+                with self._db:
+                    row = self._db.execute("SELECT mtime_ns, size FROM macros WHERE path = ?", (rel,)).fetchone()
+                    if row is None or tuple(row) != stamp:
+                        self._index_file(rel, stamp, events, settings)
+                self._cache_put(rel, stamp, events, settings)
+            with self._db:
+                self._db.execute("UPDATE macros SET last_used = ? WHERE path = ?", (time.time(), rel))
+        return events.copy(), dict(settings)
+
+    def save(self, name: str, events, settings: dict) -> str:
+        """
+        Write a macro into the library and index it. `name` may include
+        subfolders and an extension (.mrec for binary, default .json), but
+        must stay inside the library (ValueError otherwise). Returns the
+        relative path.
+        """
+        rel = posixpath.normpath(str(name).replace(os.sep, "/"))
+        if (posixpath.isabs(rel) or os.path.isabs(rel) or os.path.splitdrive(rel)[0]
+                or rel in (".", "..") or rel.startswith("../")):
+            raise ValueError(f"{name!r} is not a path inside the library")
+        if not rel.lower().endswith(MACRO_EXTENSIONS):
+            rel += ".json"
+        path = self.abspath(rel)
+        root = os.path.realpath(self.directory)
+        if os.path.commonpath([os.path.realpath(path), root]) != root:  # through a symlink
+            raise ValueError(f"{name!r} is not a path inside the library")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            self._uncache(rel)  # drop a mapping of the old file before replacing it
+            write_macro(path, events, settings)
+            st = os.stat(path)
+            with self._db:
+                self._index_file(rel, (st.st_mtime_ns, st.st_size), events, settings)
+        return rel
+
+    # ---------------- Cache ----------------
+
+    def _cache_put(self, rel: str, stamp, events, settings):
+        self._uncache(rel)
+        self._cache[rel] = (stamp, events, settings)
+        self._cached_steps += len(events)
+        # The newest entry always stays, however large it is
+        while len(self._cache) > 1 and (len(self._cache) > self.cache_size or self._cached_steps > self.cache_steps):
+            _rel, (_stamp, old, _settings) = self._cache.popitem(last=False)
+            self._cached_steps -= len(old)
+
+    def _uncache(self, rel: str):
+        old = self._cache.pop(rel, None)
+        if old is not None:
+            self._cached_steps -= len(old[1])
+
+    def cached(self) -> list:
+        """Relative paths held parsed in memory, least recently used first."""
+        with self._lock:
+            return list(self._cache)
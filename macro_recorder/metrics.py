@@ -0,0 +1,343 @@
+"""
+Runtime metrics: counters, gauges and HDR-style latency histograms.
+
+A MacroEngine owns a MetricsRegistry and updates it from the hook thread,
+the capture worker and the playback worker; a MacroScheduler given the
+registry writes scheduler_* series of its own. Each metric has one writing
+thread, so updates take no lock; readers (exporters) get a snapshot that
+may be a moment stale (a histogram's count can be one record ahead of its
+buckets).
+
+The registry can be written out periodically (MetricsFileWriter, JSON or
+Prometheus text format by file extension) or served over local HTTP
+(MetricsServer): /metrics in Prometheus text format, /metrics.json, and
+/profile when a SamplingProfiler (see profiler.py) is attached.
+"""
+
+import os
+import threading
+import time
+from array import array
+
+# Histogram resolution: 2**SUB_BITS linear sub-buckets per power of two of
+# nanoseconds, so a bucket is at most 1/16 (6.25%) wider than its values.
+SUB_BITS = 4
+_SUB = 1 << SUB_BITS
+_BUCKETS = (64 - SUB_BITS + 1) * _SUB
+_MAX_NS = (1 << 63) - 1
+
+# Coarse bucket bounds (seconds) used for the Prometheus histogram export
+PROMETHEUS_BOUNDS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Set these to export from the GUI: a file path (.prom/.txt = Prometheus
+# text, anything else JSON) and/or a local HTTP port.
+METRICS_FILE_ENV = "MACRO_RECORDER_METRICS"
+METRICS_PORT_ENV = "MACRO_RECORDER_METRICS_PORT"
+DEFAULT_EXPORT_INTERVAL = 5.0
+
+
+class Counter:
+    """Monotonic count (Prometheus counter)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def snapshot(self) -> dict:
+        return {"type": self.kind, "value": self.value}
+
+
+class Gauge:
+    """Current value; either set() by its owner or read from `fn` at export."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "", fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def read(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return float(self.value)
+
+    def snapshot(self) -> dict:
+        return {"type": self.kind, "value": self.read()}
+
+
+def _bucket_of(ns: int) -> int:
+    if ns < _SUB:
+        return ns
+    shift = ns.bit_length() - SUB_BITS - 1
+    return (shift + 1) * _SUB + (ns >> shift) - _SUB
+
+
+def _bucket_upper(idx: int) -> int:
+    """Largest value (ns) that falls into bucket idx."""
+    if idx < _SUB:
+        return idx
+    shift = idx // _SUB - 1
+    return ((idx % _SUB + _SUB + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    Latency histogram over log-linear nanosecond buckets (HDR style): fixed
+    memory, O(1) record(), quantiles within 6.25% of the true value.
+    Values are recorded and reported in seconds.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self.counts = array("Q", bytes(8 * _BUCKETS))
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        ns = int(seconds * 1e9)
+        if ns < 0:
+            ns = 0
+        elif ns > _MAX_NS:
+            ns = _MAX_NS
+        if ns < _SUB:
+            self.counts[ns] += 1
+        else:
+            shift = ns.bit_length() - SUB_BITS - 1
+            self.counts[(shift + 1) * _SUB + (ns >> shift) - _SUB] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding quantile q (capped at max), in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(_bucket_upper(idx) / 1e9, self.max)
+        return self.max
+
+    def cumulative(self, bounds=PROMETHEUS_BOUNDS) -> list:
+        """Counts of values <= each bound (to bucket precision)."""
+        out = []
+        seen = 0
+        idx = 0
+        counts = self.counts
+        for bound in bounds:
+            limit = _bucket_of(min(_MAX_NS, int(bound * 1e9)))
+            while idx <= limit:
+                seen += counts[idx]
+                idx += 1
+            out.append(seen)
+        return out
+
+    def reset(self):
+        self.counts = array("Q", bytes(8 * _BUCKETS))
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def snapshot(self) -> dict:
+        snap = {"type": self.kind, "count": self.count, "sum": self.sum, "max": self.max}
+        for q in QUANTILES:
+            snap[f"p{q * 100:g}"] = self.quantile(q)
+        return snap
+
+
+class MetricsRegistry:
+    """Named metrics; counter()/gauge()/histogram() return the existing one if any."""
+
+    def __init__(self, prefix: str = "macro_recorder_"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name!r} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "", fn=None) -> Gauge:
+        gauge = self._get(Gauge, name, help)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def __getitem__(self, name: str):
+        return self._metrics[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+    def metrics(self) -> list:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def snapshot(self) -> dict:
+        return {m.name: m.snapshot() for m in self.metrics()}
+
+    def to_json(self) -> str:
+        import json  # deferred: see fileio.read_macro_json
+
+        return json.dumps({"time": time.time(), "metrics": self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for m in self.metrics():
+            name = self.prefix + m.name
+            if m.help:
+                lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            if m.kind == "counter":
+                lines.append(f"{name} {m.value}")
+            elif m.kind == "gauge":
+                lines.append(f"{name} {m.read()!r}")
+            else:
+                for bound, n in zip(PROMETHEUS_BOUNDS, m.cumulative()):
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {n}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {m.count}')
+                lines.append(f"{name}_sum {m.sum!r}")
+                lines.append(f"{name}_count {m.count}")
+        return "\n".join(lines) + "\n"
+
+
+def render(registry: MetricsRegistry, path: str) -> str:
+    """Prometheus text for .prom/.txt paths, JSON otherwise."""
+    if path.lower().endswith((".prom", ".txt")):
+        return registry.to_prometheus()
+    return registry.to_json()
+
+
+def write_metrics(registry: MetricsRegistry, path: str):
+    """Write a snapshot atomically (readers never see a partial file)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render(registry, path))
+    os.replace(tmp, path)
+
+
+class MetricsFileWriter:
+    """Writes the registry to `path` every `interval` seconds and once on close()."""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = DEFAULT_EXPORT_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.interval = max(0.05, float(interval))
+        self.error = None
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        try:
+            write_metrics(self.registry, self.path)
+        except OSError as ex:
+            self.error = ex
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._write()
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint for the registry (and an optional profiler).
+    Binds to 127.0.0.1 by default; port 0 picks a free port (see .port).
+    """
+
+    def __init__(self, registry: MetricsRegistry, port: int = 0, host: str = "127.0.0.1", profiler=None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server_self = self
+        self.registry = registry
+        self.profiler = profiler
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body, ctype = server_self.registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif path == "/metrics.json":
+                    body, ctype = server_self.registry.to_json(), "application/json"
+                elif path == "/profile" and server_self.profiler is not None:
+                    body, ctype = server_self.profiler.report(), "text/plain"
+                elif path == "/profile.folded" and server_self.profiler is not None:
+                    body, ctype = server_self.profiler.folded(), "text/plain"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype + "; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *_args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
@@ -0,0 +1,225 @@
+"""
+Precompiled playback plans and their LRU cache.
+
+A plan is everything the playback loop needs, worked out once: key codes
+already resolved by the backend, absolute batch offsets already scaled for
+speed, coalesced batches and the loop period including the repeat delay.
+
+A compressed macro gets a BlockPlan instead, which produces the same batches
+lazily from its repeat blocks, so memory stays proportional to the blocks
+rather than to the expanded step count.
+
+A plan can cover a range of steps [start, stop) instead of the whole macro;
+its offsets then count from just before `start` (whose own delay is still
+waited), and looping repeats only that range.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import islice
+
+PLAN_CACHE_SIZE = 8
+
+
+class PlaybackPlan:
+    """
+    Immutable schedule for one macro at one speed on one backend.
+
+    Batch i fires `offsets[i]` seconds after the loop starts and sends
+    `codes[starts[i]:starts[i + 1]]`.
+    """
+
+    __slots__ = ("offsets", "starts", "codes", "steps", "loop_duration", "repeat_delay", "errors")
+
+    def __init__(self, offsets, starts, codes, steps, loop_duration, repeat_delay, errors):
+        self.offsets = offsets              # array("d"), seconds from loop start
+        self.starts = starts                # array("I"), len(offsets) + 1 entries
+        self.codes = tuple(codes)           # resolved backend codes, flat
+        self.steps = steps                  # steps in the macro (incl. unresolvable)
+        self.loop_duration = loop_duration  # offset of the loop end
+        self.repeat_delay = repeat_delay    # pause before the next loop
+        self.errors = tuple(errors)         # resolve failures (keys skipped)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("PlaybackPlan is immutable")
+        object.__setattr__(self, name, value)
+
+    @property
+    def loop_period(self) -> float:
+        return self.loop_duration + self.repeat_delay
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def batches(self):
+        """Iterate (offset, codes tuple) per batch."""
+        codes, starts = self.codes, self.starts
+        for i, at in enumerate(self.offsets):
+            yield at, codes[starts[i]:starts[i + 1]]
+
+
+class BlockPlan:
+    """
+    Playback schedule of a compressed macro. batches() walks the repeat
+    blocks and yields exactly what PlaybackPlan.batches() would for the
+    expanded macro: offsets are accumulated step by step in the same order,
+    so they are bit-identical. The loop duration comes from the block
+    totals, which may differ from the expanded sum in the last bits.
+    """
+
+    __slots__ = ("blocks", "table", "speed", "batch_window", "steps", "loop_duration", "repeat_delay", "errors")
+
+    def __init__(self, blocks, table, speed, batch_window, loop_duration, repeat_delay, errors):
+        self.blocks = blocks
+        self.table = tuple(table)           # key id -> resolved code (None: skipped)
+        self.speed = speed
+        self.batch_window = batch_window
+        self.steps = len(blocks)
+        self.loop_duration = loop_duration
+        self.repeat_delay = repeat_delay
+        self.errors = tuple(errors)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("BlockPlan is immutable")
+        object.__setattr__(self, name, value)
+
+    @property
+    def loop_period(self) -> float:
+        return self.loop_duration + self.repeat_delay
+
+    def batches(self):
+        """Iterate (offset, codes tuple) per batch."""
+        speed, window, table = self.speed, self.batch_window, self.table
+        t = 0.0
+        batch_at = None
+        batch = []
+        for kid, delay in self.blocks.iter_ids():
+            t += delay / speed
+            code = table[kid]
+            if code is None:
+                continue
+            if batch_at is None or t - batch_at >= window:
+                if batch:
+                    yield batch_at, tuple(batch)
+                batch_at = t
+                batch = [code]
+            else:
+                batch.append(code)
+        if batch:
+            yield batch_at, tuple(batch)
+
+
+def _resolve_keys(keys, backend):
+    errors = []
+    table = []
+    for key in keys:
+        try:
+            table.append(backend.resolve(key))
+        except Exception as ex:
+            table.append(None)
+            errors.append(str(ex))
+    return table, errors
+
+
+def step_range(events, start: int = 0, stop: int = None) -> tuple:
+    """Clamp [start, stop) to the macro, as (start, stop)."""
+    n = len(events)
+    start = max(0, min(int(start or 0), n))
+    stop = n if stop is None else max(start, min(int(stop), n))
+    return start, stop
+
+
+def compile_plan(events, backend, speed: float, batch_window: float, repeat_delay: float,
+                 start: int = 0, stop: int = None):
+    """
+    Build a plan from an EventStore, for steps [start, stop). Steps due within
+    `batch_window` seconds of a batch's first step (after scaling by `speed`)
+    join that batch. Compressed stores get a BlockPlan when the whole macro
+    is played.
+    """
+    speed = max(0.01, float(speed))
+    table, errors = _resolve_keys(events.keys, backend)
+    repeat_delay = max(0.0, float(repeat_delay))
+    start, stop = step_range(events, start, stop)
+    whole = start == 0 and stop == len(events)
+
+    blocks = events.blocks
+    if blocks is not None and whole:
+        # Summed over the block tree (count x body) without expanding it, so
+        # equal to the expanded macro's duration up to rounding
+        return BlockPlan(blocks, table, speed, batch_window, blocks.total_delay() / speed, repeat_delay, errors)
+
+    if whole:
+        steps = events.iter_ids()
+    elif blocks is not None:
+        steps = islice(blocks.iter_ids(), start, stop)
+    else:
+        steps = zip(events.key_ids_view()[start:stop], events.delays_view()[start:stop])
+
+    offsets = array("d")
+    starts = array("I")
+    codes = []
+    t = 0.0
+    batch_at = None
+    for kid, delay in steps:
+        t += delay / speed
+        code = table[kid]
+        if code is None:
+            continue
+        if batch_at is None or t - batch_at >= batch_window:
+            batch_at = t
+            offsets.append(t)
+            starts.append(len(codes))
+        codes.append(code)
+    starts.append(len(codes))
+
+    return PlaybackPlan(offsets, starts, codes, stop - start, t, repeat_delay, errors)
+
+
+class PlanCache:
+    """
+    LRU of compiled plans keyed by (macro content hash, speed, backend,
+    batch window, repeat delay, step range). Safe to use from several threads.
+    """
+
+    def __init__(self, capacity: int = PLAN_CACHE_SIZE):
+        self.capacity = capacity
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, events, backend, speed: float, batch_window: float, repeat_delay: float,
+            start: int = 0, stop: int = None) -> PlaybackPlan:
+        start, stop = step_range(events, start, stop)
+        key = (events.content_hash(), float(speed), backend.name, float(batch_window), float(repeat_delay),
+               start, stop)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        plan = compile_plan(events, backend, speed, batch_window, repeat_delay, start, stop)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.capacity:
+                self._plans.popitem(last=False)
+        return plan
+
+    def invalidate(self, content_hash: str = None):
+        """Drop plans for one macro (by content hash), or all plans."""
+        with self._lock:
+            if content_hash is None:
+                self._plans.clear()
+                return
+            for key in [k for k in self._plans if k[0] == content_hash]:
+                del self._plans[key]
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -0,0 +1,145 @@
+"""
+Opt-in sampling profiler.
+
+A background thread looks at every other thread's current stack every
+`interval` seconds (sys._current_frames) and counts the stacks it sees. It
+never traces or patches the running code, so the profiled threads pay
+nothing; the cost is one stack walk per thread per sample on the sampler's
+own thread. Results are per thread name:
+
+    report()  the functions seen most often, by self and total samples
+    folded()  "thread;outer;...;inner count" lines for flame graph tools
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL_MS = 5.0
+MAX_DEPTH = 64
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples all threads' stacks while running; start()/stop() may be repeated."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL_MS / 1000.0, include_idle: bool = False):
+        self.interval = max(0.0005, float(interval))
+        self.include_idle = include_idle  # count threads blocked in wait()/sleep() too
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stacks = Counter()   # (thread name, stack tuple outermost first) -> samples
+        self._labels = {}          # code object -> label
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed += time.perf_counter() - self.started
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.elapsed = 0.0
+            if self._thread is not None:
+                self.started = time.perf_counter()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        idle = ("wait", "sleep", "select", "poll", "_wait_for_tstate_lock", "serve_forever", "mainloop")
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            taken = []
+            for ident, frame in frames.items():
+                if ident == own or (not self.include_idle and frame.f_code.co_name in idle):
+                    continue
+                stack = []
+                f = frame
+                while f is not None and len(stack) < MAX_DEPTH:
+                    stack.append(self._label(f.f_code))
+                    f = f.f_back
+                stack.reverse()
+                taken.append((names.get(ident, str(ident)), tuple(stack)))
+            del frames
+            with self._lock:
+                self.samples += 1
+                for key in taken:
+                    self._stacks[key] += 1
+
+    def stacks(self) -> Counter:
+        with self._lock:
+            return Counter(self._stacks)
+
+    def top(self, n: int = 20) -> list:
+        """[(function, self samples, total samples)], busiest first."""
+        own = Counter()
+        total = Counter()
+        for (_thread, stack), count in self.stacks().items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [(label, count, total[label]) for label, count in own.most_common(n)]
+
+    def folded(self) -> str:
+        lines = [
+            ";".join((thread,) + stack) + f" {count}"
+            for (thread, stack), count in sorted(self.stacks().items())
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def report(self, n: int = 25) -> str:
+        elapsed = self.elapsed + (time.perf_counter() - self.started if self._thread is not None else 0.0)
+        per_thread = Counter()
+        for (thread, _stack), count in self.stacks().items():
+            per_thread[thread] += count
+        out = [f"{self.samples} samples over {elapsed:.1f} s every {self.interval * 1000:g} ms"]
+        out.append("")
+        out.append("busy samples by thread:")
+        for thread, count in per_thread.most_common():
+            out.append(f"  {count:>8}  {thread}")
+        out.append("")
+        out.append(f"{'self':>8} {'total':>8}  function")
+        for label, own, total in self.top(n):
+            out.append(f"{own:>8} {total:>8}  {label}")
+        return "\n".join(out) + "\n"
+
+    def save(self, path: str, folded: bool = None):
+        """Write report() (or folded() for .folded / when asked) to a file."""
+        if folded is None:
+            folded = path.endswith(".folded")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded() if folded else self.report())
@@ -0,0 +1,117 @@
+"""
+Always-on replay buffer: the last few minutes of key presses, kept whether
+or not a recording is running, so a macro can be cut from what was just
+typed after the fact.
+
+Presses go into preallocated columns (float64 time, uint16 key id) that
+wrap around, so memory is fixed by the capacity however long it runs. The
+capture worker appends; take() copies the window out under a short lock,
+so capture never pauses for it.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from operator import sub
+
+from .store import EventStore
+
+REPLAY_CAPACITY = 100000   # presses kept (about 1 MB)
+REPLAY_SPAN_S = 600.0      # and none older than this when taken
+
+
+class ReplayBuffer:
+    """Fixed-capacity ring of (hook time, key) presses. One writer, any number of readers."""
+
+    MAX_KEYS = EventStore.MAX_KEYS
+
+    def __init__(self, capacity: int = REPLAY_CAPACITY, span: float = REPLAY_SPAN_S):
+        self.capacity = max(1, int(capacity))
+        self.span = float(span) if span else None  # None: bounded by capacity only
+        self._times = array("d", bytes(8 * self.capacity))
+        self._key_ids = array("H", bytes(2 * self.capacity))
+        self._keys = []        # id -> key name; only grows, bounded by MAX_KEYS
+        self._key_index = {}
+        self._count = 0        # presses ever appended
+        self.dropped = 0       # presses of keys beyond MAX_KEYS
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self) -> int:
+        """Presses appended since the buffer was created."""
+        return self._count
+
+    @property
+    def overwritten(self) -> int:
+        return max(0, self._count - self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def append(self, key: str, t: float):
+        """Add a press at `t` (seconds, the hook's clock); the oldest goes once full."""
+        kid = self._key_index.get(key)
+        if kid is None:
+            if len(self._keys) >= self.MAX_KEYS:
+                self.dropped += 1
+                return
+            kid = len(self._keys)
+            self._keys.append(key)
+            self._key_index[key] = kid
+        with self._lock:
+            i = self._count % self.capacity
+            self._times[i] = t
+            self._key_ids[i] = kid
+            self._count += 1
+
+    def _ordered(self) -> tuple:
+        # Under the lock: the held presses oldest first
+        n = len(self)
+        if self._count <= self.capacity:
+            return self._times[:n], self._key_ids[:n]
+        i = self._count % self.capacity
+        return self._times[i:] + self._times[:i], self._key_ids[i:] + self._key_ids[:i]
+
+    def take(self, seconds: float = None, now: float = None) -> EventStore:
+        """
+        The presses of the last `seconds` (default: the span, else all held)
+        before `now` (default: time.time(), the hook's clock) as a new
+        EventStore. The first step has no delay; the rest keep their gaps.
+        """
+        with self._lock:
+            times, key_ids = self._ordered()
+            keys = list(self._keys)
+
+        window = self.span if seconds is None else float(seconds)
+        cut = 0
+        if window is not None and times:
+            now = time.time() if now is None else now
+            cut = bisect_left(times, now - window)
+        times = times[cut:]
+        if not times:
+            return EventStore()
+        delays = array("d", [0.0])
+        delays.extend(map(sub, times[1:], times))
+        if min(delays) < 0.0:  # the wall clock was set back
+            delays = array("d", (max(0.0, d) for d in delays))
+        return EventStore.from_columns(keys, delays, key_ids[cut:])
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = len(self)
+            oldest = self._times[(self._count - n) % self.capacity] if n else None
+            newest = self._times[(self._count - 1) % self.capacity] if n else None
+        return {
+            "held": n,
+            "capacity": self.capacity,
+            "span": self.span,
+            "total": self._count,
+            "overwritten": self.overwritten,
+            "seconds_held": (newest - oldest) if n else 0.0,
+            "bytes": self._times.itemsize * self.capacity + self._key_ids.itemsize * self.capacity,
+        }
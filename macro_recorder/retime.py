@@ -0,0 +1,126 @@
+"""
+Bulk delay edits over a range of steps.
+
+Each operation rewrites a writable delay view (EventStore.edit_delays) in
+place. With NumPy installed the view is wrapped as an ndarray without
+copying and edited in a few vector operations, so retiming a million steps
+takes milliseconds; without it the same edit runs as one array
+comprehension. Both give the same delays, except that jitter draws from
+NumPy's generator when NumPy is used (still reproducible for a given seed).
+
+All values are in seconds; delays never go below zero.
+"""
+
+from array import array
+
+_numpy = None
+_numpy_loaded = False
+
+
+def load_numpy():
+    """Import numpy on first use; None if it is not installed."""
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+            _numpy = numpy
+        except Exception:
+            _numpy = None
+    return _numpy
+
+
+def _vector(view):
+    np = load_numpy()
+    return None if np is None else np.asarray(view)
+
+
+def _rewrite(view, values):
+    view[:] = array("d", values)
+
+
+def scale(view, factor: float):
+    """Multiply every delay by `factor` (0.5 = twice as fast)."""
+    factor = float(factor)
+    if factor < 0:
+        raise ValueError("Scale factor must not be negative")
+    a = _vector(view)
+    if a is not None:
+        a *= factor
+    else:
+        _rewrite(view, (d * factor for d in view))
+
+
+def clamp(view, low: float = None, high: float = None):
+    """Raise delays below `low` and lower delays above `high` (either may be None)."""
+    if high is not None and float(high) < 0:
+        raise ValueError("Maximum delay must not be negative")
+    if low is not None and high is not None and low > high:
+        raise ValueError("Minimum delay is above the maximum")
+    low = 0.0 if low is None else max(0.0, float(low))
+    high = float("inf") if high is None else float(high)
+    a = _vector(view)
+    if a is not None:
+        a.clip(low, high, out=a)
+    else:
+        _rewrite(view, (low if d < low else high if d > high else d for d in view))
+
+
+def quantize(view, step: float):
+    """Round every delay to the nearest multiple of `step` (halves to even)."""
+    step = float(step)
+    if step <= 0:
+        raise ValueError("Quantize step must be positive")
+    a = _vector(view)
+    if a is not None:
+        a /= step
+        a.round(out=a)
+        a *= step
+    else:
+        _rewrite(view, (round(d / step) * step for d in view))
+
+
+def set_constant(view, value: float):
+    """Give every delay the same value."""
+    value = max(0.0, float(value))
+    a = _vector(view)
+    if a is not None:
+        a.fill(value)
+    else:
+        _rewrite(view, (value for _ in range(len(view))))
+
+
+def jitter(view, amount: float, seed: int = None):
+    """Add uniform noise in [-amount, +amount]; the same seed gives the same noise."""
+    amount = abs(float(amount))
+    np = load_numpy()
+    if np is not None:
+        a = np.asarray(view)
+        a += np.random.default_rng(seed).uniform(-amount, amount, len(a))
+        a.clip(0.0, None, out=a)
+    else:
+        import random
+
+        uniform = random.Random(seed).uniform
+        _rewrite(view, (max(0.0, d + uniform(-amount, amount)) for d in view))
+
+
+def cap_gaps(view, threshold: float, to: float = None):
+    """Shorten idle gaps: delays above `threshold` become `to` (default: the threshold)."""
+    threshold = max(0.0, float(threshold))
+    to = threshold if to is None else max(0.0, float(to))
+    a = _vector(view)
+    if a is not None:
+        a[a > threshold] = to
+    else:
+        _rewrite(view, (to if d > threshold else d for d in view))
+
+
+OPERATIONS = {
+    "scale": scale,
+    "clamp": clamp,
+    "quantize": quantize,
+    "set": set_constant,
+    "jitter": jitter,
+    "cap_gaps": cap_gaps,
+}
@@ -0,0 +1,313 @@
+"""
+Several macros played at once on one thread.
+
+A MacroScheduler keeps one heap entry per playing macro (a Track): the
+absolute deadline of its next batch. The worker sleeps until the earliest
+deadline, sends every batch that is due (higher priority first), and pushes
+each track's following batch back, so the cost per batch is O(log N) in the
+number of tracks and there is one timer instead of N threads competing for
+it.
+
+Tracks use the same compiled plans as single playback (speed, batch window,
+repeat delay), so each keeps its own timeline: a loop starts `loop_period`
+after the previous one, whatever the other tracks are doing.
+
+When a track is about to send a key that another track of the same or
+higher priority sent less than `conflict_window` ago, its conflict rule
+decides:
+
+    send    send it anyway (default)
+    skip    leave that key out of the batch
+    defer   hold the track until the window has passed; the rest of its
+            timeline moves back by the same amount
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from .engine import DEFAULT_BATCH_WINDOW_MS, ms_int_to_sec
+from .plan import PlanCache
+from .timing import DEFAULT_SPIN_WINDOW_MS, Clock, LatenessStats
+
+CONFLICT_RULES = ("send", "skip", "defer")
+DEFAULT_CONFLICT_WINDOW_MS = 50.0
+KEEP_FINISHED = 256  # ended tracks still listed in MacroScheduler.tracks
+
+
+class Track:
+    """One macro on a MacroScheduler. Counters are final once `done` is set."""
+
+    __slots__ = (
+        "id", "name", "plan", "priority", "conflict", "repeat", "max_loops",
+        "base", "batches", "pending", "loops", "stopped", "done",
+        "emits", "keys_sent", "skipped", "deferred", "lateness", "errors",
+    )
+
+    def __init__(self, track_id, name, plan, priority, conflict, repeat, max_loops):
+        self.id = track_id
+        self.name = name
+        self.plan = plan
+        self.priority = priority
+        self.conflict = conflict
+        self.repeat = repeat
+        self.max_loops = max_loops
+        self.base = 0.0          # clock time the current loop started
+        self.batches = None      # iterator over the current loop's batches
+        self.pending = None      # (offset, codes) due next
+        self.loops = 0
+        self.stopped = False
+        self.done = threading.Event()
+        self.emits = 0
+        self.keys_sent = 0
+        self.skipped = 0         # keys left out by the "skip" rule
+        self.deferred = 0        # batches held by the "defer" rule
+        self.lateness = LatenessStats()  # fixed size, however long it repeats
+        self.errors = list(plan.errors)
+
+    def summary(self) -> dict:
+        return {
+            "name": self.name,
+            "loops": self.loops,
+            "emits": self.emits,
+            "keys": self.keys_sent,
+            "skipped": self.skipped,
+            "deferred": self.deferred,
+            "stopped": self.stopped,
+            "lateness": self.lateness.stats(),
+            "errors": self.errors[:100],
+        }
+
+
+class MacroScheduler:
+    """
+    Plays any number of macros concurrently through one backend. add()
+    starts a macro (and the worker thread if it is idle); the worker exits
+    when no track is left. Ended tracks are let go after the KEEP_FINISHED
+    most recent; add() returns the Track for callers that need it longer.
+    """
+
+    def __init__(self, backend, clock: Clock = None, plan_cache: PlanCache = None,
+                 spin_window_ms: float = DEFAULT_SPIN_WINDOW_MS,
+                 batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+                 conflict_window_ms: float = DEFAULT_CONFLICT_WINDOW_MS,
+                 metrics=None):
+        self.backend = backend
+        self.clock = clock or Clock()
+        self.plan_cache = plan_cache or PlanCache()
+        self.spin_window = max(0.0, float(spin_window_ms)) / 1000.0
+        self.batch_window = max(0.0, float(batch_window_ms)) / 1000.0
+        self.conflict_window = max(0.0, float(conflict_window_ms)) / 1000.0
+        self._live = {}            # track id -> Track still playing
+        self._finished = deque(maxlen=KEEP_FINISHED)
+        self.on_track_done = None  # (track), called on the worker thread
+
+        self._heap = []            # (deadline, -priority, sequence, track)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._recent = {}          # code -> (time sent, priority, track)
+        self._lock = threading.Lock()
+        self._interrupt = threading.Event()
+        self._thread = None
+
+        self._m_lateness = self._m_injection = self._m_keys = None
+        if metrics is not None:
+            # Series of its own: each metric has one writing thread, and the
+            # engine's playback worker writes the playback_* ones
+            self._m_lateness = metrics.histogram(
+                "scheduler_lateness_seconds", "How late each scheduled batch was sent versus its deadline")
+            self._m_injection = metrics.histogram(
+                "scheduler_injection_seconds", "Time spent in one backend press/emit call by the scheduler")
+            self._m_keys = metrics.counter("scheduler_keys_injected_total", "Keys sent by the scheduler")
+
+    # ---------------- Control ----------------
+
+    def add(self, events, name: str = None, speed: float = 1.0, repeat: bool = False,
+            repeat_delay_ms: int = 250, loops: int = None, priority: int = 0,
+            conflict: str = "send", start_delay: float = 0.0) -> Track:
+        """
+        Start playing `events` (an EventStore) `start_delay` seconds from now.
+        `loops` caps the loop count even when repeating (loops > 1 implies
+        repeat). Higher `priority` wins conflicts and goes first at a tie.
+        """
+        if conflict not in CONFLICT_RULES:
+            raise ValueError(f"Unknown conflict rule {conflict!r} (choose from {', '.join(CONFLICT_RULES)})")
+        if not events:
+            raise ValueError("No macro recorded.")
+        loops = int(loops) if loops else None
+        repeat = bool(repeat) or (loops is not None and loops > 1)
+        plan = self.plan_cache.get(events, self.backend, max(0.01, float(speed)), self.batch_window,
+                                   ms_int_to_sec(int(repeat_delay_ms or 0)))
+        track = Track(next(self._ids), name, plan, int(priority), conflict, repeat, loops)
+        track.batches = plan.batches()
+        track.pending = next(track.batches, None)
+        if track.pending is None:
+            track.done.set()  # nothing resolvable to send
+            with self._lock:
+                self._finished.append(track)
+            return track
+        track.base = self.clock.now() + max(0.0, float(start_delay))
+
+        with self._lock:
+            self._live[track.id] = track
+            heapq.heappush(self._heap, (track.base + track.pending[0], -track.priority, next(self._seq), track))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="macro-scheduler", daemon=True)
+                self._thread.start()
+        # The new deadline may be earlier than the one being waited for
+        self._interrupt.set()
+        return track
+
+    def stop(self, track: Track = None):
+        """Stop one track, or all of them."""
+        with self._lock:
+            for t in ([track] if track is not None else self._live.values()):
+                t.stopped = True
+        self._interrupt.set()
+
+    @property
+    def tracks(self) -> list:
+        """The KEEP_FINISHED most recently ended tracks, then those playing."""
+        with self._lock:
+            return list(self._finished) + list(self._live.values())
+
+    @property
+    def is_playing(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for every track to end. Returns False on timeout."""
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return True
+            if end is not None and time.perf_counter() >= end:
+                return False
+            thread.join(0.2)
+
+    # ---------------- Worker ----------------
+
+    def _push(self, track: Track, deadline: float):
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, -track.priority, next(self._seq), track))
+
+    def _finish(self, track: Track):
+        with self._lock:
+            if self._live.pop(track.id, None) is not None:
+                self._finished.append(track)
+        track.done.set()
+        callback = self.on_track_done
+        if callback is not None:
+            callback(track)
+
+    def _run(self):
+        clock, heap, lock, interrupt = self.clock, self._heap, self._lock, self._interrupt
+        spin = self.spin_window
+        purge = False
+        while True:
+            ended = []
+            with lock:
+                if purge:
+                    # After stop(): take stopped tracks out wherever they are
+                    ended = [entry[3] for entry in heap if entry[3].stopped]
+                    if ended:
+                        heap[:] = [entry for entry in heap if not entry[3].stopped]
+                        heapq.heapify(heap)
+                    purge = False
+                if not heap:
+                    self._thread = None
+                    self._recent.clear()
+                deadline = heap[0][0] if heap else None
+            for track in ended:
+                self._finish(track)
+            if deadline is None:
+                return
+
+            if not clock.wait_until(deadline, spin, interrupt):
+                interrupt.clear()  # tracks were added or stopped; look again
+                purge = True
+                continue
+
+            now = clock.now()
+            with lock:
+                due = []
+                while heap and heap[0][0] <= now:
+                    due.append(heapq.heappop(heap))
+            if len(due) > 1:
+                # Batches due together go out highest priority first, then
+                # in deadline order
+                due.sort(key=lambda entry: (entry[1], entry[0], entry[2]))
+            for deadline, _prio, _seq, track in due:
+                if track.stopped:
+                    self._finish(track)
+                elif self._send(track, deadline):
+                    self._advance(track)
+
+    def _send(self, track: Track, deadline: float) -> bool:
+        """Send the track's pending batch; False if it was deferred instead."""
+        at, batch = track.pending
+        clock = self.clock
+        now = clock.now()
+        window = self.conflict_window
+        recent = self._recent
+
+        if window > 0 and track.conflict != "send":
+            clash = set()
+            held_until = 0.0
+            for code in batch:
+                last = recent.get(code)
+                if last is not None and last[2] is not track and last[1] >= track.priority and now - last[0] < window:
+                    clash.add(code)
+                    held_until = max(held_until, last[0] + window)
+            if clash:
+                if track.conflict == "defer":
+                    track.deferred += 1
+                    track.base += held_until - deadline
+                    self._push(track, track.base + at)
+                    return False
+                track.skipped += sum(1 for code in batch if code in clash)
+                batch = tuple(code for code in batch if code not in clash)
+
+        if batch:
+            late = now - deadline
+            t = time.perf_counter()
+            try:
+                if len(batch) == 1:
+                    self.backend.press(batch[0])
+                else:
+                    self.backend.emit(batch)
+            except Exception as ex:
+                if len(track.errors) < 100:
+                    track.errors.append(str(ex))
+            took = time.perf_counter() - t
+            track.lateness.record(late)
+            track.emits += 1
+            track.keys_sent += len(batch)
+            if window > 0:
+                stamp = (now, track.priority, track)
+                for code in batch:
+                    recent[code] = stamp
+            if self._m_lateness is not None:
+                self._m_lateness.record(late)
+                self._m_injection.record(took)
+                self._m_keys.value += len(batch)
+        return True
+
+    def _advance(self, track: Track):
+        """Queue the track's next batch, starting its next loop if due, or end it."""
+        plan = track.plan
+        nxt = next(track.batches, None)
+        if nxt is None:
+            track.loops += 1
+            if not track.repeat or (track.max_loops is not None and track.loops >= track.max_loops):
+                self._finish(track)
+                return
+            track.base += plan.loop_period
+            track.batches = plan.batches()
+            nxt = next(track.batches, None)
+        track.pending = nxt
+        self._push(track, track.base + nxt[0])
@@ -0,0 +1,424 @@
+"""Compact in-memory storage for recorded macro steps."""
+
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, islice
+
+
+class EventStore:
+    """
+    Compact storage for recorded steps.
+
+    Delays (seconds) live in a float64 array and keys in a uint16 array of ids
+    into a small interned key table, so a step costs 10 bytes instead of a dict.
+    Items are exposed as (key, delay) tuples.
+
+    A store opened from a binary macro reads its columns straight from the
+    file mapping and copies them into memory on the first modification. A
+    compressed store (from_blocks) has no columns at all: reads walk its
+    repeat blocks, and the first modification expands it.
+
+    While an undo step tracks the store (track_edits), it is handed each
+    range of steps just before they change.
+    """
+
+    __slots__ = ("_delays", "_key_ids", "_keys", "_key_index", "_mapping", "_blocks", "_hash", "_time_index",
+                 "_tracker")
+
+    MAX_KEYS = 0xFFFF
+
+    def __init__(self, events=None):
+        self._delays = array("d")
+        self._key_ids = array("H")
+        self._keys = []        # id -> key name
+        self._key_index = {}   # key name -> id
+        self._mapping = None   # mmap backing _delays/_key_ids, if any
+        self._blocks = None    # BlockMacro standing in for both columns, if any
+        self._hash = None      # memoized content_hash(), reset by every change
+        self._time_index = None  # TimeIndex, once asked for; kept up to date
+        self._tracker = None   # open undo step (history.EditHistory), if any
+        if events is not None:
+            self.extend(events)
+
+    @classmethod
+    def from_columns(cls, keys, delays, key_ids, mapping=None) -> "EventStore":
+        """Wrap existing columns (arrays or memoryviews) without copying."""
+        out = cls()
+        out._keys = list(keys)
+        out._key_index = {k: i for i, k in enumerate(out._keys)}
+        out._delays = delays
+        out._key_ids = key_ids
+        out._mapping = mapping
+        return out
+
+    @classmethod
+    def from_blocks(cls, blocks) -> "EventStore":
+        """Wrap a BlockMacro (see blocks.compress) without expanding it."""
+        out = cls()
+        out._keys = list(blocks.keys)
+        out._key_index = {k: i for i, k in enumerate(out._keys)}
+        out._delays = out._key_ids = None
+        out._blocks = blocks
+        return out
+
+    @property
+    def is_mapped(self) -> bool:
+        return self._mapping is not None
+
+    @property
+    def blocks(self):
+        """The BlockMacro behind a compressed store, else None."""
+        return self._blocks
+
+    def _own(self):
+        # Copy mapped columns into private arrays, or expand repeat blocks,
+        # before writing to them.
+        if self._blocks is not None:
+            self._key_ids, self._delays = self._blocks.expand_columns()
+            self._blocks = None
+            return
+        if self._mapping is None:
+            return
+        delays = array("d")
+        delays.frombytes(self._delays.cast("B"))
+        key_ids = array("H")
+        key_ids.frombytes(self._key_ids.cast("B"))
+        self._delays = delays
+        self._key_ids = key_ids
+        self._mapping = None
+
+    def release(self):
+        """Detach from a file mapping (if any) so the file can be replaced."""
+        if self._mapping is not None:
+            self._own()
+
+    def expand(self):
+        """Replace repeat blocks (if any) with flat columns of the same steps."""
+        if self._blocks is not None:
+            self._own()
+
+    def intern(self, key: str) -> int:
+        kid = self._key_index.get(key)
+        if kid is None:
+            kid = len(self._keys)
+            if kid >= self.MAX_KEYS:
+                raise ValueError("Too many distinct keys in one macro")
+            self._keys.append(key)
+            self._key_index[key] = kid
+        return kid
+
+    def append(self, key: str, delay: float):
+        if self._mapping is not None or self._blocks is not None:
+            self._own()
+        self._hash = None  # the time index picks new steps up on its next query
+        if self._tracker is not None:
+            n = len(self._delays)
+            self._tracker.touch(n, n + 1)
+        kid = self.intern(key)
+        self._delays.append(delay)
+        self._key_ids.append(kid)
+
+    def extend(self, events):
+        for key, delay in events:
+            self.append(key, delay)
+
+    def clear(self):
+        if self._tracker is not None:
+            self._own()
+            self._tracker.touch(0, len(self._delays))
+        if self._blocks is not None:
+            self._blocks = None
+            self._delays = array("d")
+            self._key_ids = array("H")
+        self._own()
+        self._hash = None
+        self._stale_from(0)
+        del self._delays[:]
+        del self._key_ids[:]
+        self._keys.clear()
+        self._key_index.clear()
+
+    def __len__(self) -> int:
+        if self._blocks is not None:
+            return len(self._blocks)
+        return len(self._delays)
+
+    def __iter__(self):
+        keys = self._keys
+        for kid, delay in self.iter_ids():
+            yield keys[kid], delay
+
+    def iter_ids(self):
+        """Iterate (key id, delay) without looking up key names."""
+        if self._blocks is not None:
+            return self._blocks.iter_ids()
+        return zip(self._key_ids, self._delays)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if self._blocks is not None:
+                key_ids, delays = self._blocks.expand_columns()
+                return EventStore.from_columns(self._keys, delays[i], key_ids[i])
+            return EventStore.from_columns(self._keys, self._delays[i], self._key_ids[i], self._mapping)
+        if self._blocks is not None:
+            kid, delay = self._blocks.locate(i)
+            return self._keys[kid], delay
+        return self._keys[self._key_ids[i]], self._delays[i]
+
+    def copy(self) -> "EventStore":
+        """
+        Independent store with the same steps. File-mapped columns and repeat
+        blocks are shared until either side writes; owned columns are copied.
+        """
+        if self._blocks is not None:
+            out = EventStore.from_blocks(self._blocks)
+        elif self._mapping is not None:
+            out = EventStore.from_columns(self._keys, self._delays, self._key_ids, self._mapping)
+        else:
+            out = EventStore.from_columns(self._keys, self._delays[:], self._key_ids[:])
+        out._hash = self._hash
+        return out
+
+    def __setitem__(self, i: int, event):
+        key, delay = event
+        self._own()
+        self._hash = None
+        self._stale_from(i)
+        self._touch(i)
+        kid = self.intern(key)
+        self._delays[i] = delay
+        self._key_ids[i] = kid
+
+    def key(self, i: int) -> str:
+        return self[i][0]
+
+    def delay(self, i: int) -> float:
+        return self[i][1]
+
+    def set_delay(self, i: int, delay: float):
+        self._own()
+        self._hash = None
+        self._stale_from(i)
+        self._touch(i)
+        self._delays[i] = delay
+
+    def edit_delays(self, start: int = 0, stop: int = None) -> memoryview:
+        """
+        Writable view of delays[start:stop] for bulk edits (see retime).
+        Mapped columns are copied and repeat blocks expanded first. The store
+        cannot grow or shrink while the view is alive.
+        """
+        self._own()
+        self._hash = None
+        first, last, _ = slice(start, stop).indices(len(self))
+        self._stale_from(first)
+        if self._tracker is not None and first < last:
+            self._tracker.touch(first, last)
+        return memoryview(self._delays)[start:stop]
+
+    def _touch(self, i: int):
+        if self._tracker is not None:
+            i += len(self) if i < 0 else 0
+            self._tracker.touch(i, i + 1)
+
+    def track_edits(self, tracker):
+        """
+        Until called with None, call tracker.touch(start, stop) before steps
+        [start, stop) are written (history.EditHistory uses it). Mapped
+        columns are copied and repeat blocks expanded before that.
+        """
+        self._tracker = tracker
+
+    def read_columns(self, start: int, stop: int) -> tuple:
+        """Copies of (key ids, delays) for steps [start, stop)."""
+        self.expand()
+        return self._key_ids[start:stop], self._delays[start:stop]
+
+    def write_chunks(self, chunks: dict, chunk_steps: int, length: int, keys: tuple, content_hash=None):
+        """
+        Put back chunks taken with read_columns(): resize to `length`, then
+        write {chunk number: (key ids, delays)} at chunk_steps per chunk. The
+        key table becomes `keys`; `content_hash` is the hash of the result,
+        if known.
+        """
+        self._own()
+        n = len(self._delays)
+        first = min(chunks) * chunk_steps if chunks else n
+        self._stale_from(min(first, n, length))
+        if length < n:
+            del self._delays[length:]
+            del self._key_ids[length:]
+        elif length > n:
+            self._delays.frombytes(bytes(8 * (length - n)))
+            self._key_ids.frombytes(bytes(2 * (length - n)))
+        for c, (key_ids, delays) in chunks.items():
+            a = c * chunk_steps
+            self._key_ids[a:a + len(key_ids)] = key_ids
+            self._delays[a:a + len(delays)] = delays
+        if len(keys) != len(self._keys) or tuple(self._keys) != keys:
+            self._keys = list(keys)
+            self._key_index = {k: i for i, k in enumerate(self._keys)}
+        self._hash = content_hash
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by owned columns; mapped and compressed stores hold next to none."""
+        if self._blocks is not None or self._mapping is not None:
+            return 0
+        return len(self._delays) * 10
+
+    def _stale_from(self, i: int):
+        if self._time_index is not None:
+            self._time_index.stale_from(i + len(self) if i < 0 else i)
+
+    def time_index(self) -> "TimeIndex":
+        """The store's TimeIndex, built on first use and kept current after."""
+        if self._time_index is None:
+            self._time_index = TimeIndex(self)
+        return self._time_index
+
+    @property
+    def keys(self) -> tuple:
+        """The key table, indexed by key id."""
+        return tuple(self._keys)
+
+    def delays_view(self) -> memoryview:
+        """
+        Zero-copy view of the delay column (format "d").
+        The store cannot grow or shrink while a view is alive.
+        A compressed store is expanded first.
+        """
+        self.expand()
+        return memoryview(self._delays)
+
+    def key_ids_view(self) -> memoryview:
+        """Zero-copy view of the key-id column (format "H"); expands like delays_view()."""
+        self.expand()
+        return memoryview(self._key_ids)
+
+    def total_delay(self) -> float:
+        """Sum of all delays; a compressed store is not expanded for it."""
+        if self._blocks is not None:
+            return self._blocks.total_delay()
+        return float(sum(self._delays))
+
+    def key_counts(self) -> dict:
+        """{key name: steps}; a compressed store is not expanded for it."""
+        keys = self._keys
+        if self._blocks is not None:
+            counts = self._blocks.key_histogram()
+        else:
+            counts = Counter(self._key_ids)
+        return {keys[kid]: n for kid, n in counts.items()}
+
+    def content_hash(self) -> str:
+        """
+        Digest of keys and delays; memoized until the store changes. A
+        compressed store hashes the same as its expansion.
+        """
+        if self._hash is None:
+            import hashlib  # deferred: only hashing needs it, not the package import
+
+            if self._blocks is not None:
+                key_ids, delays = self._blocks.expand_columns()
+            else:
+                key_ids, delays = self._key_ids, self._delays
+            h = hashlib.blake2b(digest_size=16)
+            h.update("\0".join(self._keys).encode("utf-8"))
+            h.update(memoryview(key_ids).cast("B"))
+            h.update(memoryview(delays).cast("B"))
+            self._hash = h.hexdigest()
+        return self._hash
+
+    @property
+    def cached_hash(self):
+        """content_hash() if it is already known, else None (never computes)."""
+        return self._hash
+
+    def to_dicts(self) -> list:
+        """Events as the JSON v2 list of {"key", "delay"} dicts."""
+        return [{"key": key, "delay": delay} for key, delay in self]
+
+
+class TimeIndex:
+    """
+    Running sum of an EventStore's delays, for seeking and progress: step i
+    is pressed `elapsed(i + 1)` seconds into the macro (at 1x).
+
+    The sums live in one float64 array. Appends only extend it and an edit
+    marks it stale from the first changed step; either way the tail is
+    summed again on the next query (by NumPy when it is installed), so a
+    query after edits costs O(changed tail) at C speed and one without
+    costs O(log n). A compressed store is not expanded: queries walk its
+    block tree by per-block durations (BlockMacro.elapsed/step_at).
+    """
+
+    __slots__ = ("_store", "_sums", "_valid", "_lock")
+
+    def __init__(self, store: EventStore):
+        self._store = store
+        self._sums = array("d", [0.0])  # _sums[i] = sum(delays[:i])
+        self._valid = 0                 # steps whose sums are up to date
+        self._lock = threading.Lock()   # progress is read from several threads
+
+    def stale_from(self, i: int):
+        if i < self._valid:
+            self._valid = max(0, i)
+
+    def _current(self) -> array:
+        with self._lock:
+            store, sums, valid = self._store, self._sums, self._valid
+            n = len(store)
+            if valid != n or len(sums) != n + 1:
+                del sums[valid + 1:]
+                _extend_sums(sums, store._delays, valid, n)
+                self._valid = n
+            return sums
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    @property
+    def total(self) -> float:
+        """Sum of every delay."""
+        blocks = self._store.blocks
+        if blocks is not None:
+            return blocks.total_delay()
+        return self._current()[-1]
+
+    def elapsed(self, i: int) -> float:
+        """Seconds (at 1x) from the start to just before step i is due: sum(delays[:i])."""
+        blocks = self._store.blocks
+        if blocks is not None:
+            return blocks.elapsed(i)
+        sums = self._current()
+        return sums[max(0, min(i, len(sums) - 1))]
+
+    def step_at(self, t: float) -> int:
+        """First step pressed at or after `t` seconds (at 1x); len() past the end."""
+        # Step i is pressed at sums[i + 1]; summed delays land a hair off
+        # round times, so a nanosecond early still counts
+        blocks = self._store.blocks
+        if blocks is not None:
+            return blocks.step_at(t - 1e-9)
+        sums = self._current()
+        return max(0, bisect_left(sums, t - 1e-9, 1) - 1)
+
+
+def _extend_sums(sums: array, delays, start: int, stop: int):
+    """
+    Append the running sums of delays[start:stop] to `sums`, continuing from
+    its last value, in the same order (so with the same rounding) either way.
+    """
+    from .retime import load_numpy
+
+    np = load_numpy()
+    if np is None or stop - start < 1024:
+        sums.extend(islice(accumulate(delays[start:stop], initial=sums[-1]), 1, None))
+        return
+    first = len(sums) - 1
+    sums.frombytes(memoryview(delays).cast("B")[start * 8:stop * 8])
+    view = np.frombuffer(sums, dtype=np.float64)[first:]
+    np.cumsum(view, out=view)
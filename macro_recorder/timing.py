@@ -0,0 +1,187 @@
+"""Absolute-deadline waiting and lateness statistics for playback."""
+
+import threading
+import time
+
+from .metrics import Histogram
+
+# Hybrid wait: sleep coarsely until this close to a deadline, then spin.
+DEFAULT_SPIN_WINDOW_MS = 2.0
+
+
+def wait_until(deadline: float, spin_window: float, stop_event: threading.Event = None) -> bool:
+    """
+    Block until time.perf_counter() reaches `deadline`.
+    Sleeps while far away, then busy-waits the last `spin_window` seconds so
+    the OS oversleep never shows up in the schedule. The coarse sleep is a
+    wait on `stop_event`, so setting it ends the wait immediately.
+    Returns False if `stop_event` was set before the deadline.
+    """
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return False
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if remaining > spin_window:
+            if stop_event is None:
+                time.sleep(remaining - spin_window)
+            elif stop_event.wait(remaining - spin_window):
+                return False
+
+
+class Clock:
+    """
+    Time source for playback. now() is in seconds; wait_until() returns True
+    once `deadline` is reached and False as soon as `interrupt` is set (the
+    caller then checks why it was woken and clears the event).
+    """
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def wait_until(self, deadline: float, spin_window: float, interrupt: threading.Event) -> bool:
+        return wait_until(deadline, spin_window, interrupt)
+
+
+class FakeClock(Clock):
+    """
+    Manually advanced clock for driving playback in tests and benchmarks.
+    Waits block until advance() moves time past the deadline; each advance
+    wakes current waiters, which just re-check their deadline.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def now(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._now += seconds
+            waiters = list(self._waiters)
+        for ev in waiters:
+            ev.set()
+
+    def wait_until(self, deadline: float, spin_window: float, interrupt: threading.Event) -> bool:
+        if interrupt.is_set():
+            return False
+        with self._lock:
+            if self._now >= deadline:
+                return True
+            self._waiters.add(interrupt)
+        try:
+            interrupt.wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(interrupt)
+        return False
+
+
+class VirtualClock(Clock):
+    """
+    Simulated time for dry runs: a wait returns at once with the clock moved
+    to its deadline, so a timeline plays out as fast as it can be walked and
+    every step lands exactly on time. Meant for a single waiting thread.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+
+    def now(self) -> float:
+        return self._now
+
+    def wait_until(self, deadline: float, spin_window: float, interrupt: threading.Event) -> bool:
+        if interrupt.is_set():
+            return False
+        if deadline > self._now:
+            self._now = deadline
+        return True
+
+
+def lateness_stats(samples) -> dict:
+    """Summarize per-step lateness (seconds): count, mean, p50, p99, max."""
+    n = len(samples)
+    if not n:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    s = sorted(samples)
+
+    def pct(p):
+        return s[min(n - 1, int(round(p / 100.0 * (n - 1))))]
+
+    return {"count": n, "mean": sum(s) / n, "p50": pct(50), "p99": pct(99), "max": s[-1]}
+
+
+class LatenessStats:
+    """
+    lateness_stats() kept as a run goes, in fixed memory however long it
+    plays (an HDR-style metrics.Histogram): count, mean and max are exact,
+    p50 and p99 within 6.25%.
+    """
+
+    __slots__ = ("_hist",)
+
+    def __init__(self):
+        self._hist = Histogram("lateness")
+
+    def __len__(self) -> int:
+        return self._hist.count
+
+    def record(self, seconds: float):
+        self._hist.record(seconds)
+
+    def merge(self, other: "LatenessStats"):
+        """Add the samples summarized by `other`."""
+        mine, theirs = self._hist, other._hist
+        for i, n in enumerate(theirs.counts):
+            if n:
+                mine.counts[i] += n
+        mine.count += theirs.count
+        mine.sum += theirs.sum
+        mine.max = max(mine.max, theirs.max)
+
+    def stats(self) -> dict:
+        h = self._hist
+        if not h.count:
+            return lateness_stats(())
+        return {"count": h.count, "mean": h.sum / h.count, "p50": h.quantile(0.5), "p99": h.quantile(0.99),
+                "max": h.max}
+
+
+def format_duration(seconds: float) -> str:
+    """H:MM:SS.mmm"""
+    ms = int(round(seconds * 1000.0))
+    return f"{ms // 3600000}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def parse_duration(text: str) -> float:
+    """Seconds from "90", "1:30" or "1:02:03.5"."""
+    seconds = 0.0
+    for part in str(text).strip().split(":"):
+        value = float(part)
+        if value < 0:
+            raise ValueError(f"Negative time: {text!r}")
+        seconds = seconds * 60.0 + value
+    return seconds
+
+
+def format_progress(progress: dict) -> str:
+    """One line from MacroEngine.progress()."""
+    done = progress["step"] - progress["start"]
+    total = progress["stop"] - progress["start"]
+    line = (f"step {progress['step']}/{progress['stop']} ({done}/{total}, {progress['fraction'] * 100:.1f}%), "
+            f"{format_duration(progress['elapsed'])} in, {format_duration(progress['remaining'])} left")
+    if progress["loop"]:
+        line += f", loop {progress['loop'] + 1}"
+    if progress["eta"] is not None and progress["eta"] != progress["remaining"]:
+        line += f", {format_duration(progress['eta'])} to the end"
+    return line
+
+
+def format_lateness(stats: dict) -> str:
+    return "lateness mean {:.2f} ms, p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms".format(
+        stats["mean"] * 1000.0, stats["p50"] * 1000.0, stats["p99"] * 1000.0, stats["max"] * 1000.0
+    )